@@ -1,49 +1,229 @@
 # backend/api_server.py
 
+import asyncio
+import codecs
+import hashlib
+import json
+import logging
+import multiprocessing
 import os
 import random
+import secrets
 import string
-from datetime import datetime, timedelta
-from typing import Optional
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable, List, Optional
 
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, MetaData
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import Column, Integer, String, Text, DateTime, MetaData, ForeignKey, LargeBinary, UniqueConstraint, Index, bindparam, func, or_, select, insert, update, delete
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
+try:
+    from backend.compression import (
+        CODEC_PLAIN, STORAGE_MIN_BYTES, CompressionMiddleware,
+        compress_content, content_compressor, content_decompressor, decompress_content,
+    )
+    from backend.observability import (
+        MetricsMiddleware, TimedAsyncQueuePool, configure_logging, instrument_engine,
+        record_cache_lookup, record_payload, render_metrics,
+    )
+    from backend.partitions import (
+        MAX_EXPIRY_DAYS, PERMANENT_BUCKET, SHARE_ID_BUCKET_CODES, begin_maintenance, create_partitions,
+        default_partition, drop_partition, expired_partitions, expiry_bucket_default, expiry_bucket_for, is_partitioned,
+    )
+    from backend.renderer import RenderCache, render_cache_key, render_page, render_snippet_html
+    from backend.snippet_cache import SingleFlight, cache_from_env, negative_cache_from_env
+    from backend.textdiff import apply_diff
+except ImportError:  # 开发模式下在 backend/ 目录内直接运行 (uvicorn api_server:app)
+    from compression import (
+        CODEC_PLAIN, STORAGE_MIN_BYTES, CompressionMiddleware,
+        compress_content, content_compressor, content_decompressor, decompress_content,
+    )
+    from observability import (
+        MetricsMiddleware, TimedAsyncQueuePool, configure_logging, instrument_engine,
+        record_cache_lookup, record_payload, render_metrics,
+    )
+    from partitions import (
+        MAX_EXPIRY_DAYS, PERMANENT_BUCKET, SHARE_ID_BUCKET_CODES, begin_maintenance, create_partitions,
+        default_partition, drop_partition, expired_partitions, expiry_bucket_default, expiry_bucket_for, is_partitioned,
+    )
+    from renderer import RenderCache, render_cache_key, render_page, render_snippet_html
+    from snippet_cache import SingleFlight, cache_from_env, negative_cache_from_env
+    from textdiff import apply_diff
+
 # --- 1. 配置 (Configuration) ---
 
+# 结构化日志，级别和格式由 LOG_LEVEL / LOG_FORMAT 环境变量控制
+logger = configure_logging()
+
 # 从环境变量中读取数据库连接URL，这是容器化部署的最佳实践
 # docker-compose.yml 会自动注入这个环境变量
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/shared_storage.db")
 
-# SQLAlchemy 引擎
-# connect_args 是专门为SQLite准备的，在多线程环境下是必需的
-# PostgreSQL不需要这个参数
-engine_args = {"connect_args": {"check_same_thread": False}} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, **engine_args)
+# 连接池配置，与 DATABASE_URL 一样通过环境变量注入
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
 
-# 创建数据库会话
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def async_database_url(url: str) -> str:
+    """把同步驱动的URL换成对应的 asyncio 驱动：PostgreSQL 用 asyncpg，SQLite 用 aiosqlite"""
+    parsed = make_url(url)
+    if parsed.drivername in ("postgresql", "postgresql+psycopg2"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    elif parsed.drivername in ("sqlite", "sqlite+pysqlite"):
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+# SQLAlchemy 异步引擎，端点全部以 async 方式访问数据库，不再占用线程池
+engine = create_async_engine(
+    async_database_url(DATABASE_URL),
+    poolclass=TimedAsyncQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+# 记录每条 SQL 语句的耗时，供 /metrics 导出
+instrument_engine(engine)
+
+# 创建数据库会话 (提交后不过期对象，避免在异步上下文中触发隐式加载)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 # SQLAlchemy模型的基础类
 Base = declarative_base()
 
+# 后台过期清理：每隔 EXPIRY_SWEEP_INTERVAL 秒分批删除过期的分享 (0 表示不在服务进程内清理，
+# 改用 `python backend/manage.py sweep-expired` 等外部定时任务)
+EXPIRY_SWEEP_INTERVAL = float(os.getenv("EXPIRY_SWEEP_INTERVAL", "300"))
+EXPIRY_SWEEP_BATCH_SIZE = int(os.getenv("EXPIRY_SWEEP_BATCH_SIZE", "500"))
+
+# 永久有效的分享在浏览器/CDN 中的缓存时间 (一年)
+PERMANENT_CACHE_MAX_AGE = 365 * 24 * 3600
+
+# 原始内容上传 (POST /api/snippets/raw) 允许的最大字节数，在接收过程中检查
+MAX_SNIPPET_BYTES = int(os.getenv("MAX_SNIPPET_BYTES", str(16 * 1024 * 1024)))
+# 原始内容下载时每次从数据库读取的字符数
+RAW_CHUNK_CHARS = int(os.getenv("RAW_CHUNK_CHARS", str(64 * 1024)))
+
+# 批量分享接口单次请求允许的最大片段数
+SNIPPET_BATCH_MAX_ITEMS = int(os.getenv("SNIPPET_BATCH_MAX_ITEMS", "100"))
+# 同步接口：每次推送/获取内容的最大片段数 (与批量分享相同)，每次拉取的最大变更数
+SYNC_PULL_MAX_ITEMS = int(os.getenv("SYNC_PULL_MAX_ITEMS", "1000"))
+
+# 每个 worker 进程内的片段读缓存 (分享的片段创建后不会再被修改)
+# 大小/字节上限/TTL 由 SNIPPET_CACHE_* 环境变量配置
+snippet_cache = cache_from_env()
+# 最近确认不存在/已过期的 share_id (SNIPPET_NEGATIVE_CACHE_* 配置)，以及按 share_id 合并并发的数据库读取
+missing_snippets = negative_cache_from_env()
+snippet_loads = SingleFlight()
+
+# 高亮 HTML 视图 (/s/{share_id})：渲染结果缓存在磁盘上，由同一主机的所有 worker 共享
+# RENDER_WORKERS 为渲染进程池大小 (0 表示使用线程池)；RENDER_ON_CREATE 控制是否在创建分享后预先渲染
+render_cache = RenderCache(
+    os.getenv("RENDER_CACHE_DIR", "./data/render_cache"),
+    int(os.getenv("RENDER_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_ON_CREATE = os.getenv("RENDER_ON_CREATE", "true").lower() in ("1", "true", "yes")
+render_pool: Optional[ProcessPoolExecutor] = None
+_pending_renders = {}  # cache key -> 正在进行的渲染任务，同一内容只渲染一次
+_background_tasks = set()  # 持有后台任务的引用，防止其在完成前被垃圾回收
+
 
 # --- 2. 数据库模型 (SQLAlchemy Models) ---
 
-# 该模型严格对应《架构文档》中定义的 shared_snippets 表
+# 片段内容按内容哈希去重存储：相同内容只保存一份，由分享记录引用
+class SnippetBlob(Base):
+    __tablename__ = "snippet_blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)  # 未压缩内容的 SHA-256
+    codec = Column(String(16), nullable=False, default=CODEC_PLAIN)  # plain / zlib / zstd
+    content = Column(Text, nullable=True)  # codec 为 plain 时的原始内容
+    data = Column(LargeBinary, nullable=True)  # 压缩后的内容
+    size = Column(Integer, nullable=False)  # 内容的 UTF-8 字节数 (未压缩)
+    ref_count = Column(Integer, nullable=False, default=0)  # 引用该内容的分享记录数
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def text(self) -> str:
+        """解压后的片段内容"""
+        if self.codec == CODEC_PLAIN:
+            return self.content
+        return decompress_content(self.codec, self.data).decode("utf-8")
+
+
+# 同步库：客户端持有随机生成的同步密钥，服务器只保存密钥的 SHA-256
+class SyncLibrary(Base):
+    __tablename__ = "sync_libraries"
+
+    id = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)  # 库内最新的变更序号
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# 该模型对应《架构文档》中定义的 shared_snippets 表，内容改为引用 snippet_blobs
 class SharedSnippet(Base):
     __tablename__ = "shared_snippets"
 
     id = Column(Integer, primary_key=True, index=True)
     share_id = Column(String(12), unique=True, index=True, nullable=False)
-    content = Column(Text, nullable=False)
+    blob_id = Column(Integer, ForeignKey("snippet_blobs.id"), nullable=True, index=True)
+    # 去重存储上线之前写入的内联内容 (迁移后为空)，新记录只写 blob_id
+    inline_content = Column("content", Text, nullable=True)
     language = Column(String(50), default='plaintext')
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)  # 供过期清理按时间范围扫描
+    # expires_at 所在的周桶 (永久分享为 0)，PostgreSQL 上可按它对表做范围分区 (见 backend/partitions.py)
+    expiry_bucket = Column(Integer, nullable=False, default=expiry_bucket_default, server_default="0")
+
+    # 同步库中的片段 (普通分享这些列均为空)：同一条分享随客户端的修改原地更新，分享链接保持不变
+    library_id = Column(String(64), ForeignKey("sync_libraries.id"), nullable=True)
+    client_uuid = Column(String(36), nullable=True)  # 客户端为片段分配的同步ID
+    title = Column(String(255), nullable=True)
+    version = Column(Integer, nullable=True)  # 库内单调递增的变更序号，客户端按它增量拉取
+    updated_at = Column(DateTime, nullable=True)
+    deleted_at = Column(DateTime, nullable=True)  # 已删除片段的墓碑，保留以便其他设备拉取删除
+
+    blob = relationship(SnippetBlob, lazy="joined")
+
+    __table_args__ = (
+        UniqueConstraint("library_id", "client_uuid", name="uq_shared_snippets_library_uuid"),
+        Index("ix_shared_snippets_library_version", "library_id", "version"),
+    )
+
+    @property
+    def content(self) -> str:
+        """片段内容，对调用方透明地从 blob 或旧的内联列读取"""
+        return self.blob.text if self.blob is not None else self.inline_content
+
+    @property
+    def content_size(self) -> int:
+        return self.blob.size if self.blob is not None else len(self.inline_content.encode("utf-8"))
+
+    @property
+    def content_digest(self) -> str:
+        """未压缩内容的 SHA-256"""
+        if self.blob is not None:
+            return self.blob.content_hash
+        return hashlib.sha256(self.inline_content.encode("utf-8")).hexdigest()
 
 
 # --- 3. API数据模型 (Pydantic Models) ---
@@ -51,7 +231,7 @@ class SharedSnippet(Base):
 class SnippetCreate(BaseModel):
     content: str
     language: str = 'plaintext'
-    expires_in_days: Optional[int] = Field(None, ge=1)
+    expires_in_days: Optional[int] = Field(None, ge=1, le=MAX_EXPIRY_DAYS)  # 上限见 backend/partitions.py
 
 class SnippetResponse(BaseModel):
     share_id: str
@@ -70,105 +250,1029 @@ class SnippetContent(BaseModel):
         orm_mode = True
 
 
+class SyncPushItem(BaseModel):
+    uuid: str = Field(..., min_length=1, max_length=36)
+    deleted: bool = False
+    title: str = ""
+    language: str = 'plaintext'
+    base_hash: Optional[str] = None  # 客户端上次同步时的内容哈希，新片段为空
+    content_hash: Optional[str] = None  # 修改后内容的 SHA-256，服务端据此校验
+    content: Optional[str] = None  # 完整内容 (新片段，或差异不比内容小时)
+    diff: Optional[list] = None  # 相对于 base_hash 对应内容的差异，格式见 backend/textdiff.py
+
+class SyncPushRequest(BaseModel):
+    library_key: str = Field(..., min_length=16, max_length=128)
+    items: List[SyncPushItem]
+
+class SyncPushResult(BaseModel):
+    uuid: str
+    status: str  # ok / conflict (服务器上的内容已被其他设备修改) / need_full (需要重新发送完整内容)
+    share_id: Optional[str] = None
+    url: Optional[str] = None
+    version: Optional[int] = None
+    content_hash: Optional[str] = None
+
+class SyncPullRequest(BaseModel):
+    library_key: str = Field(..., min_length=16, max_length=128)
+    since: int = Field(0, ge=0)  # 客户端已拉取到的变更序号
+    limit: int = Field(SYNC_PULL_MAX_ITEMS, ge=1)
+
+class SyncChange(BaseModel):
+    uuid: str
+    version: int
+    deleted: bool
+    title: Optional[str] = None
+    language: Optional[str] = None
+    content_hash: Optional[str] = None
+    share_id: str
+    url: str
+
+class SyncPullResponse(BaseModel):
+    items: List[SyncChange]
+    cursor: int  # 下次拉取时作为 since 传入
+    more: bool
+
+class SyncFetchRequest(BaseModel):
+    library_key: str = Field(..., min_length=16, max_length=128)
+    uuids: List[str]
+
+class SyncContent(BaseModel):
+    uuid: str
+    content_hash: str
+    content: str
+
+
 # --- 4. FastAPI 应用实例和数据库初始化 ---
 
-app = FastAPI(title="CodeSharer API", version="1.0.0")
+# 应用生命周期：
+# - 创建所有定义的表 (如果它们不存在)，适用于全新的数据库；
+#   已有数据库的结构变更由 backend/migrations 中的 Alembic 迁移处理
+# - 启动后台过期清理任务，关闭时取消任务并释放连接池
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    logger.info("数据库表已检查/创建。")
+
+    global render_pool
+    if RENDER_WORKERS > 0:
+        # 使用 spawn 启动渲染进程，避免在已运行事件循环的 worker 中 fork
+        render_pool = ProcessPoolExecutor(RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+    sweeper = asyncio.create_task(run_expiry_sweeper()) if EXPIRY_SWEEP_INTERVAL > 0 else None
+    try:
+        yield
+    finally:
+        if sweeper is not None:
+            sweeper.cancel()
+        if render_pool is not None:
+            render_pool.shutdown(wait=False, cancel_futures=True)
+        await engine.dispose()
+
+
+app = FastAPI(title="CodeSharer API", version="1.0.0", lifespan=lifespan)
 
-# 创建所有定义的表 (如果它们不存在)
-# 在一个更复杂的应用中，这通常由Alembic等迁移工具处理
-@app.on_event("startup")
-def on_startup():
-    Base.metadata.create_all(bind=engine)
-    print("数据库表已检查/创建。")
+# 按路由记录请求耗时 (放在压缩中间件内侧，以便读取路由匹配结果)
+app.add_middleware(MetricsMiddleware)
+
+# 按 Accept-Encoding 压缩响应 (br/gzip)，并解压客户端上传的压缩请求体
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")),
+    max_request_size=int(os.getenv("MAX_REQUEST_BYTES", str(32 * 1024 * 1024))),
+)
 
 # --- 5. 依赖项 (Dependencies) ---
 
-# FastAPI的依赖注入，为每个请求提供一个独立的数据库会话
-def get_db():
-    db = SessionLocal()
-    try:
+# FastAPI的依赖注入，为每个请求提供一个独立的异步数据库会话
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # --- 6. 辅助函数 (Utility Functions) ---
 
-def generate_share_id(db: Session, length: int = 8) -> str:
-    """生成一个在数据库中唯一的随机分享ID"""
+SHARE_ID_ALPHABET = string.ascii_letters + string.digits
+SHARE_ID_MIN_LENGTH = 8
+SHARE_ID_MAX_LENGTH = 12  # 与 SharedSnippet.share_id 的 String(12) 保持一致
+SHARE_ID_MAX_ATTEMPTS = 5
+
+def generate_share_id(length: int = SHARE_ID_MIN_LENGTH, expiry_bucket: Optional[int] = None) -> str:
+    """
+    生成一个随机分享ID，不查询数据库。
+    8位时有 62^8 ≈ 2.2e14 种组合，冲突极少，唯一性最终由 share_id 的唯一约束保证。
+
+    分区存储时传入 expiry_bucket：share_id 只在分区内唯一，首字符改为编码所在的周桶
+    (永久分享固定为第一个字符，其余桶在另外 SHARE_ID_BUCKET_CODES 个字符中轮换)，
+    有效期不超过 MAX_EXPIRY_DAYS 时未过期的分享之间不会出现相同的ID。
+    """
+    if expiry_bucket is None:
+        return ''.join(secrets.choice(SHARE_ID_ALPHABET) for _ in range(length))
+    code = 0 if expiry_bucket == PERMANENT_BUCKET else 1 + expiry_bucket % SHARE_ID_BUCKET_CODES
+    return SHARE_ID_ALPHABET[code] + ''.join(secrets.choice(SHARE_ID_ALPHABET) for _ in range(length - 1))
+
+
+async def insert_with_share_id(db: AsyncSession, db_snippet: "SharedSnippet") -> "SharedSnippet":
+    """
+    为片段分配分享ID并插入数据库 (先插入，冲突再重试)。
+
+    每次尝试都在一个保存点(SAVEPOINT)内执行，唯一约束冲突时只回滚该保存点，
+    换一个新ID重试；多次冲突后逐步加长ID (最长12位)。
+    多个 gunicorn worker 并发创建时同样由唯一约束兜底，无需预先查询。
+    """
+    db_snippet.expiry_bucket = expiry_bucket_for(db_snippet.expires_at)
+    id_bucket = db_snippet.expiry_bucket if await shares_partitioned() else None
+    for attempt in range(SHARE_ID_MAX_ATTEMPTS):
+        length = min(SHARE_ID_MIN_LENGTH + attempt, SHARE_ID_MAX_LENGTH)
+        db_snippet.share_id = generate_share_id(length, id_bucket)
+        try:
+            async with db.begin_nested():
+                db.add(db_snippet)
+            return db_snippet
+        except IntegrityError:
+            continue
+    raise HTTPException(status_code=503, detail="Could not allocate a unique share ID, please retry.")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_values(content: str, data: bytes, digest: str, ref_count: int) -> dict:
+    """构造新 blob 的列值，超过阈值的内容按 SNIPPET_STORAGE_CODEC 压缩存储。"""
+    codec, payload = compress_content(data)
+    return {
+        "content_hash": digest,
+        "codec": codec,
+        "content": content if codec == CODEC_PLAIN else None,
+        "data": payload if codec != CODEC_PLAIN else None,
+        "size": len(data),
+        "ref_count": ref_count,
+        "created_at": datetime.utcnow(),
+    }
+
+
+async def acquire_blob(db: AsyncSession, content: str) -> int:
+    """
+    取得内容对应的 blob 并将其引用计数加一，返回 blob 的 id。
+
+    先尝试原子地对已有 blob 执行 ref_count + 1；不存在时在保存点内插入新 blob
+    (超过阈值的内容按 SNIPPET_STORAGE_CODEC 压缩存储)。
+    若并发的另一个 worker 抢先插入了相同内容 (唯一约束冲突)，则重新走加引用的路径。
+    """
+    data = content.encode("utf-8")
+    digest = content_hash(data)
+    return await acquire_blob_by_digest(db, digest, lambda: blob_values(content, data, digest, ref_count=1))
+
+
+async def acquire_blob_by_digest(db: AsyncSession, digest: str, make_values: Callable[[], dict]) -> int:
+    """acquire_blob 的通用版本：内容哈希已知，只有需要插入新 blob 时才调用 make_values 构造列值。"""
+    for _ in range(3):
+        blob_id = (await db.execute(
+            update(SnippetBlob)
+            .where(SnippetBlob.content_hash == digest)
+            .values(ref_count=SnippetBlob.ref_count + 1)
+            .returning(SnippetBlob.id)
+        )).scalar()
+        if blob_id is not None:
+            return blob_id
+        blob = SnippetBlob(**make_values())
+        try:
+            async with db.begin_nested():
+                db.add(blob)
+            return blob.id
+        except IntegrityError:
+            continue
+    raise HTTPException(status_code=503, detail="Could not store snippet content, please retry.")
+
+
+async def release_blobs(db: AsyncSession, blob_refs: Counter):
+    """按 {blob_id: 被删除的引用数} 批量减少引用计数，并回收不再被引用的 blob。"""
+    if not blob_refs:
+        return
+    blobs = SnippetBlob.__table__
+    await db.execute(
+        blobs.update()
+        .where(blobs.c.id == bindparam("b_id"))
+        .values(ref_count=blobs.c.ref_count - bindparam("b_refs")),
+        [{"b_id": blob_id, "b_refs": refs} for blob_id, refs in blob_refs.items()],
+    )
+    await db.execute(delete(SnippetBlob).where(SnippetBlob.id.in_(list(blob_refs)), SnippetBlob.ref_count <= 0))
+
+
+_shares_partitioned: Optional[bool] = None
+
+
+async def shares_partitioned() -> bool:
+    """shared_snippets 是否为分区表 (每个进程只检查一次，启用或取消分区后需重启服务)。"""
+    global _shares_partitioned
+    if _shares_partitioned is None:
+        async with engine.connect() as conn:
+            _shares_partitioned = await conn.run_sync(is_partitioned)
+    return _shares_partitioned
+
+
+async def drop_expired_partitions() -> int:
+    """
+    分区存储时的过期清理：预先创建未来几周的分区，并整块删除已全部过期的周分区，返回删除的分享数量。
+
+    每个分区在单独的事务中摘除并删除，同一事务内归还其中分享对 blob 的引用；
+    多个 worker 同时清理时只有取得维护锁的一个执行，其余直接跳过。
+    """
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        conn = await db.connection()
+        if not await conn.run_sync(begin_maintenance):
+            return 0
+        created = await conn.run_sync(create_partitions, now)
+        expired = await conn.run_sync(expired_partitions, now)
+        await db.commit()
+    if created:
+        logger.info("过期清理: 创建了 %d 个周分区。", len(created))
+
+    deleted = 0
+    for name in expired:
+        async with SessionLocal() as db:
+            conn = await db.connection()
+            if not await conn.run_sync(begin_maintenance):
+                return deleted
+            blob_refs, count = await conn.run_sync(drop_partition, name)
+            await release_blobs(db, blob_refs)
+            await db.commit()
+        deleted += count
+    return deleted
+
+
+async def sweep_expired_snippets(batch_size: int = EXPIRY_SWEEP_BATCH_SIZE) -> int:
+    """
+    分批删除已过期的分享并回收其 blob，返回删除的分享数量。
+
+    每批最多 batch_size 行、单独提交，避免长事务和大范围锁；
+    PostgreSQL 上使用 SKIP LOCKED，多个 worker 同时清理时互不阻塞。
+    shared_snippets 为分区表时先整块删除已全部过期的周分区，逐行清理只处理默认分区。
+    """
+    deleted = 0
+    shares = SharedSnippet.__table__
+    if await shares_partitioned():
+        deleted += await drop_expired_partitions()
+        shares = default_partition
     while True:
-        share_id = ''.join(random.choices(string.ascii_letters + string.digits, k=length))
-        # 检查ID是否已存在于数据库中
-        if not db.query(SharedSnippet).filter(SharedSnippet.share_id == share_id).first():
-            return share_id
+        async with SessionLocal() as db:
+            rows = (await db.execute(
+                select(shares.c.id, shares.c.blob_id)
+                .where(shares.c.expires_at < datetime.utcnow())
+                .order_by(shares.c.expires_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not rows:
+                return deleted
+            await db.execute(delete(shares).where(shares.c.id.in_([row.id for row in rows])))
+            await release_blobs(db, Counter(row.blob_id for row in rows if row.blob_id is not None))
+            await db.commit()
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            return deleted
+
+
+async def run_expiry_sweeper():
+    """后台任务：周期性执行过期清理。加入随机抖动，避免多个 worker 同时开始扫描。"""
+    while True:
+        await asyncio.sleep(EXPIRY_SWEEP_INTERVAL * random.uniform(0.5, 1.5))
+        try:
+            deleted = await sweep_expired_snippets()
+            if deleted:
+                logger.info("过期清理: 删除了 %d 个过期分享。", deleted)
+        except Exception:
+            logger.exception("过期清理失败")
+
+
+async def acquire_blobs(db: AsyncSession, contents: List[str]) -> List[int]:
+    """
+    acquire_blob 的批量版本，返回与 contents 一一对应的 blob id。
+
+    已存在的 blob 先加行锁 (防止被并发回收) 再用一条 executemany 增加引用计数，
+    缺失的 blob 用一条多行 INSERT 写入；若与并发写入冲突，则退回逐个 acquire_blob。
+    """
+    encoded = [content.encode("utf-8") for content in contents]
+    digests = [content_hash(data) for data in encoded]
+    refs = Counter(digests)
+
+    blob_ids = dict((await db.execute(
+        select(SnippetBlob.content_hash, SnippetBlob.id)
+        .where(SnippetBlob.content_hash.in_(list(refs)))
+        .with_for_update()
+    )).all())
+    if blob_ids:
+        blobs = SnippetBlob.__table__
+        await db.execute(
+            blobs.update()
+            .where(blobs.c.id == bindparam("b_id"))
+            .values(ref_count=blobs.c.ref_count + bindparam("b_refs")),
+            [{"b_id": blob_ids[digest], "b_refs": refs[digest]} for digest in blob_ids],
+        )
+
+    missing = {}
+    for content, data, digest in zip(contents, encoded, digests):
+        if digest not in blob_ids and digest not in missing:
+            missing[digest] = blob_values(content, data, digest, ref_count=refs[digest])
+    if missing:
+        try:
+            async with db.begin_nested():
+                inserted = await db.execute(
+                    insert(SnippetBlob).returning(SnippetBlob.content_hash, SnippetBlob.id),
+                    list(missing.values()),
+                )
+                blob_ids.update(inserted.tuples().all())
+        except IntegrityError:
+            for digest, values in missing.items():
+                content = contents[digests.index(digest)]
+                blob_ids[digest] = await acquire_blob(db, content)
+                for _ in range(values["ref_count"] - 1):
+                    await acquire_blob(db, content)
+
+    return [blob_ids[digest] for digest in digests]
+
+
+def expires_at_for(expires_in_days: Optional[int]) -> Optional[datetime]:
+    if not expires_in_days:
+        return None
+    return datetime.utcnow() + timedelta(days=expires_in_days)
+
+
+def share_url(share_id: str) -> str:
+    # 分享链接指向服务端渲染的高亮页面，原始JSON仍可通过 /api/snippets/{share_id} 获取
+    # 在生产环境中，可以从环境变量读取基础URL
+    base_url = os.getenv("BASE_URL", "http://127.0.0.1:8000")
+    return f"{base_url}/s/{share_id}"
+
+
+async def render_highlighted(content_digest: str, language: str, load_content: Callable[[], Awaitable[str]]) -> str:
+    """
+    返回片段的高亮 HTML，优先使用磁盘缓存。
+
+    Pygments 词法分析是CPU密集型操作，放到渲染进程池中执行，不阻塞事件循环；
+    同一内容的并发请求共享同一个渲染任务。只有缓存未命中时才调用 load_content 读取内容。
+    """
+    key = render_cache_key(content_digest, language)
+    rendered = await asyncio.to_thread(render_cache.get, key)
+    record_cache_lookup("render", rendered is not None)
+    if rendered is not None:
+        return rendered
+
+    task = _pending_renders.get(key)
+    if task is None:
+        async def render():
+            try:
+                content = await load_content()
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(render_pool, render_snippet_html, content, language)
+                await asyncio.to_thread(render_cache.put, key, result)
+                return result
+            finally:
+                _pending_renders.pop(key, None)
+        task = _pending_renders[key] = asyncio.ensure_future(render())
+    return await asyncio.shield(task)
+
+
+def prerender_in_background(content_digest: str, content: str, language: str):
+    """在请求之外预先渲染新分享的高亮 HTML，首次访问时即可直接命中缓存。"""
+    if not RENDER_ON_CREATE:
+        return
+
+    async def get_content():
+        return content
+
+    async def prerender():
+        try:
+            await render_highlighted(content_digest, language, get_content)
+        except Exception:
+            logger.exception("预渲染失败")
+
+    task = asyncio.ensure_future(prerender())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def http_date(dt: datetime) -> str:
+    """把数据库中的 UTC 时间格式化为 HTTP 日期 (RFC 7231)"""
+    return format_datetime(dt.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def snippet_etag(digest: str, modified_at: datetime) -> str:
+    """由内容哈希和修改时间 (普通分享创建后不会被修改，即创建时间) 派生的强 ETag"""
+    return '"' + hashlib.sha256(f"{digest}:{modified_at.isoformat()}".encode()).hexdigest()[:32] + '"'
+
+
+def select_live_snippet(share_id: str, *columns):
+    """按分享ID查询未过期 (且未被同步删除) 片段的语句，指定 columns 时只查询这些列"""
+    return select(*(columns or (SharedSnippet,))).where(
+        SharedSnippet.share_id == share_id,
+        or_(SharedSnippet.expires_at.is_(None), SharedSnippet.expires_at > datetime.utcnow()),
+        SharedSnippet.deleted_at.is_(None),
+    )
+
+
+async def load_snippet(db: AsyncSession, share_id: str) -> Optional[dict]:
+    """
+    读取一个未过期的分享，优先使用进程内缓存，未命中时查询数据库并写入缓存。
+
+    缓存条目中保存已序列化好的 JSON 响应体和 ETag，命中时无需再次序列化。
+    最近确认不存在的 share_id 直接返回 None；同一 share_id 的并发未命中只查询一次数据库。
+    """
+    cached = snippet_cache.get(share_id)
+    record_cache_lookup("snippet", cached is not None)
+    if cached is not None:
+        return cached
+    missing = missing_snippets.contains(share_id)
+    record_cache_lookup("missing", missing)
+    if missing:
+        return None
+    return await snippet_loads.do(share_id, lambda: fetch_snippet(db, share_id))
+
+
+async def load_snippet_meta(db: AsyncSession, share_id: str) -> Optional[dict]:
+    """
+    只读取分享的元数据 (内容哈希、存储方式、大小和时间)，供流式下载生成 ETag 和缓存头。
+    不读取内容，也不写入 JSON 响应缓存；只有去重存储之前的内联内容需要读出来计算哈希。
+    """
+    if missing_snippets.contains(share_id):
+        return None
+    row = (await db.execute(
+        select_live_snippet(
+            share_id, SharedSnippet.blob_id, SharedSnippet.created_at, SharedSnippet.updated_at,
+            SharedSnippet.expires_at, SharedSnippet.library_id, SnippetBlob.content_hash, SnippetBlob.codec, SnippetBlob.size,
+        ).outerjoin(SnippetBlob, SnippetBlob.id == SharedSnippet.blob_id)
+    )).first()
+    if row is None:
+        missing_snippets.add(share_id)
+        return None
+    digest = row.content_hash
+    if digest is None:
+        inline = (await db.execute(select_live_snippet(share_id, SharedSnippet.inline_content))).scalar()
+        digest = hashlib.sha256((inline or "").encode("utf-8")).hexdigest()
+    modified_at = row.updated_at or row.created_at
+    return {
+        "row": row,
+        "etag": snippet_etag(digest, modified_at),
+        "modified_at": modified_at,
+        "expires_at": row.expires_at,
+        "mutable": row.library_id is not None,
+    }
+
+
+async def fetch_snippet(db: AsyncSession, share_id: str) -> Optional[dict]:
+    """从数据库读取分享并写入缓存；不存在或已过期时记入 missing_snippets。"""
+    db_snippet = (await db.execute(select_live_snippet(share_id))).scalars().first()
+    if not db_snippet:
+        missing_snippets.add(share_id)
+        return None
+
+    body = json.dumps(
+        jsonable_encoder({
+            "content": db_snippet.content,
+            "language": db_snippet.language,
+            "created_at": db_snippet.created_at,
+        }),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    modified_at = db_snippet.updated_at or db_snippet.created_at
+    entry = {
+        "body": body,
+        "etag": snippet_etag(db_snippet.content_digest, modified_at),
+        "digest": db_snippet.content_digest,
+        "language": db_snippet.language,
+        "created_at": db_snippet.created_at,
+        "modified_at": modified_at,
+        "expires_at": db_snippet.expires_at,
+        "mutable": db_snippet.library_id is not None,  # 同步库中的片段会被原地更新
+    }
+    snippet_cache.put(share_id, entry, len(body), db_snippet.expires_at)
+    return entry
+
+
+def caching_headers(entry: dict, etag: Optional[str] = None) -> dict:
+    """
+    生成 HTTP 缓存相关的响应头：
+    - 同步库中的片段：可以缓存，但每次使用前需用 ETag 重新验证；
+    - 永久分享：长期缓存并标记 immutable；
+    - 有有效期的分享：max-age 为距离过期的剩余秒数。
+    ETag 以强形式发送，只有 CompressionMiddleware 实际压缩响应体时才把它降级为弱形式。
+    """
+    headers = {"ETag": etag or entry["etag"], "Last-Modified": http_date(entry["modified_at"])}
+    expires_at = entry["expires_at"]
+    if entry["mutable"]:
+        headers["Cache-Control"] = "no-cache"
+    elif expires_at is None:
+        headers["Cache-Control"] = f"public, max-age={PERMANENT_CACHE_MAX_AGE}, immutable"
+    else:
+        max_age = max(0, int((expires_at - datetime.utcnow()).total_seconds()))
+        headers["Cache-Control"] = f"public, max-age={max_age}"
+        headers["Expires"] = http_date(expires_at)
+    return headers
+
+
+def is_not_modified(request: Request, entry: dict, etag: Optional[str] = None) -> bool:
+    """处理条件请求：If-None-Match 优先 (弱比较，强弱两种形式的 ETag 都接受)，其次 If-Modified-Since。"""
+    etag = (etag or entry["etag"]).removeprefix("W/")
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return entry["modified_at"].replace(microsecond=0) <= since
+    return False
 
 
 # --- 7. API 端点 (Endpoints) ---
 
 @app.post("/api/snippets", response_model=SnippetResponse, status_code=201, tags=["Snippets"])
-def create_snippet(snippet: SnippetCreate, db: Session = Depends(get_db)):
+async def create_snippet(snippet: SnippetCreate, db: AsyncSession = Depends(get_db)):
     """
     创建一个新的代码片段分享。
     
     - 接收代码内容、语言和可选的有效期。
     - 生成一个唯一的分享ID。
-    - 将片段存入数据库。
+    - 将片段内容按哈希去重存储，并写入分享记录。
     - 返回分享ID、URL和过期时间。
     """
     if not snippet.content.strip():
         raise HTTPException(status_code=400, detail="Content cannot be empty.")
     
-    share_id = generate_share_id(db)
-    
-    expires_at = None
-    if snippet.expires_in_days:
-        expires_at = datetime.utcnow() + timedelta(days=snippet.expires_in_days)
+    expires_at = expires_at_for(snippet.expires_in_days)
+    data = snippet.content.encode("utf-8")
+    record_payload("upload", len(data))
     
     db_snippet = SharedSnippet(
-        share_id=share_id,
-        content=snippet.content,
+        blob_id=await acquire_blob(db, snippet.content),
         language=snippet.language,
         expires_at=expires_at
     )
     
-    db.add(db_snippet)
-    db.commit()
-    db.refresh(db_snippet)
-    
-    # 这里的URL应指向前端展示页面，为方便测试，暂时指向API本身
-    # 在生产环境中，可以从环境变量读取基础URL
-    base_url = os.getenv("BASE_URL", "http://127.0.0.1:8000")
-    db_snippet.url = f"{base_url}/api/snippets/{share_id}"
+    await insert_with_share_id(db, db_snippet)
+    await db.commit()
+    share_id = db_snippet.share_id
+    missing_snippets.invalidate(share_id)
+    db_snippet.url = share_url(share_id)
+    prerender_in_background(content_hash(data), snippet.content, snippet.language)
     
-    print(f"创建了新的分享: ID={share_id}, 有效期至: {expires_at or '永久'}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("创建了新的分享", extra={"share_id": share_id, "expires_at": expires_at or "永久"})
     
     return db_snippet
 
 
+@app.post("/api/snippets/batch", response_model=List[SnippetResponse], status_code=201, tags=["Snippets"])
+async def create_snippets_batch(snippets: List[SnippetCreate], db: AsyncSession = Depends(get_db)):
+    """
+    在一个请求、一个事务内批量创建多个代码片段分享。
+    
+    - 内容去重后批量写入 blob，分享记录用一条多行 INSERT 写入。
+    - 返回与请求顺序一致的分享ID、URL和过期时间列表。
+    """
+    if not snippets:
+        raise HTTPException(status_code=400, detail="No snippets given.")
+    if len(snippets) > SNIPPET_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {SNIPPET_BATCH_MAX_ITEMS} snippets per batch.")
+    for index, snippet in enumerate(snippets):
+        if not snippet.content.strip():
+            raise HTTPException(status_code=400, detail=f"Content of item {index} cannot be empty.")
+
+    blob_ids = await acquire_blobs(db, [snippet.content for snippet in snippets])
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            "blob_id": blob_id,
+            "language": snippet.language,
+            "created_at": created_at,
+            "expires_at": expires_at_for(snippet.expires_in_days),
+        }
+        for snippet, blob_id in zip(snippets, blob_ids)
+    ]
+    for row in rows:
+        row["expiry_bucket"] = expiry_bucket_for(row["expires_at"])
+
+    # 与 insert_with_share_id 相同：直接插入，share_id 冲突时回滚保存点并整体换一批ID重试
+    partitioned = await shares_partitioned()
+    for attempt in range(SHARE_ID_MAX_ATTEMPTS):
+        length = min(SHARE_ID_MIN_LENGTH + attempt, SHARE_ID_MAX_LENGTH)
+        for row in rows:
+            row["share_id"] = generate_share_id(length, row["expiry_bucket"] if partitioned else None)
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(SharedSnippet), rows)
+            break
+        except IntegrityError:
+            continue
+    else:
+        raise HTTPException(status_code=503, detail="Could not allocate unique share IDs, please retry.")
+    await db.commit()
+    for row in rows:
+        missing_snippets.invalidate(row["share_id"])
+    for snippet in snippets:
+        data = snippet.content.encode("utf-8")
+        record_payload("upload", len(data))
+        prerender_in_background(content_hash(data), snippet.content, snippet.language)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("批量创建了分享", extra={"count": len(rows)})
+
+    return [
+        {"share_id": row["share_id"], "url": share_url(row["share_id"]), "expires_at": row["expires_at"]}
+        for row in rows
+    ]
+
+
 @app.get("/api/snippets/{share_id}", response_model=SnippetContent, tags=["Snippets"])
-def get_snippet(share_id: str, db: Session = Depends(get_db)):
+async def get_snippet(share_id: str, request: Request, db: AsyncSession = Depends(get_db)):
     """
     根据分享ID获取一个代码片段的内容。
     
-    - 如果片段不存在，返回404。
-    - 如果片段已过期，将其从数据库中删除并返回404。
+    - 优先从进程内缓存读取，未命中时才查询数据库。
+    - 如果片段不存在或已过期，返回404 (过期记录由后台任务清理，读取路径不写数据库)。
+    - 返回 ETag / Last-Modified / Cache-Control，条件请求命中时返回304。
     """
-    db_snippet = db.query(SharedSnippet).filter(SharedSnippet.share_id == share_id).first()
-    
-    if not db_snippet:
-        raise HTTPException(status_code=404, detail="Snippet not found.")
-    
-    if db_snippet.expires_at and db_snippet.expires_at < datetime.utcnow():
-        print(f"片段 {share_id} 已过期，正在删除。")
-        db.delete(db_snippet)
-        db.commit()
+    entry = await load_snippet(db, share_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Snippet not found or has expired.")
     
-    print(f"获取了分享内容: ID={share_id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("获取了分享内容", extra={"share_id": share_id})
+    
+    headers = caching_headers(entry)
+    if is_not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    record_payload("download", len(entry["body"]))
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+
+@app.post("/api/snippets/raw", response_model=SnippetResponse, status_code=201, tags=["Snippets"])
+async def upload_raw_snippet(
+    request: Request,
+    language: str = 'plaintext',
+    expires_in_days: Optional[int] = Query(None, ge=1, le=MAX_EXPIRY_DAYS),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    以原始请求体 (UTF-8 文本) 流式上传一个代码片段，适合数MB的大日志。
     
+    - 边接收边计算哈希、校验UTF-8并压缩，不在内存中构造完整的JSON或字符串。
+    - 超过 MAX_SNIPPET_BYTES 时在接收过程中立即返回413。
+    """
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > MAX_SNIPPET_BYTES:
+        raise HTTPException(status_code=413, detail=f"Snippet exceeds {MAX_SNIPPET_BYTES} bytes.")
+
+    hasher = hashlib.sha256()
+    validator = codecs.getincrementaldecoder("utf-8")()
+    codec, compressor = content_compressor()
+    compressed = []
+    size = 0
+    has_text = False
+    # 未压缩的原始内容暂存在超过 1MB 即落盘的临时文件中，只有最终以明文存储时才读回
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+        try:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > MAX_SNIPPET_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Snippet exceeds {MAX_SNIPPET_BYTES} bytes.")
+                validator.decode(chunk)
+                hasher.update(chunk)
+                spool.write(chunk)
+                if compressor is not None:
+                    compressed.append(compressor.compress(chunk))
+                has_text = has_text or bool(chunk.strip())
+            validator.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Content must be UTF-8 text.")
+        if not has_text:
+            raise HTTPException(status_code=400, detail="Content cannot be empty.")
+
+        payload = None
+        if compressor is not None:
+            compressed.append(compressor.flush())
+            payload = b"".join(compressed)
+            if size < STORAGE_MIN_BYTES or len(payload) > size * 0.9:
+                payload = None
+        digest = hasher.hexdigest()
+
+        def make_values():
+            values = {"content_hash": digest, "size": size, "ref_count": 1, "created_at": datetime.utcnow()}
+            if payload is not None:
+                return dict(values, codec=codec, content=None, data=payload)
+            spool.seek(0)
+            return dict(values, codec=CODEC_PLAIN, content=spool.read().decode("utf-8"), data=None)
+
+        db_snippet = SharedSnippet(
+            blob_id=await acquire_blob_by_digest(db, digest, make_values),
+            language=language,
+            expires_at=expires_at_for(expires_in_days),
+        )
+    await insert_with_share_id(db, db_snippet)
+    await db.commit()
+    missing_snippets.invalidate(db_snippet.share_id)
+    db_snippet.url = share_url(db_snippet.share_id)
+
+    record_payload("upload", size)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("以流式上传创建了新的分享", extra={"share_id": db_snippet.share_id, "size": size})
+
     return db_snippet
 
 
+async def stream_snippet_content(share_id: str, blob_id: Optional[int], codec: Optional[str]):
+    """
+    分块读取片段内容并逐块产出 UTF-8 字节：
+    - 明文存储：用 substr 按 RAW_CHUNK_CHARS 分页从数据库读取；
+    - 压缩存储：只读取体积较小的压缩数据，边解压边输出。
+    使用独立的会话，因为响应体在端点函数返回之后才开始发送。
+    """
+    async with SessionLocal() as db:
+        if blob_id is not None and codec != CODEC_PLAIN:
+            payload = (await db.execute(select(SnippetBlob.data).where(SnippetBlob.id == blob_id))).scalar()
+            decompressor = content_decompressor(codec)
+            for offset in range(0, len(payload), 16 * 1024):
+                yield decompressor.decompress(payload[offset:offset + 16 * 1024])
+            if hasattr(decompressor, "flush"):
+                yield decompressor.flush()
+            return
+
+        if blob_id is not None:
+            column, condition = SnippetBlob.content, SnippetBlob.id == blob_id
+        else:
+            column, condition = SharedSnippet.inline_content, SharedSnippet.share_id == share_id
+        offset = 1
+        while True:
+            chunk = (await db.execute(select(func.substr(column, offset, RAW_CHUNK_CHARS)).where(condition))).scalar()
+            if not chunk:
+                return
+            yield chunk.encode("utf-8")
+            offset += RAW_CHUNK_CHARS
+
+
+@app.get("/api/snippets/{share_id}/raw", tags=["Snippets"])
+async def get_snippet_raw(share_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    以 text/plain 流式返回片段的原始内容，大片段不会在 worker 内存中整体序列化。
+    支持与 JSON 接口相同的 ETag 条件请求和 HTTP 缓存。
+    """
+    entry = await load_snippet_meta(db, share_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Snippet not found or has expired.")
+
+    etag = entry["etag"][:-1] + '-raw"'
+    headers = caching_headers(entry, etag)
+    if is_not_modified(request, entry, etag):
+        return Response(status_code=304, headers=headers)
+
+    row = entry["row"]
+    if row.size is not None:
+        headers["Content-Length"] = str(row.size)
+        record_payload("download", row.size)
+    return StreamingResponse(
+        stream_snippet_content(share_id, row.blob_id, row.codec),
+        media_type="text/plain; charset=utf-8",
+        headers=headers,
+    )
+
+
+@app.get("/s/{share_id}", response_class=HTMLResponse, tags=["Views"])
+async def view_snippet(share_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    以服务端渲染的语法高亮 HTML 页面展示一个代码片段。
+    
+    - 渲染结果按内容和语言缓存，重复访问不会再次执行 Pygments 词法分析。
+    - 与 JSON 接口一样支持 ETag 条件请求和 HTTP 缓存。
+    """
+    entry = await load_snippet(db, share_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Snippet not found or has expired.")
+
+    etag = entry["etag"][:-1] + '-html"'
+    headers = caching_headers(entry, etag)
+    if is_not_modified(request, entry, etag):
+        return Response(status_code=304, headers=headers)
+
+    async def get_content():
+        db_snippet = (await db.execute(select_live_snippet(share_id))).scalars().first()
+        if db_snippet is None:
+            raise HTTPException(status_code=404, detail="Snippet not found or has expired.")
+        return db_snippet.content
+
+    body = await render_highlighted(entry["digest"], entry["language"], get_content)
+    return HTMLResponse(render_page(share_id, entry["language"], body), headers=headers)
+
+
+def library_id_for(library_key: str) -> str:
+    """同步密钥对应的库ID (服务器不保存密钥本身)"""
+    return hashlib.sha256(library_key.encode("utf-8")).hexdigest()
+
+
+async def allocate_sync_versions(db: AsyncSession, library_id: str, count: int) -> int:
+    """
+    为同步库预留 count 个连续的变更序号，返回第一个 (必要时创建该库)。
+
+    原子地递增计数并持有该行的写锁直到事务提交，同一个库的推送因此串行执行，
+    序号按提交顺序递增，客户端按序号增量拉取时不会漏掉变更 (未使用的序号只留下空洞)。
+    """
+    libraries = SyncLibrary.__table__
+    for _ in range(3):
+        end = (await db.execute(
+            libraries.update()
+            .where(libraries.c.id == library_id)
+            .values(version=libraries.c.version + count)
+            .returning(libraries.c.version)
+        )).scalar()
+        if end is not None:
+            return end - count + 1
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(SyncLibrary).values(id=library_id, version=count, created_at=datetime.utcnow()))
+            return 1
+        except IntegrityError:
+            continue
+    raise HTTPException(status_code=503, detail="Could not allocate sync versions, please retry.")
+
+
+async def apply_sync_item(db: AsyncSession, library_id: str, item: SyncPushItem, row: Optional[SharedSnippet],
+                          version: int, released: Counter) -> dict:
+    """把一个推送的变更应用到同步库 (调用方负责提交)，返回该项的结果。释放的 blob 引用累加到 released。"""
+    now = datetime.utcnow()
+    live = row is not None and row.deleted_at is None
+
+    if item.deleted:
+        if live:
+            if row.blob_id is not None:
+                released[row.blob_id] += 1
+            row.blob_id, row.inline_content, row.deleted_at = None, None, now
+            row.version, row.updated_at = version, now
+        return {"uuid": item.uuid, "status": "ok", "version": row.version if row is not None else None}
+
+    current = row.content_digest if live else None
+    # 服务器上的内容在客户端上次同步之后已被其他设备修改 (除非两边恰好改成了相同的内容)
+    if live and item.base_hash != current and item.content_hash != current:
+        return {"uuid": item.uuid, "status": "conflict"}
+
+    if item.content is not None:
+        content = item.content
+    elif live and item.content_hash == current:
+        content = None  # 只修改了标题或语言
+    elif live and item.diff is not None:
+        try:
+            content = apply_diff(row.content, item.diff)
+        except ValueError:
+            return {"uuid": item.uuid, "status": "need_full"}
+    else:
+        return {"uuid": item.uuid, "status": "need_full"}
+
+    digest = current
+    if content is not None:
+        data = content.encode("utf-8")
+        digest = content_hash(data)
+        if item.content_hash is not None and digest != item.content_hash:
+            return {"uuid": item.uuid, "status": "need_full"}
+        record_payload("upload", len(data))
+
+    if not live:
+        blob_id = await acquire_blob(db, content)
+        if row is None:
+            row = SharedSnippet(library_id=library_id, client_uuid=item.uuid, blob_id=blob_id, created_at=now)
+            await insert_with_share_id(db, row)
+        else:
+            # 复活一个已删除的片段 (沿用原来的分享ID)
+            row.blob_id, row.deleted_at = blob_id, None
+    elif digest != current:
+        if row.blob_id is not None:
+            released[row.blob_id] += 1
+        row.blob_id, row.inline_content = await acquire_blob(db, content), None
+
+    row.title, row.language, row.version, row.updated_at = item.title[:255], item.language[:50], version, now
+    if content is not None and digest != current:
+        prerender_in_background(digest, content, row.language)
+    return {
+        "uuid": item.uuid, "status": "ok", "share_id": row.share_id, "url": share_url(row.share_id),
+        "version": version, "content_hash": digest,
+    }
+
+
+@app.post("/api/sync/push", response_model=List[SyncPushResult], tags=["Sync"])
+async def sync_push(request: SyncPushRequest, db: AsyncSession = Depends(get_db)):
+    """
+    把客户端本地修改过的片段推送到同步库 (一个事务)。
+
+    - 新片段发送完整内容；已同步过的片段发送相对于上次同步内容 (base_hash) 的行差异，
+      服务端应用差异后按 content_hash 校验结果；
+    - 服务器上的内容已被其他设备修改时返回 conflict，客户端应先拉取再重试；
+    - 同步库中的片段同时是一个永久分享，内容更新后分享链接保持不变。
+    """
+    if not request.items:
+        return []
+    if len(request.items) > SNIPPET_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {SNIPPET_BATCH_MAX_ITEMS} items per push.")
+    uuids = [item.uuid for item in request.items]
+    if len(set(uuids)) != len(uuids):
+        raise HTTPException(status_code=400, detail="Duplicate uuid in push.")
+
+    library_id = library_id_for(request.library_key)
+    first_version = await allocate_sync_versions(db, library_id, len(request.items))
+    rows = {
+        row.client_uuid: row
+        for row in (await db.execute(
+            select(SharedSnippet).where(SharedSnippet.library_id == library_id, SharedSnippet.client_uuid.in_(uuids))
+        )).scalars()
+    }
+    released = Counter()
+    results = [
+        await apply_sync_item(db, library_id, item, rows.get(item.uuid), first_version + index, released)
+        for index, item in enumerate(request.items)
+    ]
+    await db.flush()
+    await release_blobs(db, released)
+    await db.commit()
+
+    # 本进程的读缓存立即失效；其他 worker 中的缓存条目最迟在 SNIPPET_CACHE_TTL 后过期
+    for row in rows.values():
+        snippet_cache.invalidate(row.share_id)
+    # 新建或恢复的片段不再是"不存在"
+    for result in results:
+        if result.get("share_id"):
+            missing_snippets.invalidate(result["share_id"])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("同步推送", extra={"count": len(results)})
+    return results
+
+
+@app.post("/api/sync/pull", response_model=SyncPullResponse, tags=["Sync"])
+async def sync_pull(request: SyncPullRequest, db: AsyncSession = Depends(get_db)):
+    """
+    返回同步库中变更序号大于 since 的片段元数据 (不含内容，按序号排列)，包括删除。
+    客户端只为内容哈希与本地不同的片段调用 /api/sync/fetch 下载内容。
+    """
+    limit = min(request.limit, SYNC_PULL_MAX_ITEMS)
+    rows = (await db.execute(
+        select(
+            SharedSnippet.client_uuid, SharedSnippet.version, SharedSnippet.deleted_at, SharedSnippet.title,
+            SharedSnippet.language, SharedSnippet.share_id, SnippetBlob.content_hash,
+        )
+        .outerjoin(SnippetBlob, SnippetBlob.id == SharedSnippet.blob_id)
+        .where(SharedSnippet.library_id == library_id_for(request.library_key), SharedSnippet.version > request.since)
+        .order_by(SharedSnippet.version)
+        .limit(limit + 1)
+    )).all()
+    items = [
+        {
+            "uuid": row.client_uuid, "version": row.version, "deleted": row.deleted_at is not None,
+            "title": row.title, "language": row.language, "content_hash": row.content_hash, "share_id": row.share_id,
+            "url": share_url(row.share_id),
+        }
+        for row in rows[:limit]
+    ]
+    return {"items": items, "cursor": items[-1]["version"] if items else request.since, "more": len(rows) > limit}
+
+
+@app.post("/api/sync/fetch", response_model=List[SyncContent], tags=["Sync"])
+async def sync_fetch(request: SyncFetchRequest, db: AsyncSession = Depends(get_db)):
+    """下载同步库中指定片段的当前内容 (已删除或不存在的片段不返回)。"""
+    if len(request.uuids) > SNIPPET_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {SNIPPET_BATCH_MAX_ITEMS} items per fetch.")
+    rows = (await db.execute(
+        select(SharedSnippet).where(
+            SharedSnippet.library_id == library_id_for(request.library_key),
+            SharedSnippet.client_uuid.in_(request.uuids),
+            SharedSnippet.deleted_at.is_(None),
+        )
+    )).scalars().all()
+    results = [{"uuid": row.client_uuid, "content_hash": row.content_digest, "content": row.content} for row in rows]
+    record_payload("download", sum(len(result["content"].encode("utf-8")) for result in results))
+    return results
+
+
+@app.get("/api/cache/stats", tags=["Internal"])
+async def get_cache_stats():
+    """
+    返回当前 worker 进程的片段缓存统计 (命中/未命中次数、条目数、占用字节数)，
+    以及"不存在"缓存 (missing) 和并发读取合并 (coalescing) 的统计。
+    """
+    return dict(snippet_cache.stats(), missing=missing_snippets.stats(), coalescing=snippet_loads.stats())
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标：请求耗时、SQL 耗时、连接池等待、缓存命中和片段大小 (多进程部署时汇总所有 worker)。"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # --- 8. 直接运行 (For Development) ---
 if __name__ == "__main__":
     print("以开发模式启动FastAPI服务器...")
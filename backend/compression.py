@@ -0,0 +1,268 @@
+# backend/compression.py
+
+import os
+import zlib
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+
+# zstd 和 brotli 为可选依赖，未安装时自动退回 zlib/gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# --- 1. 存储压缩 (Compression at rest) ---
+
+CODEC_PLAIN = "plain"
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+# SNIPPET_STORAGE_CODEC: off | zlib | zstd；只有超过阈值的内容才会被压缩
+STORAGE_CODEC = os.getenv("SNIPPET_STORAGE_CODEC", CODEC_ZLIB)
+STORAGE_MIN_BYTES = int(os.getenv("SNIPPET_STORAGE_MIN_BYTES", "1024"))
+
+
+def compress_content(data: bytes, codec: str = STORAGE_CODEC, min_bytes: int = STORAGE_MIN_BYTES) -> Tuple[str, bytes]:
+    """
+    按配置压缩片段内容，返回 (codec, payload)。
+    内容太小、压缩收益不足或编解码器不可用时返回 (CODEC_PLAIN, data)。
+    """
+    if codec in ("", "off", CODEC_PLAIN) or len(data) < min_bytes:
+        return CODEC_PLAIN, data
+    if codec == CODEC_ZSTD and zstandard is not None:
+        payload = zstandard.ZstdCompressor(level=3).compress(data)
+    elif codec in (CODEC_ZLIB, CODEC_ZSTD):
+        codec = CODEC_ZLIB
+        payload = zlib.compress(data, 6)
+    else:
+        raise ValueError(f"Unknown storage codec: {codec}")
+    # 压缩后至少要节省 10% 才值得付出解压开销
+    if len(payload) > len(data) * 0.9:
+        return CODEC_PLAIN, data
+    return codec, payload
+
+
+def decompress_content(codec: str, payload: bytes) -> bytes:
+    """按 codec 标记解压片段内容。"""
+    if codec == CODEC_PLAIN:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed snippets")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise ValueError(f"Unknown storage codec: {codec}")
+
+
+def content_compressor(codec: str = STORAGE_CODEC):
+    """
+    返回 (codec, compressobj)，用于边接收边压缩的流式上传。
+    compressobj 提供 compress(chunk) / flush()；存储压缩关闭时返回 (CODEC_PLAIN, None)。
+    """
+    if codec in ("", "off", CODEC_PLAIN):
+        return CODEC_PLAIN, None
+    if codec == CODEC_ZSTD and zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compressobj()
+    return CODEC_ZLIB, zlib.compressobj(6)
+
+
+def content_decompressor(codec: str):
+    """返回一个流式解压对象 (提供 decompress(chunk))，用于分块输出压缩存储的内容。"""
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj()
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed snippets")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown storage codec: {codec}")
+
+
+# --- 2. 传输压缩 (Compression on the wire) ---
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """根据 Accept-Encoding 选择响应编码：优先 br (若已安装 brotli)，其次 gzip。"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class _StreamDecoder:
+    """流式解压请求体，并在解压过程中检查大小上限 (防止压缩炸弹)。"""
+
+    def __init__(self, encoding: str, max_size: int):
+        self.max_size = max_size
+        self.total = 0
+        if encoding == "br":
+            self._brotli = brotli.Decompressor()
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.decompressobj(32 + zlib.MAX_WBITS)  # 自动识别 gzip / zlib 头
+
+    def decode(self, chunk: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._check(self._brotli.process(chunk))
+        out = []
+        while chunk:
+            piece = self._zlib.decompress(chunk, self.max_size - self.total + 1)
+            out.append(self._check(piece))
+            chunk = self._zlib.unconsumed_tail
+        return b"".join(out)
+
+    def _check(self, piece: bytes) -> bytes:
+        self.total += len(piece)
+        if self.total > self.max_size:
+            raise HTTPException(status_code=413, detail="Request body too large.")
+        return piece
+
+
+class _ResponseEncoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=5)
+        else:
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + (self._compressor.finish() if final else self._compressor.flush())
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml")
+
+
+class CompressionMiddleware:
+    """
+    ASGI 中间件：
+    - 按 Accept-Encoding 协商，以 br 或 gzip 压缩响应 (支持流式响应)；
+    - 解压带 Content-Encoding (gzip / deflate / br) 的请求体，供客户端上传压缩后的数据。
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, max_request_size: int = 32 * 1024 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_request_size = max_request_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        request_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if request_encoding != "identity":
+            if request_encoding not in ("gzip", "deflate") and not (request_encoding == "br" and brotli is not None):
+                await self._reject(send, 415, b"Unsupported Content-Encoding.")
+                return
+            scope, receive = self._decoding(scope, receive, request_encoding)
+
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, self._encoding_send(send, encoding))
+
+    def _decoding(self, scope, receive, encoding):
+        decoder = _StreamDecoder(encoding, self.max_request_size)
+
+        async def decoding_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                message = dict(message, body=decoder.decode(message.get("body", b"")))
+            return message
+
+        # 解压后长度未知，去掉原始的 Content-Encoding / Content-Length
+        scope = dict(scope)
+        scope["headers"] = [
+            (k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")
+        ]
+        return scope, decoding_receive
+
+    def _encoding_send(self, send, encoding):
+        state = {"start": None, "encoder": None, "passthrough": False}
+
+        async def encoding_send(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                state["start"] = None
+                response_headers = MutableHeaders(raw=start["headers"])
+                content_type = response_headers.get("content-type", "")
+                if (
+                    "content-encoding" in response_headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                state["encoder"] = _ResponseEncoder(encoding)
+                response_headers["Content-Encoding"] = encoding
+                response_headers.add_vary_header("Accept-Encoding")
+                # 压缩后的表示与原始字节不同，强 ETag 降级为弱 ETag
+                etag = response_headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    response_headers["ETag"] = "W/" + etag
+                if more_body:
+                    del response_headers["content-length"]
+                    await send(start)
+                else:
+                    body = state["encoder"].compress(body, final=True)
+                    response_headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+            await send({
+                "type": "http.response.body",
+                "body": state["encoder"].compress(body, final=not more_body),
+                "more_body": more_body,
+            })
+
+        return encoding_send
+
+    @staticmethod
+    async def _reject(send, status: int, detail: bytes):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(detail)).encode())],
+        })
+        await send({"type": "http.response.body", "body": detail})
@@ -0,0 +1,24 @@
+# backend/gunicorn.conf.py
+# gunicorn 配置: gunicorn -c backend/gunicorn.conf.py backend.api_server:app
+
+import os
+import shutil
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # 多进程指标目录在每次启动时清空，避免把上一次运行的数据计入
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # worker 退出后清理其 gauge 数据；计数器和直方图的数据会被保留并继续汇总
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,107 @@
+# backend/manage.py
+# 后端维护命令，例如:
+#   python backend/manage.py compress-blobs --batch-size 200
+#   python backend/manage.py sweep-expired
+#   python backend/manage.py partition-shares
+
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+try:
+    from backend.api_server import EXPIRY_SWEEP_BATCH_SIZE, SessionLocal, SnippetBlob, engine, sweep_expired_snippets
+    from backend.compression import CODEC_PLAIN, STORAGE_CODEC, compress_content, decompress_content
+    from backend.partitions import is_partitioned, partition_shares, unpartition_shares
+except ImportError:  # 在 backend/ 目录内直接运行
+    from api_server import EXPIRY_SWEEP_BATCH_SIZE, SessionLocal, SnippetBlob, engine, sweep_expired_snippets
+    from compression import CODEC_PLAIN, STORAGE_CODEC, compress_content, decompress_content
+    from partitions import is_partitioned, partition_shares, unpartition_shares
+
+
+async def compress_blobs(batch_size: int = 200, codec: str = STORAGE_CODEC) -> int:
+    """把已有的 plain blob 按当前的存储压缩配置分批重写，返回被压缩的 blob 数量。"""
+    compressed = 0
+    last_id = 0
+    while True:
+        async with SessionLocal() as db:
+            blobs = (await db.scalars(
+                select(SnippetBlob)
+                .where(SnippetBlob.id > last_id, SnippetBlob.codec == CODEC_PLAIN)
+                .order_by(SnippetBlob.id)
+                .limit(batch_size)
+            )).all()
+            if not blobs:
+                return compressed
+            for blob in blobs:
+                new_codec, payload = compress_content(blob.content.encode("utf-8"), codec)
+                if new_codec != CODEC_PLAIN:
+                    blob.codec, blob.data, blob.content = new_codec, payload, None
+                    compressed += 1
+            last_id = blobs[-1].id
+            await db.commit()
+        print(f"已处理至 blob #{last_id}，累计压缩 {compressed} 个。")
+
+
+async def decompress_blobs(batch_size: int = 200) -> int:
+    """把所有压缩过的 blob 还原为 plain 存储 (降级迁移前使用)，返回被还原的 blob 数量。"""
+    restored = 0
+    while True:
+        async with SessionLocal() as db:
+            blobs = (await db.scalars(
+                select(SnippetBlob).where(SnippetBlob.codec != CODEC_PLAIN).limit(batch_size)
+            )).all()
+            if not blobs:
+                return restored
+            for blob in blobs:
+                blob.content = decompress_content(blob.codec, blob.data).decode("utf-8")
+                blob.codec, blob.data = CODEC_PLAIN, None
+            restored += len(blobs)
+            await db.commit()
+
+
+async def convert_shares(partitioned: bool) -> bool:
+    """
+    把 shared_snippets 转换为按周分区的表 (partitioned=True) 或普通表，仅支持 PostgreSQL。
+    转换期间整张表被独占锁定，应在维护窗口执行，完成后重启服务。已是目标结构时返回 False。
+    """
+    async with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            raise SystemExit("分区存储仅支持 PostgreSQL，其他数据库使用逐行的过期清理。")
+        if await conn.run_sync(is_partitioned) == partitioned:
+            return False
+        await conn.run_sync(partition_shares if partitioned else unpartition_shares)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeSharer 后端维护命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compress_parser = subparsers.add_parser("compress-blobs", help="按存储压缩配置压缩已有的片段内容")
+    compress_parser.add_argument("--batch-size", type=int, default=200)
+    compress_parser.add_argument("--codec", default=STORAGE_CODEC, help="zlib 或 zstd")
+
+    decompress_parser = subparsers.add_parser("decompress-blobs", help="把压缩过的片段内容还原为明文存储")
+    decompress_parser.add_argument("--batch-size", type=int, default=200)
+
+    sweep_parser = subparsers.add_parser("sweep-expired", help="分批删除过期的分享 (可由 cron 等定时执行)")
+    sweep_parser.add_argument("--batch-size", type=int, default=EXPIRY_SWEEP_BATCH_SIZE)
+
+    subparsers.add_parser("partition-shares", help="把分享表改为按过期时间逐周分区 (PostgreSQL)")
+    subparsers.add_parser("unpartition-shares", help="把按周分区的分享表还原为普通表")
+
+    args = parser.parse_args()
+    if args.command == "compress-blobs":
+        print(f"完成，共压缩 {asyncio.run(compress_blobs(args.batch_size, args.codec))} 个 blob。")
+    elif args.command == "decompress-blobs":
+        print(f"完成，共还原 {asyncio.run(decompress_blobs(args.batch_size))} 个 blob。")
+    elif args.command == "sweep-expired":
+        print(f"完成，共删除 {asyncio.run(sweep_expired_snippets(args.batch_size))} 个过期分享。")
+    elif args.command in ("partition-shares", "unpartition-shares"):
+        changed = asyncio.run(convert_shares(args.command == "partition-shares"))
+        print("完成，请重启服务。" if changed else "分享表已是目标结构，无需转换。")
+
+
+if __name__ == "__main__":
+    main()
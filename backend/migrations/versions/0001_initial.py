@@ -0,0 +1,46 @@
+"""initial shared_snippets table
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_initial"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """创建最初的 shared_snippets 表。
+
+    引入迁移之前的部署已由 create_all 建好此表，此时直接跳过，
+    这样已有数据库无需手动 stamp 即可从这里开始升级。
+    """
+    if sa.inspect(op.get_bind()).has_table("shared_snippets"):
+        return
+    op.create_table(
+        "shared_snippets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("share_id", sa.String(length=12), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("language", sa.String(length=50), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_shared_snippets_id", "shared_snippets", ["id"])
+    op.create_index("ix_shared_snippets_share_id", "shared_snippets", ["share_id"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_shared_snippets_share_id", table_name="shared_snippets")
+    op.drop_index("ix_shared_snippets_id", table_name="shared_snippets")
+    op.drop_table("shared_snippets")
@@ -0,0 +1,117 @@
+"""content-addressed snippet_blobs storage
+
+Revision ID: 0002_snippet_blobs
+Revises: 0001_initial
+Create Date: 2026-10-17 00:00:00
+
+"""
+import hashlib
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_snippet_blobs"
+down_revision: Union[str, Sequence[str], None] = "0001_initial"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+shared_snippets = sa.table(
+    "shared_snippets",
+    sa.column("id", sa.Integer),
+    sa.column("blob_id", sa.Integer),
+    sa.column("content", sa.Text),
+)
+snippet_blobs = sa.table(
+    "snippet_blobs",
+    sa.column("id", sa.Integer),
+    sa.column("content_hash", sa.String),
+    sa.column("content", sa.Text),
+    sa.column("size", sa.Integer),
+    sa.column("ref_count", sa.Integer),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def upgrade() -> None:
+    """创建 snippet_blobs 表，并把已有分享的内联内容分批迁移为去重的 blob。"""
+    op.create_table(
+        "snippet_blobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_snippet_blobs_id", "snippet_blobs", ["id"])
+    op.create_index("ix_snippet_blobs_content_hash", "snippet_blobs", ["content_hash"], unique=True)
+
+    with op.batch_alter_table("shared_snippets") as batch_op:
+        batch_op.add_column(sa.Column("blob_id", sa.Integer(), nullable=True))
+        batch_op.alter_column("content", existing_type=sa.Text(), nullable=True)
+        batch_op.create_foreign_key("fk_shared_snippets_blob_id", "snippet_blobs", ["blob_id"], ["id"])
+        batch_op.create_index("ix_shared_snippets_blob_id", ["blob_id"])
+
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(shared_snippets.c.id, shared_snippets.c.content)
+            .where(shared_snippets.c.id > last_id, shared_snippets.c.blob_id.is_(None))
+            .order_by(shared_snippets.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for row_id, content in rows:
+            data = content.encode("utf-8")
+            digest = hashlib.sha256(data).hexdigest()
+            blob_id = conn.execute(
+                sa.select(snippet_blobs.c.id).where(snippet_blobs.c.content_hash == digest)
+            ).scalar()
+            if blob_id is None:
+                blob_id = conn.execute(
+                    snippet_blobs.insert()
+                    .values(content_hash=digest, content=content, size=len(data), ref_count=1, created_at=datetime.utcnow())
+                    .returning(snippet_blobs.c.id)
+                ).scalar()
+            else:
+                conn.execute(
+                    snippet_blobs.update()
+                    .where(snippet_blobs.c.id == blob_id)
+                    .values(ref_count=snippet_blobs.c.ref_count + 1)
+                )
+            conn.execute(
+                shared_snippets.update()
+                .where(shared_snippets.c.id == row_id)
+                .values(blob_id=blob_id, content=None)
+            )
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    """把 blob 内容写回内联列，然后删除 snippet_blobs 表。"""
+    conn = op.get_bind()
+    conn.execute(
+        shared_snippets.update()
+        .where(shared_snippets.c.blob_id.is_not(None))
+        .values(
+            content=sa.select(snippet_blobs.c.content)
+            .where(snippet_blobs.c.id == shared_snippets.c.blob_id)
+            .scalar_subquery()
+        )
+    )
+    with op.batch_alter_table("shared_snippets") as batch_op:
+        batch_op.drop_index("ix_shared_snippets_blob_id")
+        batch_op.drop_constraint("fk_shared_snippets_blob_id", type_="foreignkey")
+        batch_op.drop_column("blob_id")
+        batch_op.alter_column("content", existing_type=sa.Text(), nullable=False)
+    op.drop_index("ix_snippet_blobs_content_hash", table_name="snippet_blobs")
+    op.drop_index("ix_snippet_blobs_id", table_name="snippet_blobs")
+    op.drop_table("snippet_blobs")
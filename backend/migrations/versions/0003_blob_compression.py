@@ -0,0 +1,38 @@
+"""codec marker and compressed payload column for snippet_blobs
+
+Revision ID: 0003_blob_compression
+Revises: 0002_snippet_blobs
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_blob_compression"
+down_revision: Union[str, Sequence[str], None] = "0002_snippet_blobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """增加 codec / data 列。已有的 blob 保持 plain，可用 manage.py compress-blobs 批量压缩。"""
+    with op.batch_alter_table("snippet_blobs") as batch_op:
+        batch_op.add_column(sa.Column("codec", sa.String(length=16), nullable=False, server_default="plain"))
+        batch_op.add_column(sa.Column("data", sa.LargeBinary(), nullable=True))
+        batch_op.alter_column("content", existing_type=sa.Text(), nullable=True)
+
+
+def downgrade() -> None:
+    """降级前必须先执行 manage.py decompress-blobs，把压缩内容写回 content 列。"""
+    conn = op.get_bind()
+    remaining = conn.execute(sa.text("SELECT COUNT(*) FROM snippet_blobs WHERE codec != 'plain'")).scalar()
+    if remaining:
+        raise RuntimeError(f"{remaining} compressed blobs remain; run `python backend/manage.py decompress-blobs` first.")
+    with op.batch_alter_table("snippet_blobs") as batch_op:
+        batch_op.alter_column("content", existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column("data")
+        batch_op.drop_column("codec")
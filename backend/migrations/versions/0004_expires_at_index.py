@@ -0,0 +1,28 @@
+"""index shared_snippets.expires_at for the expiry sweeper
+
+Revision ID: 0004_expires_at_index
+Revises: 0003_blob_compression
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_expires_at_index"
+down_revision: Union[str, Sequence[str], None] = "0003_blob_compression"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_shared_snippets_expires_at", "shared_snippets", ["expires_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_shared_snippets_expires_at", table_name="shared_snippets")
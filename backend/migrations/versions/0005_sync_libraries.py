@@ -0,0 +1,77 @@
+"""sync libraries: mutable library shares with per-library change versions
+
+Revision ID: 0005_sync_libraries
+Revises: 0004_expires_at_index
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_sync_libraries"
+down_revision: Union[str, Sequence[str], None] = "0004_expires_at_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """创建 sync_libraries 表，并为 shared_snippets 增加同步库相关的列 (普通分享均为空)。"""
+    op.create_table(
+        "sync_libraries",
+        sa.Column("id", sa.String(length=64), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    with op.batch_alter_table("shared_snippets") as batch_op:
+        batch_op.add_column(sa.Column("library_id", sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column("client_uuid", sa.String(length=36), nullable=True))
+        batch_op.add_column(sa.Column("title", sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column("version", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("deleted_at", sa.DateTime(), nullable=True))
+        batch_op.create_foreign_key("fk_shared_snippets_library_id", "sync_libraries", ["library_id"], ["id"])
+        batch_op.create_unique_constraint("uq_shared_snippets_library_uuid", ["library_id", "client_uuid"])
+        batch_op.create_index("ix_shared_snippets_library_version", ["library_id", "version"])
+
+
+def downgrade() -> None:
+    """删除同步库中的分享及同步相关的列 (普通分享不受影响)。"""
+    shared_snippets = sa.table(
+        "shared_snippets",
+        sa.column("library_id", sa.String),
+        sa.column("blob_id", sa.Integer),
+    )
+    snippet_blobs = sa.table(
+        "snippet_blobs",
+        sa.column("id", sa.Integer),
+        sa.column("ref_count", sa.Integer),
+    )
+    conn = op.get_bind()
+    # 先归还同步库分享对 blob 的引用，再删除这些分享和不再被引用的 blob
+    refs = conn.execute(
+        sa.select(shared_snippets.c.blob_id, sa.func.count())
+        .where(shared_snippets.c.library_id.is_not(None), shared_snippets.c.blob_id.is_not(None))
+        .group_by(shared_snippets.c.blob_id)
+    ).all()
+    conn.execute(shared_snippets.delete().where(shared_snippets.c.library_id.is_not(None)))
+    for blob_id, count in refs:
+        conn.execute(
+            snippet_blobs.update().where(snippet_blobs.c.id == blob_id).values(ref_count=snippet_blobs.c.ref_count - count)
+        )
+    conn.execute(snippet_blobs.delete().where(snippet_blobs.c.ref_count <= 0))
+
+    with op.batch_alter_table("shared_snippets") as batch_op:
+        batch_op.drop_index("ix_shared_snippets_library_version")
+        batch_op.drop_constraint("uq_shared_snippets_library_uuid", type_="unique")
+        batch_op.drop_constraint("fk_shared_snippets_library_id", type_="foreignkey")
+        batch_op.drop_column("deleted_at")
+        batch_op.drop_column("updated_at")
+        batch_op.drop_column("version")
+        batch_op.drop_column("title")
+        batch_op.drop_column("client_uuid")
+        batch_op.drop_column("library_id")
+    op.drop_table("sync_libraries")
@@ -0,0 +1,50 @@
+"""expiry buckets for shared_snippets, optionally range-partitioned by week on PostgreSQL
+
+Revision ID: 0006_share_partitions
+Revises: 0005_sync_libraries
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.partitions import SHARE_PARTITIONING, is_partitioned, partition_shares, unpartition_shares
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_share_partitions"
+down_revision: Union[str, Sequence[str], None] = "0005_sync_libraries"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 与 backend.partitions.expiry_bucket_for 相同：自 1970-01-05 (星期一) 起的周数 + 1
+BUCKET_SQL = {
+    "postgresql": "(floor(extract(epoch FROM expires_at - timestamp '1970-01-05'))::bigint / 604800 + 1)::integer",
+    "sqlite": "CAST((strftime('%s', substr(expires_at, 1, 19)) - strftime('%s', '1970-01-05')) / 604800 AS INTEGER) + 1",
+}
+
+
+def upgrade() -> None:
+    """
+    增加 expiry_bucket 列 (永久分享为 0) 并按 expires_at 回填；
+    PostgreSQL 上设置了 SHARE_PARTITIONING=weekly 时，再把 shared_snippets 改为按周范围分区的表。
+    """
+    with op.batch_alter_table("shared_snippets") as batch_op:
+        batch_op.add_column(sa.Column("expiry_bucket", sa.Integer(), nullable=False, server_default="0"))
+    conn = op.get_bind()
+    op.execute(
+        f"UPDATE shared_snippets SET expiry_bucket = {BUCKET_SQL[conn.dialect.name]} WHERE expires_at IS NOT NULL"
+    )
+    if conn.dialect.name == "postgresql" and SHARE_PARTITIONING == "weekly":
+        partition_shares(conn)
+
+
+def downgrade() -> None:
+    """还原为普通表 (如果已分区) 并删除 expiry_bucket 列。"""
+    conn = op.get_bind()
+    if is_partitioned(conn):
+        unpartition_shares(conn)
+    with op.batch_alter_table("shared_snippets") as batch_op:
+        batch_op.drop_column("expiry_bucket")
@@ -0,0 +1,178 @@
+# backend/observability.py
+
+import json
+import logging
+import os
+from time import perf_counter
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+# --- 1. 日志 (Logging) ---
+
+# LOG_LEVEL 控制输出级别；逐请求的日志为 DEBUG 级别，默认不输出
+# LOG_FORMAT: text | json，json 格式每行一个对象，附加字段 (extra) 作为独立的键
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(_extra_fields(record))
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def configure_logging(name: str = "codesharer") -> logging.Logger:
+    """返回后端使用的 logger；重复调用 (例如多次导入) 不会重复添加 handler。"""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        if LOG_FORMAT == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s [%(process)d] %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+    return logger
+
+
+# --- 2. Prometheus 指标 (Metrics) ---
+
+# 在 gunicorn 等多进程部署中，需要在启动前设置 PROMETHEUS_MULTIPROC_DIR (一个空目录)，
+# 各 worker 把指标写入该目录下的文件，/metrics 汇总所有 worker 的数据
+
+REQUEST_LATENCY = Histogram(
+    "codesharer_http_request_duration_seconds",
+    "HTTP 请求处理耗时，按路由模板区分",
+    ["method", "route", "status"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "codesharer_db_query_duration_seconds",
+    "单条 SQL 语句的执行耗时",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "codesharer_db_pool_checkout_seconds",
+    "从连接池取得连接的等待时间 (包括新建连接)",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+CACHE_LOOKUPS = Counter(
+    "codesharer_cache_lookups_total",
+    "缓存查找次数；命中率 = hit / (hit + miss)",
+    ["cache", "result"],
+)
+PAYLOAD_BYTES = Histogram(
+    "codesharer_snippet_payload_bytes",
+    "片段内容的字节数 (upload: 创建分享，download: 读取分享)",
+    ["direction"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+)
+
+_SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "SAVEPOINT", "RELEASE", "ROLLBACK"}
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_payload(direction: str, size: int):
+    PAYLOAD_BYTES.labels(direction).observe(size)
+
+
+def statement_operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in _SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine):
+    """通过 SQLAlchemy 事件钩子记录每条语句的耗时；异步引擎需要挂在其 sync_engine 上。"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is not None:
+            DB_QUERY_LATENCY.labels(statement_operation(statement)).observe(perf_counter() - started)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """记录连接检出等待时间的连接池 (SQLAlchemy 没有“开始等待连接”的事件，只能在池内计时)。"""
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """
+    ASGI 中间件：按 (方法, 路由模板, 状态码) 记录请求耗时。
+    使用路由模板 (如 /api/snippets/{share_id}) 而不是实际路径，避免标签基数随分享ID增长。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(perf_counter() - started)
+
+
+def render_metrics():
+    """返回 (响应体, Content-Type)；多进程模式下汇总所有 worker 的指标。"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,217 @@
+# backend/partitions.py
+# shared_snippets 按过期时间分区存储 (可选，仅 PostgreSQL)：
+# - 每条分享按 expires_at 归入一个按周划分的桶 (expiry_bucket 列)，表按该列做范围分区；
+#   永久分享 (桶 0) 单独一个分区，还没有对应分区的桶 (例如很远的过期时间) 落入默认分区；
+# - 过期清理整块摘除 (DETACH) 并删除 (DROP) 已全部过期的周分区，不再逐行删除，避免表膨胀和 VACUUM 压力；
+# - SQLite 等其他数据库保持普通表，由逐行的过期清理处理 (expiry_bucket 列照常写入，切换数据库无需改数据)。
+# 由迁移 0006 (SHARE_PARTITIONING=weekly) 或 `python backend/manage.py partition-shares` 启用。
+# 这里的函数都接收同步的 Connection (异步代码中通过 AsyncConnection.run_sync 调用)。
+
+import os
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, table, text
+
+# 迁移 0006 是否把 shared_snippets 改为分区表：none (默认) 或 weekly
+SHARE_PARTITIONING = os.getenv("SHARE_PARTITIONING", "none").lower()
+# 预先创建的未来周分区数 (客户端最长的有效期为 30 天)，更远的过期时间先落入默认分区
+SHARE_PARTITION_WEEKS_AHEAD = int(os.getenv("SHARE_PARTITION_WEEKS_AHEAD", "6"))
+
+# 分区表中 share_id 只在 (share_id, expiry_bucket) 上唯一，新分享ID的首字符编码所在的周桶：
+# 永久分享占一个字符，其余桶在 SHARE_ID_BUCKET_CODES 个字符中轮换 (每 61 周即 427 天重复一次)。
+# 服务端允许的最长有效期 MAX_EXPIRY_DAYS 必须明显小于该周期，同时未过期的分享才不会落在首字符相同的不同桶中
+SHARE_ID_BUCKET_CODES = 61
+MAX_EXPIRY_DAYS = 365
+
+# 桶 b (b >= 1) 覆盖 [BUCKET_EPOCH + (b-1) 周, BUCKET_EPOCH + b 周)，BUCKET_EPOCH 是星期一 (UTC)
+BUCKET_EPOCH = datetime(1970, 1, 5)
+BUCKET_WIDTH = timedelta(weeks=1)
+PERMANENT_BUCKET = 0
+
+PARENT_TABLE = "shared_snippets"
+PERMANENT_PARTITION = "shared_snippets_permanent"
+DEFAULT_PARTITION = "shared_snippets_default"
+_WEEKLY_PARTITION = re.compile(r"^shared_snippets_w(\d+)$")
+
+# 维护分区的事务：多个 worker 同时清理时只有取得该 advisory 锁的一个执行；
+# 摘除分区需要短暂独占整张表，等锁超过 lock_timeout 即放弃 (下一轮清理再试)，避免排队阻塞正常读写
+MAINTENANCE_LOCK_KEY = 0x636F6465
+MAINTENANCE_LOCK_TIMEOUT = "500ms"
+
+# 默认分区，其中的过期分享仍逐行清理
+default_partition = table(DEFAULT_PARTITION, column("id"), column("blob_id"), column("expires_at"))
+
+
+def expiry_bucket_for(expires_at: Optional[datetime]) -> int:
+    """过期时间所在的周桶，永久分享为 PERMANENT_BUCKET。"""
+    if expires_at is None:
+        return PERMANENT_BUCKET
+    return (expires_at - BUCKET_EPOCH) // BUCKET_WIDTH + 1
+
+
+def expiry_bucket_default(context) -> int:
+    """SharedSnippet.expiry_bucket 的列默认值：按同一行的 expires_at 计算。"""
+    return expiry_bucket_for(context.get_current_parameters().get("expires_at"))
+
+
+def bucket_expired(bucket: int, now: datetime) -> bool:
+    """桶内的分享是否已全部过期。"""
+    return bucket != PERMANENT_BUCKET and BUCKET_EPOCH + bucket * BUCKET_WIDTH <= now
+
+
+def partition_name(bucket: int) -> str:
+    return f"shared_snippets_w{bucket}"
+
+
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"),
+        {"name": PARENT_TABLE},
+    ).scalar()
+
+
+def weekly_partitions(conn) -> dict:
+    """{桶: 分区表名}"""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name)"
+    ), {"name": PARENT_TABLE}).scalars()
+    return {int(match.group(1)): name for name in names if (match := _WEEKLY_PARTITION.match(name))}
+
+
+def begin_maintenance(conn) -> bool:
+    """在当前事务中取得维护锁并设置锁等待超时；其他 worker 正在维护时返回 False。"""
+    if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}).scalar():
+        return False
+    conn.execute(text(f"SET LOCAL lock_timeout = '{MAINTENANCE_LOCK_TIMEOUT}'"))
+    return True
+
+
+def create_partitions(conn, now: datetime, weeks_ahead: int = SHARE_PARTITION_WEEKS_AHEAD) -> List[int]:
+    """为当前及之后 weeks_ahead 周创建缺少的周分区，返回新建分区的桶。"""
+    existing = weekly_partitions(conn)
+    current = expiry_bucket_for(now)
+    created = []
+    for bucket in range(current, current + weeks_ahead + 1):
+        if bucket not in existing:
+            attach_partition(conn, bucket)
+            created.append(bucket)
+    return created
+
+
+def attach_partition(conn, bucket: int):
+    """
+    创建一个周分区：先建普通表，把默认分区中属于该桶的分享移过去，再 ATTACH 到分区表
+    (ATTACH 只需 SHARE UPDATE EXCLUSIVE 锁，不阻塞对分区表的读写)。
+    """
+    name = partition_name(bucket)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE expiry_bucket = :bucket RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"bucket": bucket})
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({bucket}) TO ({bucket + 1})"))
+
+
+def expired_partitions(conn, now: datetime) -> List[str]:
+    """已全部过期的周分区，按时间先后排列。"""
+    return [name for bucket, name in sorted(weekly_partitions(conn).items()) if bucket_expired(bucket, now)]
+
+
+def drop_partition(conn, name: str) -> Tuple[Counter, int]:
+    """
+    摘除并删除一个周分区，返回 (其中分享对各 blob 的引用数, 分享数量)。
+    调用方在同一事务中归还 blob 引用 (必须在分区删除之后，否则仍被分区中的外键引用)；
+    分区已被其他 worker 删除时返回空结果。
+    """
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+        return Counter(), 0
+    counts = conn.execute(text(f"SELECT blob_id, count(*) FROM {name} GROUP BY blob_id")).all()
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    refs = Counter({blob_id: count for blob_id, count in counts if blob_id is not None})
+    return refs, sum(count for _, count in counts)
+
+
+# --- 普通表与分区表之间的转换 (迁移 0006 和 manage.py 使用) ---
+
+def partition_shares(conn, now: Optional[datetime] = None, weeks_ahead: int = SHARE_PARTITION_WEEKS_AHEAD):
+    """
+    把普通的 shared_snippets 表改为按 expiry_bucket 范围分区的表 (整张表加独占锁复制一遍，应在维护窗口执行)。
+
+    分区表的主键和唯一约束必须包含分区键：主键为 (id, expiry_bucket)，share_id 的唯一索引为
+    (share_id, expiry_bucket)；转换后新分享ID的首字符编码所在的桶 (见 api_server.generate_share_id)，
+    在有效期不超过 MAX_EXPIRY_DAYS 的前提下，未过期的分享之间不会出现相同的ID
+    (转换前生成的完全随机的ID与之重复的概率可以忽略)。
+    """
+    now = now or datetime.utcnow()
+    sequence = _id_sequence(conn)
+    conn.execute(text(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO shared_snippets_unpartitioned"))
+    conn.execute(text(
+        f"CREATE TABLE {PARENT_TABLE} (LIKE shared_snippets_unpartitioned INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE (expiry_bucket)"
+    ))
+    conn.execute(text(
+        f"CREATE TABLE {PERMANENT_PARTITION} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ({PERMANENT_BUCKET}) TO ({PERMANENT_BUCKET + 1})"
+    ))
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+
+    # 已有分享 (包括还未清理的过期分享) 所在的桶和未来几周各建一个分区，更远的桶留在默认分区
+    last = expiry_bucket_for(now) + weeks_ahead
+    buckets = set(conn.execute(
+        text("SELECT DISTINCT expiry_bucket FROM shared_snippets_unpartitioned WHERE expiry_bucket > :permanent AND expiry_bucket <= :last"),
+        {"permanent": PERMANENT_BUCKET, "last": last},
+    ).scalars())
+    for bucket in sorted(buckets | set(range(expiry_bucket_for(now), last + 1))):
+        conn.execute(text(
+            f"CREATE TABLE {partition_name(bucket)} PARTITION OF {PARENT_TABLE} FOR VALUES FROM ({bucket}) TO ({bucket + 1})"
+        ))
+
+    _swap_tables(conn, sequence, partitioned=True)
+
+
+def unpartition_shares(conn):
+    """把分区表还原为普通表 (迁移 0006 降级时使用)。"""
+    sequence = _id_sequence(conn)
+    conn.execute(text(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO shared_snippets_unpartitioned"))
+    conn.execute(text(f"CREATE TABLE {PARENT_TABLE} (LIKE shared_snippets_unpartitioned INCLUDING DEFAULTS)"))
+    _swap_tables(conn, sequence, partitioned=False)
+
+
+def _id_sequence(conn) -> str:
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:name, 'id')"), {"name": PARENT_TABLE}).scalar()
+    if sequence is None:
+        raise RuntimeError("shared_snippets.id 没有关联的序列，无法转换表结构")
+    return sequence
+
+
+def _swap_tables(conn, sequence: str, partitioned: bool):
+    """把旧表 (shared_snippets_unpartitioned) 的数据复制到新的 shared_snippets，删除旧表后重建索引和约束。"""
+    conn.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM shared_snippets_unpartitioned"))
+    # 新表的 id 默认值沿用同一个序列，删除旧表前先解除序列与旧表的归属关系
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    conn.execute(text("DROP TABLE shared_snippets_unpartitioned"))
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id"))
+
+    # 索引和约束名与迁移 0001-0005 创建的一致
+    key = ", expiry_bucket" if partitioned else ""
+    for statement in (
+        f"ALTER TABLE {PARENT_TABLE} ADD CONSTRAINT shared_snippets_pkey PRIMARY KEY (id{key})",
+        f"CREATE INDEX ix_shared_snippets_id ON {PARENT_TABLE} (id)",
+        f"CREATE UNIQUE INDEX ix_shared_snippets_share_id ON {PARENT_TABLE} (share_id{key})",
+        f"CREATE INDEX ix_shared_snippets_blob_id ON {PARENT_TABLE} (blob_id)",
+        f"CREATE INDEX ix_shared_snippets_expires_at ON {PARENT_TABLE} (expires_at)",
+        f"CREATE INDEX ix_shared_snippets_library_version ON {PARENT_TABLE} (library_id, version)",
+        f"ALTER TABLE {PARENT_TABLE} ADD CONSTRAINT uq_shared_snippets_library_uuid UNIQUE (library_id, client_uuid{key})",
+        f"ALTER TABLE {PARENT_TABLE} ADD CONSTRAINT fk_shared_snippets_blob_id FOREIGN KEY (blob_id) REFERENCES snippet_blobs (id)",
+        f"ALTER TABLE {PARENT_TABLE} ADD CONSTRAINT fk_shared_snippets_library_id FOREIGN KEY (library_id) REFERENCES sync_libraries (id)",
+    ):
+        conn.execute(text(statement))
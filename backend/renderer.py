@@ -0,0 +1,150 @@
+# backend/renderer.py
+
+import hashlib
+import html
+import os
+import tempfile
+import threading
+from typing import Optional
+
+import pygments
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.lexers.special import TextLexer
+from pygments.util import ClassNotFound
+
+# 与桌面客户端 SyntaxHighlighter 使用相同的 Pygments 样式
+RENDER_STYLE = "default"
+
+
+def render_snippet_html(content: str, language: str) -> str:
+    """
+    用 Pygments 把片段渲染为带行号的高亮 HTML 片段。
+    lexer 的选择方式与客户端 SyntaxHighlighter.set_language 一致，无效语言按纯文本处理。
+    该函数是模块级函数，可以直接提交给进程池执行。
+    """
+    try:
+        lexer = get_lexer_by_name(language)
+    except ClassNotFound:
+        lexer = TextLexer()
+    formatter = HtmlFormatter(style=RENDER_STYLE, linenos="table", cssclass="highlight")
+    return highlight(content, lexer, formatter)
+
+
+def render_cache_key(content_digest: str, language: str) -> str:
+    """渲染结果只取决于内容、语言、样式和 Pygments 版本；相同内容的不同分享共用一份缓存。"""
+    raw = f"{pygments.__version__}:{RENDER_STYLE}:{language}:{content_digest}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """
+    有大小上限的磁盘缓存，保存渲染好的 HTML 片段，供同一主机上的所有 worker 共享。
+
+    写入使用临时文件 + os.replace 保证原子性；读取时刷新文件的修改时间，
+    超出 max_bytes 时按修改时间淘汰最久未使用的文件。
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._approx_bytes = self._scan_total()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".html")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rendered = f.read()
+            os.utime(path)
+            return rendered
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, rendered: str):
+        if self.max_bytes <= 0:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = rendered.encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._approx_bytes += len(data)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".html"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_total(self) -> int:
+        return sum(size for _, size, _ in self._scan())
+
+    def _evict(self):
+        # 调用方必须已持有锁；其他 worker 也可能在写入，因此以实际扫描结果为准
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._approx_bytes = total
+
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title} - CodeSharer</title>
+<style>
+body {{ margin: 0; font-family: -apple-system, "Segoe UI", sans-serif; background: #fafafa; }}
+header {{ padding: 12px 20px; border-bottom: 1px solid #ddd; background: #fff; }}
+header a {{ margin-left: 12px; color: #555; font-size: 14px; }}
+main {{ padding: 16px 20px; overflow-x: auto; }}
+.highlight pre {{ margin: 0; font-family: "Courier New", monospace; font-size: 14px; }}
+.highlighttable td.linenos {{ color: #999; padding-right: 12px; user-select: none; }}
+{style_defs}
+</style>
+</head>
+<body>
+<header><strong>{title}</strong><a href="{raw_url}">raw</a><a href="{json_url}">json</a></header>
+<main>{body}</main>
+</body>
+</html>
+"""
+
+_STYLE_DEFS = HtmlFormatter(style=RENDER_STYLE, cssclass="highlight").get_style_defs(".highlight")
+
+
+def render_page(share_id: str, language: str, body: str) -> str:
+    """把渲染好的高亮片段包装成完整的 HTML 页面。"""
+    return PAGE_TEMPLATE.format(
+        title=html.escape(f"{share_id} ({language})"),
+        raw_url=f"/api/snippets/{share_id}/raw",
+        json_url=f"/api/snippets/{share_id}",
+        style_defs=_STYLE_DEFS,
+        body=body,
+    )
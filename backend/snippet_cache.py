@@ -0,0 +1,214 @@
+# backend/snippet_cache.py
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from time import monotonic
+from typing import Awaitable, Callable, Optional
+
+
+class SnippetCache:
+    """
+    进程内(每个 gunicorn worker 一份)的 LRU 读缓存，按 share_id 缓存片段内容。
+
+    - 同时按条目数 (max_entries) 和内容字节数 (max_bytes) 进行淘汰。
+    - 每个条目有 TTL；若片段带有 expires_at，则以两者中较早者为准，
+      保证已过期的片段永远不会从缓存中返回。
+    - 记录命中/未命中次数，供统计端点使用。
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # share_id -> (value, size, deadline, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, share_id: str) -> Optional[dict]:
+        """返回缓存的片段数据；未命中、TTL 到期或片段已过期时返回 None。"""
+        with self._lock:
+            entry = self._entries.get(share_id)
+            if entry is not None:
+                value, size, deadline, expires_at = entry
+                if monotonic() < deadline and (expires_at is None or expires_at > datetime.utcnow()):
+                    self._entries.move_to_end(share_id)
+                    self.hits += 1
+                    return value
+                self._remove(share_id)
+            self.misses += 1
+            return None
+
+    def put(self, share_id: str, value: dict, size: int, expires_at: Optional[datetime] = None):
+        """放入一个片段。超过 max_bytes 的单个片段不会被缓存。"""
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        if expires_at is not None and expires_at <= datetime.utcnow():
+            return
+        with self._lock:
+            if share_id in self._entries:
+                self._remove(share_id)
+            self._entries[share_id] = (value, size, monotonic() + self.ttl, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, share_id: str):
+        """从缓存中移除一个片段 (例如片段被删除时)。"""
+        with self._lock:
+            if share_id in self._entries:
+                self._remove(share_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """返回缓存的统计信息。"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, share_id: str):
+        # 调用方必须已持有锁
+        _, size, _, _ = self._entries.pop(share_id)
+        self._bytes -= size
+
+
+class NegativeCache:
+    """
+    进程内的"不存在"缓存：记录最近查询过但不存在 (或已过期、已删除) 的 share_id，
+    在短 TTL 内直接返回 404，爬虫反复请求随机或过期的ID时不必每次查询数据库。
+
+    - 条目数超过 max_entries 时淘汰最早加入的条目；
+    - TTL 很短，且创建分享后调用 invalidate，新分享不会被误判为不存在
+      (其他 worker 中的条目最迟在 TTL 后过期)。
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 10.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # share_id -> deadline
+        self._lock = threading.Lock()
+
+    def contains(self, share_id: str) -> bool:
+        """share_id 最近被确认为不存在且尚未到期时返回 True。"""
+        with self._lock:
+            deadline = self._entries.get(share_id)
+            if deadline is not None:
+                if monotonic() < deadline:
+                    self.hits += 1
+                    return True
+                del self._entries[share_id]
+            self.misses += 1
+            return False
+
+    def add(self, share_id: str):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(share_id, None)
+            self._entries[share_id] = monotonic() + self.ttl
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, share_id: str):
+        """share_id 现在存在了 (例如刚创建或被同步恢复)。"""
+        with self._lock:
+            self._entries.pop(share_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class SingleFlight:
+    """
+    按键合并并发的异步加载：同一个键同时只执行一次加载，期间到达的请求等待并共享同一个结果
+    (或同一个异常)。例如热门链接刚发布时的大量并发请求只查询一次数据库。
+
+    只在同一个事件循环 (同一个 worker 进程) 内合并。发起加载的请求被取消 (例如客户端断开) 时，
+    等待中的请求重新发起加载，而不是跟着失败。
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}  # key -> asyncio.Future
+
+    async def do(self, key: str, load: Callable[[], Awaitable]):
+        while key in self._calls:
+            future = self._calls[key]
+            self.coalesced += 1
+            try:
+                # shield: 等待者自身被取消时不能取消共享的 future
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 没有等待者时也不产生 "exception was never retrieved" 警告
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "coalesced": self.coalesced}
+
+
+def cache_from_env() -> SnippetCache:
+    """根据环境变量构建缓存实例。将 SNIPPET_CACHE_MAX_ENTRIES 设为 0 可禁用缓存。"""
+    return SnippetCache(
+        max_entries=int(os.getenv("SNIPPET_CACHE_MAX_ENTRIES", "1024")),
+        max_bytes=int(os.getenv("SNIPPET_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        ttl=float(os.getenv("SNIPPET_CACHE_TTL", "300")),
+    )
+
+
+def negative_cache_from_env() -> NegativeCache:
+    """根据环境变量构建"不存在"缓存。将 SNIPPET_NEGATIVE_CACHE_MAX_ENTRIES 设为 0 可禁用。"""
+    return NegativeCache(
+        max_entries=int(os.getenv("SNIPPET_NEGATIVE_CACHE_MAX_ENTRIES", "10000")),
+        ttl=float(os.getenv("SNIPPET_NEGATIVE_CACHE_TTL", "10")),
+    )
@@ -0,0 +1,46 @@
+# backend/textdiff.py
+# 基于行的文本差异，用于同步时只上传片段被修改的部分 (客户端生成，服务端应用)。
+# 只依赖标准库，客户端直接以 backend.textdiff 导入。
+
+from difflib import SequenceMatcher
+
+
+def make_diff(old: str, new: str) -> list:
+    """
+    计算把 old 变为 new 的差异，返回 [[保留行数, 删除行数, 插入的文本], ...]：
+    依次从 old 的当前位置保留若干行、删除若干行，再插入一段文本；最后一个操作之后的行全部保留。
+    行按 str.splitlines(keepends=True) 切分，换行符属于行的一部分。
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops = []
+    keep = 0
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag == "equal":
+            keep += i2 - i1
+        else:
+            ops.append([keep, i2 - i1, "".join(new_lines[j1:j2])])
+            keep = 0
+    return ops
+
+
+def apply_diff(old: str, ops) -> str:
+    """把 make_diff 生成的差异应用到 old 上；差异格式错误或与 old 不匹配时抛出 ValueError。"""
+    lines = old.splitlines(keepends=True)
+    if not isinstance(ops, list):
+        raise ValueError("diff must be a list")
+    out = []
+    position = 0
+    for op in ops:
+        if not (isinstance(op, list) and len(op) == 3):
+            raise ValueError(f"invalid diff operation: {op!r}")
+        keep, remove, text = op
+        if not (isinstance(keep, int) and isinstance(remove, int) and isinstance(text, str)) or keep < 0 or remove < 0:
+            raise ValueError(f"invalid diff operation: {op!r}")
+        if position + keep + remove > len(lines):
+            raise ValueError("diff does not match the base text")
+        out.extend(lines[position:position + keep])
+        out.append(text)
+        position += keep + remove
+    out.extend(lines[position:])
+    return "".join(out)
@@ -0,0 +1,161 @@
+# benchmarks/bench_api.py
+# 分享API的负载测试：在临时 SQLite 数据库上按比例混合执行创建/读取请求。
+# 默认通过进程内 ASGI 客户端调用 (不经过网络)，也可以启动本地 uvicorn 或指向已运行的服务。
+
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+try:
+    from benchmarks.common import REPO_ROOT, summarize
+except ImportError:
+    from common import REPO_ROOT, summarize
+
+
+def sample_content(rng: random.Random, size: int) -> str:
+    """生成大约 size 字节、内容各不相同的 Python 代码，避免全部命中内容去重。"""
+    lines = []
+    total = 0
+    while total < size:
+        line = f"def handler_{rng.randrange(10 ** 9)}(value):  return value * {rng.randrange(1000)}\n"
+        lines.append(line)
+        total += len(line)
+    return "".join(lines)
+
+
+def benchmark_env(workdir: str, use_cache: bool) -> Dict[str, str]:
+    """被测服务使用的环境变量：独立的临时数据库，关闭后台清理，避免干扰测量。"""
+    return {
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "RENDER_CACHE_DIR": os.path.join(workdir, "render_cache"),
+        "EXPIRY_SWEEP_INTERVAL": "0",
+        "RENDER_ON_CREATE": "false",
+        "SNIPPET_CACHE_MAX_ENTRIES": "1024" if use_cache else "0",
+    }
+
+
+async def run_workload(client: httpx.AsyncClient, requests_total: int, concurrency: int,
+                       create_ratio: float, payload_bytes: int, seed_count: int, seed: int) -> Dict[str, dict]:
+    rng = random.Random(seed)
+
+    share_ids: List[str] = []
+    for _ in range(seed_count):
+        response = await client.post("/api/snippets", json={"content": sample_content(rng, payload_bytes), "language": "python"})
+        response.raise_for_status()
+        share_ids.append(response.json()["share_id"])
+
+    # 预先生成操作序列，保证相同参数下每次运行的请求完全一致
+    operations = []
+    for _ in range(requests_total):
+        if rng.random() < create_ratio:
+            operations.append(("create", sample_content(rng, payload_bytes)))
+        else:
+            operations.append(("get", rng.choice(share_ids)))
+
+    samples = {"create": [], "get": []}
+    errors = 0
+    queue = iter(operations)
+
+    async def worker():
+        nonlocal errors
+        for kind, arg in queue:
+            started = time.perf_counter()
+            if kind == "create":
+                response = await client.post("/api/snippets", json={"content": arg, "language": "python"})
+            else:
+                response = await client.get(f"/api/snippets/{arg}")
+            samples[kind].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {kind: summarize(values, elapsed) for kind, values in samples.items() if values}
+    results["mixed"] = summarize(samples["create"] + samples["get"], elapsed)
+    results["mixed"]["errors"] = errors
+    return results
+
+
+async def run_inprocess(workdir: str, use_cache: bool, **workload) -> Dict[str, dict]:
+    os.environ.update(benchmark_env(workdir, use_cache))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from backend.api_server import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_workload(client, **workload)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/openapi.json")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready in {timeout}s")
+
+
+async def run_http(base_url: str, concurrency: int, **workload) -> Dict[str, dict]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        return await run_workload(client, concurrency=concurrency, **workload)
+
+
+def run_uvicorn(workdir: str, use_cache: bool, **workload) -> Dict[str, dict]:
+    """在子进程中启动一个本地 uvicorn (单 worker)，通过真实的 HTTP 连接施压。"""
+    port = free_port()
+    env = dict(os.environ, **benchmark_env(workdir, use_cache))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.api_server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=REPO_ROOT, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_until_ready(base_url))
+        return asyncio.run(run_http(base_url, **workload))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def run(mode: str = "inprocess", url: str = None, requests_total: int = 2000, concurrency: int = 16,
+        create_ratio: float = 0.2, payload_bytes: int = 2048, seed_count: int = 200,
+        use_cache: bool = True, seed: int = 42) -> Dict[str, dict]:
+    """
+    运行API负载测试，返回 {"api.<mode>.<create|get|mixed>": 统计值}。
+    mode: inprocess (进程内 ASGI) | uvicorn (启动本地服务) | url (指向已运行的服务，需传入 url)。
+    """
+    workload = dict(requests_total=requests_total, concurrency=concurrency, create_ratio=create_ratio,
+                    payload_bytes=payload_bytes, seed_count=seed_count, seed=seed)
+    if mode == "url":
+        results = asyncio.run(run_http(url, **workload))
+    else:
+        with tempfile.TemporaryDirectory(prefix="codesharer-bench-") as workdir:
+            if mode == "uvicorn":
+                results = run_uvicorn(workdir, use_cache, **workload)
+            else:
+                results = asyncio.run(run_inprocess(workdir, use_cache, **workload))
+    return {f"api.{mode}.{kind}": stats for kind, stats in results.items()}
@@ -0,0 +1,77 @@
+# benchmarks/bench_db.py
+# 本地数据库层 (database/db_handler.py) 的 CRUD 微基准，使用临时目录中的独立数据库文件。
+
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+try:
+    from benchmarks.common import REPO_ROOT, summarize
+except ImportError:
+    from common import REPO_ROOT, summarize
+
+
+def measure(func: Callable, args_list: List[tuple]) -> List[float]:
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run(rows: int = 1000, list_repeats: int = 50, content_bytes: int = 2048, seed: int = 42) -> Dict[str, dict]:
+    """依次测量 add / get_all / get_by_id / update / delete，返回 {"db.<操作>": 统计值}。"""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from database import db_handler
+
+    rng = random.Random(seed)
+    content = ("x = 1  # padding\n" * (content_bytes // 17 + 1))[:content_bytes]
+    results = {}
+    original_dir, original_path = db_handler.DB_DIR, db_handler.DB_PATH
+    with tempfile.TemporaryDirectory(prefix="codesharer-bench-") as workdir:
+        db_handler.DB_DIR = workdir
+        db_handler.DB_PATH = os.path.join(workdir, "local_storage.db")
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                db_handler.init_db()
+
+            samples = []
+            ids = []
+            for i in range(rows):
+                started = time.perf_counter()
+                ids.append(db_handler.add_snippet(f"snippet {i}", content, "python"))
+                samples.append(time.perf_counter() - started)
+            results["db.add_snippet"] = summarize(samples)
+
+            results["db.get_all_snippets"] = summarize(measure(db_handler.get_all_snippets, [()] * list_repeats))
+            results["db.get_snippet_by_id"] = summarize(
+                measure(db_handler.get_snippet_by_id, [(rng.choice(ids),) for _ in range(rows)])
+            )
+            results["db.update_snippet"] = summarize(measure(
+                db_handler.update_snippet,
+                [(snippet_id, f"updated {snippet_id}", content + "\n# edited", "python") for snippet_id in rng.sample(ids, len(ids))],
+            ))
+            results["db.search_snippets"] = summarize(measure(
+                db_handler.search_snippets, [(f"updated {rng.choice(ids)}",) for _ in range(list_repeats)]
+            ))
+            results["db.delete_snippet"] = summarize(measure(db_handler.delete_snippet, [(snippet_id,) for snippet_id in ids]))
+
+            # 批量接口：所有行在同一个事务中写入/删除
+            batch = [(f"batch {i}", content, "python") for i in range(rows)]
+            started = time.perf_counter()
+            ids = db_handler.add_snippets(batch)
+            results["db.add_snippets_batch"] = summarize([time.perf_counter() - started])
+            started = time.perf_counter()
+            db_handler.delete_snippets(ids)
+            results["db.delete_snippets_batch"] = summarize([time.perf_counter() - started])
+        finally:
+            db_handler.close_connection()
+            db_handler.DB_DIR, db_handler.DB_PATH = original_dir, original_path
+    return results
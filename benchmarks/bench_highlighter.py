@@ -0,0 +1,273 @@
+# benchmarks/bench_highlighter.py
+# SyntaxHighlighter 在大文档上的微基准：整篇重新高亮，在文档中间输入单个字符后的重新高亮，
+# 以及后台模式下载入文档时阻塞界面的时间和全部高亮完成的时间。
+# 计时之前先检查逐行高亮的结果与整篇文档词法分析的结果一致 (check_consistency)，
+# 也可以单独运行: python -m benchmarks.bench_highlighter
+
+import os
+import random
+import sys
+import time
+from typing import Dict
+
+try:
+    from benchmarks.common import REPO_ROOT, summarize
+except ImportError:
+    from common import REPO_ROOT, summarize
+
+
+def sample_document(lines: int) -> str:
+    """生成包含多行字符串、注释和嵌套结构的 Python 源码，覆盖 lexer 的常见状态。"""
+    chunk = (
+        'class Handler{n}(Base):\n'
+        '    """处理第 {n} 类请求。\n'
+        '    多行文档字符串会跨越多个文本块。\n'
+        '    """\n'
+        '    def run(self, items):  # 注释\n'
+        '        total = sum(x * {n} for x in items if x % 2 == 0)\n'
+        '        return {{"id": {n}, "total": total, "name": f"handler-{{total}}"}}\n'
+        '\n'
+    )
+    blocks = []
+    n = 0
+    while len(blocks) < lines:
+        blocks.extend(chunk.format(n=n).splitlines())
+        n += 1
+    return "\n".join(blocks[:lines])
+
+
+# 含跨行结构的示例：文档字符串、多行字符串、块注释、原始字符串和 heredoc
+CONSISTENCY_SAMPLES = {
+    "python": (
+        'import os\n'
+        '\n'
+        '\n'
+        'def load(path):\n'
+        '    """读取配置文件。\n'
+        '\n'
+        '    返回字典。\n'
+        '    """\n'
+        "    query = '''\n"
+        '    SELECT 1\n'
+        "    '''\n"
+        '    return {"path": path, "query": query}  # 注释\n'
+        '\n'
+        '\n'
+        'class Config:\n'
+        '    """单行文档字符串"""\n'
+        '    name = "config"'
+    ),
+    "sql": (
+        "SELECT id,\n"
+        "       'multi\n"
+        "line string' AS note\n"
+        "FROM snippets /* block\n"
+        "comment */\n"
+        "WHERE language = 'python'\n"
+        "  AND id > 10;"
+    ),
+    "php": (
+        "<?php\n"
+        "/**\n"
+        " * Block comment\n"
+        " */\n"
+        "function add($a, $b) {\n"
+        "    $s = \"text\n"
+        "more\";\n"
+        "    return $a + $b; // line comment\n"
+        "}\n"
+        "?>"
+    ),
+    "go": (
+        "package main\n"
+        "\n"
+        "var raw = `line one\n"
+        "line two`\n"
+        "\n"
+        "/* block\n"
+        "   comment */\n"
+        "func main() {\n"
+        "\tprintln(raw)\n"
+        "}"
+    ),
+    "ruby": (
+        "text = <<~EOS\n"
+        "  heredoc line 1\n"
+        "  heredoc line 2\n"
+        "EOS\n"
+        "=begin\n"
+        "embedded doc\n"
+        "=end\n"
+        "def greet(name)\n"
+        "  \"Hello, #{name}\"\n"
+        "end"
+    ),
+}
+
+# 随机编辑时插入的片段，覆盖各语言跨行结构的开始和结束分隔符
+CONSISTENCY_INSERTS = ("x", " ", "\n", '"', "'", '"""', "/*", "*/", "`", "#", "<<~EOS\n", "\nEOS\n", "=begin\n", "\n=end\n")
+
+
+def _block_formats(block):
+    """文本块中每个字符上由高亮器设置的格式 (没有格式为 None；Qt 不保存空格式)。"""
+    chars = [None] * len(block.text())
+    for format_range in block.layout().formats():
+        for index in range(format_range.start, min(len(chars), format_range.start + format_range.length)):
+            chars[index] = format_range.format
+    return chars
+
+
+def _expected_formats(highlighter, language, text):
+    """整篇文档一次词法分析得到的每行每个字符的格式。"""
+    from pygments.lexers import get_lexer_by_name
+
+    chars = [None] * len(text)
+    covered = 0  # 重复产生的位置以先产生的 token 为准
+    for index, ttype, value in get_lexer_by_name(language).get_tokens_unprocessed(text + "\n"):
+        fmt = highlighter.formats.for_token(ttype)
+        if fmt is not None and fmt.isEmpty():
+            fmt = None
+        start, end = max(index, covered), min(len(text), index + len(value))
+        if end > start:
+            chars[start:end] = [fmt] * (end - start)
+            covered = end
+    lines, start = [], 0
+    for line in text.split("\n"):
+        lines.append(chars[start:start + len(line)])
+        start += len(line) + 1
+    return lines
+
+
+def _assert_consistent(highlighter, document, language, context):
+    expected = _expected_formats(highlighter, language, document.toPlainText())
+    block = document.firstBlock()
+    while block.isValid():
+        if _block_formats(block) != expected[block.blockNumber()]:
+            raise AssertionError(
+                f"{language}: 第 {block.blockNumber() + 1} 行的高亮与整篇分析不一致 ({context}): {block.text()!r}"
+            )
+        block = block.next()
+
+
+def check_consistency(edits: int = 200, seed: int = 0):
+    """
+    对 CONSISTENCY_SAMPLES 中的每种语言，在同步和后台两种模式下比较逐行高亮的结果与整篇文档词法分析的结果：
+    载入后比较一次，之后每次随机插入或删除文本后再比较。不一致时抛出 AssertionError。
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from PyQt6.QtCore import QEventLoop
+    from PyQt6.QtGui import QTextCursor
+    from PyQt6.QtWidgets import QApplication, QPlainTextEdit
+    from widgets.syntax_highlighter import SyntaxHighlighter
+
+    class Highlighter(SyntaxHighlighter):
+        VERIFY_DELAY_MS = 0  # 不必等待停止编辑后的整篇分析
+
+    app = QApplication.instance() or QApplication([])
+    rng = random.Random(seed)
+
+    for language, text in CONSISTENCY_SAMPLES.items():
+        for background in (False, True):
+            editor = QPlainTextEdit()
+            highlighter = Highlighter(editor.document(), view=editor, background=background)
+            highlighter.set_language(language)
+            loop = QEventLoop()
+            highlighter.finished.connect(lambda h=highlighter, l=loop: h.busy or l.quit())
+
+            def settle():
+                app.processEvents()
+                if highlighter.busy:
+                    loop.exec()
+
+            editor.setPlainText(text)
+            settle()
+            mode = "后台" if background else "同步"
+            _assert_consistent(highlighter, editor.document(), language, f"{mode}模式载入")
+            for step in range(edits):
+                document = editor.document()
+                cursor = QTextCursor(document)
+                position = rng.randrange(document.characterCount())
+                cursor.setPosition(position)
+                if rng.random() < 0.6:
+                    cursor.insertText(rng.choice(CONSISTENCY_INSERTS))
+                else:
+                    cursor.setPosition(min(document.characterCount() - 1, position + rng.randint(1, 4)), QTextCursor.MoveMode.KeepAnchor)
+                    cursor.removeSelectedText()
+                settle()
+                _assert_consistent(highlighter, document, language, f"{mode}模式第 {step + 1} 次编辑")
+            highlighter.shutdown()
+
+
+def run(lines: int = 5000, repeats: int = 5, edits: int = 20, language: str = "python") -> Dict[str, dict]:
+    """
+    返回 {"highlighter.rehighlight": ..., "highlighter.per_block": ..., "highlighter.edit": ...,
+          "highlighter.load_blocking": ..., "highlighter.load_complete": ...}。
+    """
+    check_consistency()
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from PyQt6.QtCore import QEventLoop
+    from PyQt6.QtGui import QTextCursor, QTextDocument
+    from PyQt6.QtWidgets import QApplication, QPlainTextEdit
+    from widgets.syntax_highlighter import SyntaxHighlighter
+
+    app = QApplication.instance() or QApplication([])
+
+    text = sample_document(lines)
+    document = QTextDocument()
+    document.setPlainText(text)
+    document.documentLayout()  # 没有布局的 QTextDocument 不发出 contentsChange，编辑不会触发重新高亮
+    # 前三项测量同步高亮本身的开销，因此关闭后台模式
+    highlighter = SyntaxHighlighter(document, background=False)
+    highlighter.set_language(language)
+
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        highlighter.rehighlight()
+        samples.append(time.perf_counter() - started)
+    per_block = [sample / document.blockCount() for sample in samples]
+
+    # 在文档中间插入字符：QSyntaxHighlighter 会同步重新高亮受影响的文本块
+    edit_samples = []
+    middle = document.findBlockByNumber(document.blockCount() // 2)
+    for _ in range(edits):
+        cursor = QTextCursor(middle)
+        started = time.perf_counter()
+        cursor.insertText("x")
+        app.processEvents()
+        edit_samples.append(time.perf_counter() - started)
+
+    # 后台模式：setPlainText 返回前界面被阻塞的时间，以及到 finished 信号 (全部行高亮完成) 的时间
+    editor = QPlainTextEdit()
+    editor.resize(800, 600)
+    background = SyntaxHighlighter(editor.document(), view=editor)
+    background.set_language(language)
+    loop = QEventLoop()
+    background.finished.connect(lambda: background.busy or loop.quit())
+    blocking_samples, complete_samples = [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        editor.setPlainText(text)
+        blocking_samples.append(time.perf_counter() - started)
+        if background.busy:
+            loop.exec()
+        complete_samples.append(time.perf_counter() - started)
+    background.shutdown()
+
+    return {
+        "highlighter.rehighlight": summarize(samples),
+        "highlighter.per_block": summarize(per_block),
+        "highlighter.edit": summarize(edit_samples),
+        "highlighter.load_blocking": summarize(blocking_samples),
+        "highlighter.load_complete": summarize(complete_samples),
+    }
+
+
+if __name__ == "__main__":
+    check_consistency()
+    print("逐行高亮与整篇词法分析的结果一致")
@@ -0,0 +1,82 @@
+# benchmarks/common.py
+# 基准测试的公共工具：延迟统计、运行环境信息、结果的保存与读取
+
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    """对已排序的样本取百分位数 (最近秩法)。"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples: List[float], elapsed: float = None) -> Dict[str, float]:
+    """
+    把一组以秒为单位的延迟样本汇总为 p50/p95/p99 等统计值 (毫秒)。
+    elapsed 为整个阶段的墙钟时间；并发测试时据此计算吞吐量，否则按样本耗时之和计算。
+    """
+    ordered = sorted(samples)
+    total = elapsed if elapsed is not None else sum(ordered)
+    return {
+        "count": len(ordered),
+        "ops_per_sec": round(len(ordered) / total, 2) if total > 0 else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment_info() -> dict:
+    """记录结果对应的提交和运行环境，便于在不同提交之间比较。"""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sqlite_version": sqlite3.sqlite_version,
+    }
+
+
+def save_results(path: str, meta: dict, results: Dict[str, dict]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_results(results: Dict[str, dict]):
+    print(f"{'benchmark':<40} {'count':>7} {'ops/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stats in results.items():
+        print(
+            f"{name:<40} {stats['count']:>7} {stats['ops_per_sec']:>10.1f} "
+            f"{stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['p99_ms']:>10.3f}"
+        )
@@ -0,0 +1,58 @@
+# benchmarks/compare.py
+# 比较两次基准测试的结果，例如:
+#   python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json --threshold 0.1
+# 任何指标退化超过阈值时以状态码 1 退出，可直接用于 CI。
+
+import argparse
+import sys
+
+try:
+    from benchmarks.common import load_results
+except ImportError:
+    from common import load_results
+
+# 延迟类指标越小越好，吞吐量越大越好
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms")
+HIGHER_IS_BETTER = ("ops_per_sec",)
+
+
+def compare(baseline: dict, current: dict, threshold: float):
+    """返回 (行列表, 退化项列表)；行中的 worse 为退化比例，正数表示变差。"""
+    rows = []
+    regressions = []
+    for name in sorted(set(baseline["results"]) & set(current["results"])):
+        old, new = baseline["results"][name], current["results"][name]
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if not old.get(metric) or metric not in new:
+                continue
+            change = (new[metric] - old[metric]) / old[metric]
+            worse = change if metric in LOWER_IS_BETTER else -change
+            rows.append((name, metric, old[metric], new[metric], change, worse))
+            if worse > threshold:
+                regressions.append((name, metric, worse))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较两次基准测试的结果")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="允许的退化比例，默认 0.10 (10%%)")
+    args = parser.parse_args()
+
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    print(f"基准: {baseline['meta'].get('git_commit')}  当前: {current['meta'].get('git_commit')}")
+    rows, regressions = compare(baseline, current, args.threshold)
+    print(f"{'benchmark':<40} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, metric, old, new, change, worse in rows:
+        marker = "  <-- 退化" if worse > args.threshold else ""
+        print(f"{name:<40} {metric:<12} {old:>12.3f} {new:>12.3f} {change:>+9.1%}{marker}")
+
+    if regressions:
+        print(f"\n{len(regressions)} 项指标退化超过 {args.threshold:.0%}。")
+        sys.exit(1)
+    print("\n未发现超过阈值的退化。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/run.py
+# 运行基准测试并把结果保存为 JSON，例如 (在项目根目录下):
+#   python -m benchmarks.run --suite api db highlighter
+#   python -m benchmarks.run --suite api --api-mode uvicorn --requests 5000 --concurrency 32
+#   python -m benchmarks.compare benchmarks/results/<旧提交>.json benchmarks/results/<新提交>.json
+
+import argparse
+import os
+
+try:
+    from benchmarks import bench_api, bench_db, bench_highlighter
+    from benchmarks.common import REPO_ROOT, environment_info, print_results, save_results
+except ImportError:
+    import bench_api, bench_db, bench_highlighter
+    from common import REPO_ROOT, environment_info, print_results, save_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeSharer 基准测试")
+    parser.add_argument("--suite", nargs="+", choices=["api", "db", "highlighter"], default=["api", "db", "highlighter"])
+    parser.add_argument("--output", help="结果 JSON 路径，默认为 benchmarks/results/<git提交>.json")
+
+    api = parser.add_argument_group("api")
+    api.add_argument("--api-mode", choices=["inprocess", "uvicorn", "url"], default="inprocess")
+    api.add_argument("--url", help="--api-mode url 时被测服务的地址，例如 http://127.0.0.1:8000")
+    api.add_argument("--requests", type=int, default=2000, help="请求总数")
+    api.add_argument("--concurrency", type=int, default=16)
+    api.add_argument("--create-ratio", type=float, default=0.2, help="创建请求所占比例，其余为读取")
+    api.add_argument("--payload-bytes", type=int, default=2048)
+    api.add_argument("--no-cache", action="store_true", help="关闭服务端读缓存")
+
+    db = parser.add_argument_group("db")
+    db.add_argument("--db-rows", type=int, default=1000)
+
+    hl = parser.add_argument_group("highlighter")
+    hl.add_argument("--lines", type=int, default=5000, help="高亮测试文档的行数")
+
+    args = parser.parse_args()
+    if args.api_mode == "url" and not args.url:
+        parser.error("--api-mode url 需要同时指定 --url")
+
+    meta = environment_info()
+    meta["arguments"] = vars(args)
+    results = {}
+    if "api" in args.suite:
+        results.update(bench_api.run(
+            mode=args.api_mode, url=args.url, requests_total=args.requests, concurrency=args.concurrency,
+            create_ratio=args.create_ratio, payload_bytes=args.payload_bytes, use_cache=not args.no_cache,
+        ))
+    if "db" in args.suite:
+        results.update(bench_db.run(rows=args.db_rows))
+    if "highlighter" in args.suite:
+        results.update(bench_highlighter.run(lines=args.lines))
+
+    print_results(results)
+    output = args.output or os.path.join(REPO_ROOT, "benchmarks", "results", f"{meta['git_commit']}.json")
+    save_results(output, meta, results)
+    print(f"结果已保存到: {output}")
+
+
+if __name__ == "__main__":
+    main()
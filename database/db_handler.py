@@ -1,54 +1,244 @@
 # database/db_handler.py
 
+import atexit
+import io
+import json
 import sqlite3
 import os
+import threading
+import zlib
+from contextlib import contextmanager
 from datetime import datetime
 
 # 定义数据库文件路径
 DB_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
 DB_PATH = os.path.join(DB_DIR, 'local_storage.db')
 
-def get_db_connection():
-    """获取数据库连接"""
-    os.makedirs(DB_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+# 每个连接缓存的预编译语句数量 (sqlite3 按 SQL 文本复用已编译的语句)
+CACHED_STATEMENTS = 128
+
+# 连接建立时应用的 PRAGMA：
+# - WAL 日志允许读写并发，提交时只追加写入 WAL 文件；
+# - WAL 模式下 synchronous=NORMAL 不会损坏数据库，只是断电时可能丢失最后几个事务；
+# - 16MB 页缓存、256MB 内存映射读取，临时表放在内存中。
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# 全文搜索结果中用于标记匹配位置的字符，以及 trigram 分词器能够匹配的最短词长
+SEARCH_MARK_START = "«"
+SEARCH_MARK_END = "»"
+TRIGRAM_MIN_TERM = 3
+
+# sqlite3 连接不能跨线程使用，因此每个线程持有一个长连接
+_local = threading.local()
+_trigram_index = {}  # DB_PATH -> 全文索引是否使用 trigram 分词器
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # isolation_level=None：不由 sqlite3 模块隐式开启事务，事务边界完全由 transaction() 控制
+    conn = sqlite3.connect(path, isolation_level=None, cached_statements=CACHED_STATEMENTS)
     # 使用 Row 工厂使得查询结果可以像字典一样通过列名访问
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+
+def get_db_connection() -> sqlite3.Connection:
+    """
+    获取当前线程的数据库长连接，首次调用时创建。
+    调用方不应关闭返回的连接；DB_PATH 被修改后会自动重新连接。
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _local.conn = _connect(DB_PATH)
+        _local.path = DB_PATH
+    return conn
+
+
+def close_connection():
+    """关闭当前线程的长连接 (程序退出时自动调用)。"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+atexit.register(close_connection)
+
+
+@contextmanager
+def transaction():
+    """
+    在一个事务中执行多个操作，只提交一次，例如:
+
+        with db_handler.transaction():
+            for title, content in items:
+                db_handler.add_snippet(title, content)
+
+    嵌套使用时并入外层事务；出现异常时整体回滚。
+    """
+    conn = get_db_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
 def init_db():
     """
     初始化数据库，创建 snippets 表。
     该函数符合《架构文档》定义的本地数据库模式。
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 架构文档中的 SQL Schema
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS snippets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title VARCHAR(255) NOT NULL,
-        language VARCHAR(50) DEFAULT 'plaintext',
-        content TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    with transaction() as conn:
+        # 架构文档中的 SQL Schema
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS snippets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title VARCHAR(255) NOT NULL,
+            language VARCHAR(50) DEFAULT 'plaintext',
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        
+        # 创建一个触发器，在更新行时自动更新 updated_at 字段
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS update_snippets_updated_at
+        AFTER UPDATE ON snippets
+        FOR EACH ROW
+        BEGIN
+            UPDATE snippets SET updated_at = CURRENT_TIMESTAMP WHERE id = OLD.id;
+        END;
+        """)
+
+        # 列表按 (更新时间, id) 倒序分页展示，索引避免每次加载列表时排序 (替换旧的单列索引)
+        conn.execute("DROP INDEX IF EXISTS idx_snippets_updated_at")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_snippets_updated_at_id ON snippets (updated_at DESC, id DESC)")
+
+        _init_search_index(conn)
+
+        # 等待上传的分享 (离线或服务器不可用时保留，稍后按批重试)；payload 为请求体 JSON，next_attempt_at 为 Unix 时间戳
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS share_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            snippet_id INTEGER,
+            payload TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_share_queue_next_attempt ON share_queue (next_attempt_at, id)")
+
+        _init_sync_tables(conn)
+
+    print("数据库初始化成功。")
+
+def _init_search_index(conn):
+    """
+    创建标题和内容的 FTS5 全文索引 (外部内容表，不重复存储片段内容)，并用触发器与 snippets 表保持同步。
+    优先使用 trigram 分词器，支持中文和任意子串匹配；SQLite 3.34 以下退回 unicode61。
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'snippets_fts'").fetchone()
+    if not exists:
+        for tokenizer in ("trigram", "unicode61 remove_diacritics 2"):
+            try:
+                conn.execute(f"""
+                CREATE VIRTUAL TABLE snippets_fts USING fts5(
+                    title, content, content='snippets', content_rowid='id', tokenize='{tokenizer}'
+                );
+                """)
+                break
+            except sqlite3.OperationalError:
+                continue
+        # 为已有的片段建立索引
+        conn.execute("INSERT INTO snippets_fts (snippets_fts) VALUES ('rebuild')")
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS snippets_fts_insert AFTER INSERT ON snippets BEGIN
+        INSERT INTO snippets_fts (rowid, title, content) VALUES (NEW.id, NEW.title, NEW.content);
+    END;
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS snippets_fts_delete AFTER DELETE ON snippets BEGIN
+        INSERT INTO snippets_fts (snippets_fts, rowid, title, content) VALUES ('delete', OLD.id, OLD.title, OLD.content);
+    END;
+    """)
+    # 只在标题或内容变化时更新索引，update_snippets_updated_at 触发器修改 updated_at 时不会重复索引
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS snippets_fts_update AFTER UPDATE OF title, content ON snippets BEGIN
+        INSERT INTO snippets_fts (snippets_fts, rowid, title, content) VALUES ('delete', OLD.id, OLD.title, OLD.content);
+        INSERT INTO snippets_fts (rowid, title, content) VALUES (NEW.id, NEW.title, NEW.content);
+    END;
+    """)
+
+
+def _init_sync_tables(conn):
+    """
+    与服务器同步库同步所需的表：
+    - sync_state: 每个已参与同步的片段的同步ID、分享链接，以及上次同步时的内容 (zlib 压缩，用于生成差异)、
+      内容哈希、标题和语言；local_rev 在片段每次被修改时由触发器加一，与 synced_rev 不同即表示有未推送的修改
+      (updated_at 只精确到秒，不能用来判断同一秒内的修改)；
+    - sync_tombstones: 已同步过、随后在本地删除的片段，等待推送删除；
+    - sync_meta: 同步密钥和拉取/推送游标。
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_state (
+        snippet_id INTEGER PRIMARY KEY,
+        uuid TEXT NOT NULL UNIQUE,
+        share_url TEXT,
+        version INTEGER,
+        base_hash TEXT,
+        base_content BLOB,
+        base_title TEXT,
+        base_language TEXT,
+        local_rev INTEGER NOT NULL DEFAULT 0,
+        synced_rev INTEGER
     );
     """)
-    
-    # 创建一个触发器，在更新行时自动更新 updated_at 字段
-    cursor.execute("""
-    CREATE TRIGGER IF NOT EXISTS update_snippets_updated_at
-    AFTER UPDATE ON snippets
-    FOR EACH ROW
-    BEGIN
-        UPDATE snippets SET updated_at = CURRENT_TIMESTAMP WHERE id = OLD.id;
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sync_state_dirty ON sync_state (snippet_id) WHERE synced_rev IS NOT local_rev")
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_tombstones (uuid TEXT PRIMARY KEY)")
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS sync_state_update AFTER UPDATE OF title, content, language ON snippets BEGIN
+        UPDATE sync_state SET local_rev = local_rev + 1 WHERE snippet_id = NEW.id;
+    END;
+    """)
+    # 删除已同步过的片段时记录墓碑；同步过程中应用远程删除时先删除 sync_state，因此不会产生墓碑
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS sync_state_delete AFTER DELETE ON snippets BEGIN
+        INSERT OR IGNORE INTO sync_tombstones (uuid) SELECT uuid FROM sync_state WHERE snippet_id = OLD.id;
+        DELETE FROM sync_state WHERE snippet_id = OLD.id;
     END;
     """)
 
-    conn.commit()
-    conn.close()
-    print("数据库初始化成功。")
+
+def _uses_trigram(conn) -> bool:
+    if DB_PATH not in _trigram_index:
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'snippets_fts'").fetchone()
+        _trigram_index[DB_PATH] = row is not None and "trigram" in row[0]
+    return _trigram_index[DB_PATH]
+
+
+def _like_pattern(term: str) -> str:
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
 
 # --- CRUD 操作 ---
 
@@ -57,16 +247,56 @@ def add_snippet(title: str, content: str, language: str = 'plaintext') -> int:
     添加一个新的代码片段。
     对应 "FR1: 创建、保存新的代码片段"。
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO snippets (title, content, language) VALUES (?, ?, ?)",
-        (title, content, language)
+    with transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO snippets (title, content, language) VALUES (?, ?, ?)",
+            (title, content, language)
+        )
+        return cursor.lastrowid
+
+def add_snippets(snippets) -> list:
+    """
+    批量添加代码片段，snippets 为 (title, content, language) 元组的可迭代对象。
+    所有片段在同一个事务中写入，只提交一次；返回与输入顺序一致的新ID列表。
+    """
+    with transaction() as conn:
+        return [
+            conn.execute(
+                "INSERT INTO snippets (title, content, language) VALUES (?, ?, ?)",
+                (title, content, language)
+            ).lastrowid
+            for title, content, language in snippets
+        ]
+
+def import_snippets(snippets) -> int:
+    """
+    在一个事务中批量导入片段，snippets 为包含 title、content、language 的字典列表；
+    可选的 created_at / updated_at 会被保留 (缺少时为当前时间)。返回导入的数量。
+    """
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO snippets (title, content, language, created_at, updated_at) "
+            "VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))",
+            [
+                (snippet['title'], snippet['content'], snippet['language'], snippet.get('created_at'), snippet.get('updated_at'))
+                for snippet in snippets
+            ]
+        )
+    return len(snippets)
+
+def iter_snippets():
+    """
+    按 id 顺序逐行读取全部片段 (包括内容)，用于导出等需要遍历整个库的操作。
+    查询结果由游标逐行取出，内存占用与库的大小无关；遍历期间看到的是开始时的一致快照。
+    """
+    cursor = get_db_connection().execute(
+        "SELECT id, title, language, content, created_at, updated_at FROM snippets ORDER BY id"
     )
-    new_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return new_id
+    try:
+        for row in cursor:
+            yield dict(row)
+    finally:
+        cursor.close()
 
 def get_all_snippets() -> list:
     """
@@ -74,45 +304,312 @@ def get_all_snippets() -> list:
     对应 "FR4: 列表展示所有代码片段"。
     """
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title, language, updated_at FROM snippets ORDER BY updated_at DESC")
-    snippets = cursor.fetchall()
-    conn.close()
+    snippets = conn.execute("SELECT id, title, language, updated_at FROM snippets ORDER BY updated_at DESC").fetchall()
     return [dict(row) for row in snippets]
 
+def get_snippets_page(after=None, limit: int = 200) -> list:
+    """
+    按更新时间降序分页获取片段列表 (键集分页)，不读取片段内容。
+    after 为上一页最后一行的 (updated_at, id)；为 None 时返回第一页。
+    与 OFFSET 分页不同，每一页的代价都与页数无关。
+    """
+    conn = get_db_connection()
+    if after is None:
+        rows = conn.execute(
+            "SELECT id, title, language, updated_at FROM snippets ORDER BY updated_at DESC, id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT id, title, language, updated_at FROM snippets WHERE (updated_at, id) < (?, ?) "
+            "ORDER BY updated_at DESC, id DESC LIMIT ?",
+            (after[0], after[1], limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def search_snippets(query: str, limit: int = 200) -> list:
+    """
+    在标题和内容中全文搜索代码片段，按相关度 (bm25，标题权重更高) 排序。
+
+    多个词之间为“与”的关系。返回的每一项除列表所需的字段外，还包含
+    title_highlight (标题，匹配处用 SEARCH_MARK_START/END 标记) 和 snippet (内容中匹配位置附近的摘录)。
+    trigram 索引无法匹配少于 3 个字符的词，这些词改用 LIKE 过滤；只包含短词的查询只搜索标题。
+    """
+    terms = query.split()
+    if not terms:
+        return []
+    conn = get_db_connection()
+
+    trigram = _uses_trigram(conn)
+    if trigram:
+        fts_terms = [term for term in terms if len(term) >= TRIGRAM_MIN_TERM]
+        short_terms = [term for term in terms if len(term) < TRIGRAM_MIN_TERM]
+    else:
+        fts_terms, short_terms = terms, []
+
+    if not fts_terms:
+        sql = "SELECT id, title, language, updated_at, title AS title_highlight, '' AS snippet FROM snippets WHERE "
+        sql += " AND ".join("title LIKE ? ESCAPE '\\'" for _ in short_terms)
+        sql += " ORDER BY updated_at DESC LIMIT ?"
+        rows = conn.execute(sql, [_like_pattern(term) for term in short_terms] + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    # 每个词作为一个带引号的 FTS 字符串，避免用户输入被解析为 FTS 查询语法；unicode61 下按前缀匹配
+    suffix = "" if trigram else "*"
+    match = " ".join('"' + term.replace('"', '""') + '"' + suffix for term in fts_terms)
+    sql = """
+    SELECT s.id, s.title, s.language, s.updated_at,
+           highlight(snippets_fts, 0, :start, :end) AS title_highlight,
+           snippet(snippets_fts, 1, :start, :end, '…', :tokens) AS snippet
+    FROM snippets_fts JOIN snippets AS s ON s.id = snippets_fts.rowid
+    WHERE snippets_fts MATCH :match
+    """
+    # trigram 的每个词元只有 3 个字符，摘录需要更多词元才有相近的长度
+    params = {
+        "start": SEARCH_MARK_START, "end": SEARCH_MARK_END, "match": match, "limit": limit,
+        "tokens": 48 if trigram else 16,
+    }
+    for i, term in enumerate(short_terms):
+        sql += f" AND (s.title LIKE :short{i} ESCAPE '\\' OR s.content LIKE :short{i} ESCAPE '\\')"
+        params[f"short{i}"] = _like_pattern(term)
+    sql += " ORDER BY bm25(snippets_fts, 10.0, 1.0) LIMIT :limit"
+    return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
 def get_snippet_by_id(snippet_id: int) -> dict:
     """根据ID获取单个代码片段的完整内容。"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM snippets WHERE id = ?", (snippet_id,))
-    snippet = cursor.fetchone()
-    conn.close()
+    snippet = conn.execute("SELECT * FROM snippets WHERE id = ?", (snippet_id,)).fetchone()
     return dict(snippet) if snippet else None
 
+def get_snippet_meta(snippet_id: int) -> dict:
+    """获取单个代码片段的元数据 (标题、语言和时间)，不读取内容。"""
+    snippet = get_db_connection().execute(
+        "SELECT id, title, language, created_at, updated_at FROM snippets WHERE id = ?", (snippet_id,)
+    ).fetchone()
+    return dict(snippet) if snippet else None
+
+class _ContentBuffer(io.BytesIO):
+    """Python 3.10 没有 Connection.blobopen 时的替代：内容一次性读入内存，提供与 sqlite3.Blob 相同的 read/tell/len/close。"""
+
+    def __len__(self):
+        return len(self.getbuffer())
+
+
+def open_snippet_content(snippet_id: int):
+    """
+    以 SQLite 增量 blob I/O 打开片段内容 (UTF-8 字节)，返回只读的 sqlite3.Blob，片段不存在时返回 None。
+    len(blob) 即内容的字节数，无需读取内容；调用方负责关闭。
+    Python 3.10 上没有 blobopen (3.11 新增)，退回为一次性读取内容，编辑器仍分块载入。
+    """
+    conn = get_db_connection()
+    if not hasattr(conn, "blobopen"):
+        row = conn.execute("SELECT CAST(content AS BLOB) FROM snippets WHERE id = ?", (snippet_id,)).fetchone()
+        return _ContentBuffer(row[0] or b"") if row else None
+    try:
+        return conn.blobopen("snippets", "content", snippet_id, readonly=True)
+    except sqlite3.OperationalError:
+        return None
+
 def update_snippet(snippet_id: int, title: str, content: str, language: str):
     """
     更新一个已有的代码片段。
     对应 "FR2: 查看和编辑已有的代码片段"。
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE snippets SET title = ?, content = ?, language = ? WHERE id = ?",
-        (title, content, language, snippet_id)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE snippets SET title = ?, content = ?, language = ? WHERE id = ?",
+            (title, content, language, snippet_id)
+        )
 
 def delete_snippet(snippet_id: int):
     """
     删除一个代码片段。
     对应 "FR3: 删除不需要的代码片段"。
     """
+    with transaction() as conn:
+        conn.execute("DELETE FROM snippets WHERE id = ?", (snippet_id,))
+
+def delete_snippets(snippet_ids):
+    """在一个事务中批量删除多个代码片段。"""
+    with transaction() as conn:
+        conn.executemany("DELETE FROM snippets WHERE id = ?", [(snippet_id,) for snippet_id in snippet_ids])
+
+# --- 分享上传队列 ---
+
+def enqueue_shares(items) -> list:
+    """
+    把待上传的分享写入队列，items 为 (snippet_id, payload) 的可迭代对象，payload 为 API 请求体字典。
+    在同一个事务中写入，返回与输入顺序一致的队列ID列表；队列保存在本地数据库中，重启后仍会继续上传。
+    """
+    with transaction() as conn:
+        return [
+            conn.execute(
+                "INSERT INTO share_queue (snippet_id, payload) VALUES (?, ?)",
+                (snippet_id, json.dumps(payload))
+            ).lastrowid
+            for snippet_id, payload in items
+        ]
+
+def get_due_shares(now: float, limit: int = 100) -> list:
+    """按入队顺序返回已到重试时间的排队分享，每项为 dict: id, snippet_id, payload (字典), attempts。"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM snippets WHERE id = ?", (snippet_id,))
-    conn.commit()
-    conn.close()
+    rows = conn.execute(
+        "SELECT id, snippet_id, payload, attempts FROM share_queue WHERE next_attempt_at <= ? ORDER BY id LIMIT ?",
+        (now, limit)
+    ).fetchall()
+    return [dict(row, payload=json.loads(row['payload'])) for row in rows]
+
+def defer_shares(retries, error: str):
+    """记录一次失败的上传：retries 为 (队列ID, 下次重试的时间戳) 的可迭代对象，尝试次数加一。"""
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE share_queue SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+            [(next_attempt_at, error, share_id) for share_id, next_attempt_at in retries]
+        )
+
+def remove_shares(share_ids):
+    """从队列中移除已上传 (或无法上传) 的分享。"""
+    with transaction() as conn:
+        conn.executemany("DELETE FROM share_queue WHERE id = ?", [(share_id,) for share_id in share_ids])
+
+def count_queued_shares() -> int:
+    """队列中等待上传的分享数量。"""
+    return get_db_connection().execute("SELECT COUNT(*) FROM share_queue").fetchone()[0]
+
+def next_share_attempt():
+    """队列中最早的重试时间戳，队列为空时返回 None。"""
+    return get_db_connection().execute("SELECT MIN(next_attempt_at) FROM share_queue").fetchone()[0]
+
+# --- 同步 ---
+
+def get_sync_meta(key: str, default=None):
+    row = get_db_connection().execute("SELECT value FROM sync_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_sync_meta(key: str, value):
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO sync_meta (key, value) VALUES (?, ?)", (key, value))
+
+_SYNC_CHANGE_COLUMNS = (
+    "s.id, s.title, s.language, s.content, st.uuid, st.base_hash, st.base_content, st.base_title, "
+    "st.base_language, st.local_rev"
+)
+
+def get_sync_changes(id_after: int, after: int = 0, limit: int = 100) -> list:
+    """
+    返回需要推送的片段 (按 id 排序，after 为上一批最后一个 id)：有未推送修改的已同步片段，
+    以及 id 大于 id_after (上次推送时的最大 id) 且从未同步过的新片段。
+    每项包括片段本身以及 sync_state 中的同步信息 (新片段这些字段为 None)，base_content 已解压。
+    """
+    rows = get_db_connection().execute(
+        f"SELECT {_SYNC_CHANGE_COLUMNS} FROM sync_state AS st JOIN snippets AS s ON s.id = st.snippet_id "
+        "WHERE st.synced_rev IS NOT st.local_rev AND st.snippet_id > ? "
+        "UNION ALL "
+        f"SELECT {_SYNC_CHANGE_COLUMNS} FROM snippets AS s LEFT JOIN sync_state AS st ON st.snippet_id = s.id "
+        "WHERE s.id > ? AND st.snippet_id IS NULL "
+        "ORDER BY 1 LIMIT ?",
+        (after, max(id_after, after), limit)
+    ).fetchall()
+    return [dict(row, base_content=_decompress(row['base_content'])) for row in rows]
+
+def assign_sync_uuids(assignments):
+    """为第一次推送的片段记录同步ID (推送前写入，请求失败后重试时沿用同一个ID)。assignments 为 (片段ID, uuid)。"""
+    with transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO sync_state (snippet_id, uuid) VALUES (?, ?)", list(assignments))
+
+def get_sync_states(uuids) -> dict:
+    """按同步ID读取本地状态: uuid -> dict (base_content 不读取)。"""
+    conn = get_db_connection()
+    states = {}
+    uuids = list(uuids)
+    for start in range(0, len(uuids), 500):
+        chunk = uuids[start:start + 500]
+        rows = conn.execute(
+            "SELECT snippet_id, uuid, share_url, version, base_hash, base_title, base_language, local_rev, synced_rev "
+            f"FROM sync_state WHERE uuid IN ({','.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+        states.update((row['uuid'], dict(row)) for row in rows)
+    return states
+
+def record_sync(snippet_id: int, uuid: str, share_url, version, content: str, content_hash: str,
+                title: str, language: str, synced_rev=None):
+    """
+    记录一个片段与服务器一致时的状态 (content 为双方一致的内容，作为下次生成差异的基准)。
+    synced_rev 为推送时读取的 local_rev (之后的修改仍待推送)，None 表示当前版本。
+    片段在同步过程中已被删除时不记录 (删除已作为墓碑等待推送)。
+    """
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO sync_state (snippet_id, uuid, share_url, version, base_hash, base_content, base_title, "
+            "base_language, synced_rev) SELECT ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, 0) "
+            "WHERE EXISTS (SELECT 1 FROM snippets WHERE id = ?) "
+            "ON CONFLICT (snippet_id) DO UPDATE SET uuid = excluded.uuid, share_url = excluded.share_url, "
+            "version = excluded.version, base_hash = excluded.base_hash, base_content = excluded.base_content, "
+            "base_title = excluded.base_title, base_language = excluded.base_language, "
+            "synced_rev = COALESCE(?, local_rev)",
+            (snippet_id, uuid, share_url, version, content_hash, zlib.compress(content.encode("utf-8")),
+             title, language, synced_rev, snippet_id, synced_rev)
+        )
+
+def update_sync_version(snippet_id: int, version, share_url):
+    """服务器上的变更与本地内容一致 (例如本设备推送的修改)，只更新版本号和分享链接。"""
+    with transaction() as conn:
+        conn.execute("UPDATE sync_state SET version = ?, share_url = ? WHERE snippet_id = ?", (version, share_url, snippet_id))
+
+def mark_sync_unchanged(snippet_id: int, rev: int):
+    """片段被修改后又恢复为上次同步时的内容，不需要推送。"""
+    with transaction() as conn:
+        conn.execute("UPDATE sync_state SET synced_rev = ? WHERE snippet_id = ?", (rev, snippet_id))
+
+def save_remote_snippet(snippet_id, uuid: str, share_url, version, title: str, content: str, language: str,
+                        content_hash: str) -> int:
+    """
+    用服务器上的版本新建 (snippet_id 为 None) 或覆盖本地片段，并记录同步状态，返回片段ID；
+    要覆盖的片段已在本地删除时返回 None。
+    """
+    with transaction() as conn:
+        if snippet_id is None:
+            snippet_id = add_snippet(title, content, language)
+        else:
+            update_snippet(snippet_id, title, content, language)
+            if conn.execute("SELECT 1 FROM snippets WHERE id = ?", (snippet_id,)).fetchone() is None:
+                return None
+        record_sync(snippet_id, uuid, share_url, version, content, content_hash, title, language)
+    return snippet_id
+
+def reset_sync_state(snippet_id: int, uuid: str):
+    """
+    解除片段与服务器上同步记录的关联 (该记录已在其他设备上被删除，而本地又有修改)：
+    片段保留在本地，换用新的同步ID，下次同步时作为新片段推送。
+    """
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE sync_state SET uuid = ?, share_url = NULL, version = NULL, base_hash = NULL, base_content = NULL, "
+            "base_title = NULL, base_language = NULL, synced_rev = NULL WHERE snippet_id = ?",
+            (uuid, snippet_id)
+        )
+
+def delete_synced_snippet(snippet_id: int):
+    """应用远程删除：先删除同步状态，因此不会产生需要推送的墓碑。"""
+    with transaction() as conn:
+        conn.execute("DELETE FROM sync_state WHERE snippet_id = ?", (snippet_id,))
+        conn.execute("DELETE FROM snippets WHERE id = ?", (snippet_id,))
+
+def get_sync_tombstones(limit: int = 100) -> list:
+    return [row[0] for row in get_db_connection().execute("SELECT uuid FROM sync_tombstones LIMIT ?", (limit,))]
+
+def remove_sync_tombstones(uuids):
+    with transaction() as conn:
+        conn.executemany("DELETE FROM sync_tombstones WHERE uuid = ?", [(uuid,) for uuid in uuids])
+
+def get_sync_share_url(snippet_id: int):
+    """片段在同步库中的分享链接 (随同步更新内容)，未同步过时返回 None。"""
+    row = get_db_connection().execute("SELECT share_url FROM sync_state WHERE snippet_id = ?", (snippet_id,)).fetchone()
+    return row[0] if row else None
+
+def _decompress(data):
+    return zlib.decompress(data).decode("utf-8") if data is not None else None
 
 # 在首次导入此模块时，自动检查并初始化数据库
 if __name__ == '__main__':
@@ -0,0 +1,312 @@
+# database/library_io.py
+# 本地片段库的批量导入/导出 (JSON Lines 或目录树)，例如 (在项目根目录下):
+#   python -m database.library_io export library.jsonl.gz
+#   python -m database.library_io export --format tree exported/
+#   python -m database.library_io import library.jsonl --jobs 4
+#   python -m database.library_io import ~/projects/snippets/
+
+import argparse
+import contextlib
+import gzip
+import json
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+try:
+    from database import db_handler
+except ImportError:  # 在 database/ 目录内直接运行
+    import db_handler
+
+# 每个事务导入的片段数；内存中同时只保留一批片段
+IMPORT_CHUNK_SIZE = 500
+# 猜测语言时每个进程任务处理的片段数，以及只分析内容开头的字符数
+GUESS_BATCH_SIZE = 32
+GUESS_SAMPLE_CHARS = 16 * 1024
+# 需要猜测语言的片段少于该数量时在当前进程中猜测，不启动进程池
+GUESS_POOL_MIN_ITEMS = 64
+# 导出时每处理多少个片段报告一次进度
+EXPORT_PROGRESS_INTERVAL = 200
+# 目录树导出时文件名 (不含扩展名) 的最大长度
+TREE_NAME_MAX_CHARS = 100
+
+EXPORT_FIELDS = ("title", "language", "content", "created_at", "updated_at")
+_UNSAFE_FILENAME_CHARS = re.compile(r'[\x00-\x1f<>:"/\\|?*]')
+
+
+# --- 语言识别 ---
+
+def _language_alias(lexer) -> str:
+    # 纯文本在客户端中统一记为 plaintext
+    alias = lexer.aliases[0] if lexer.aliases else "plaintext"
+    return "plaintext" if alias == "text" else alias
+
+
+def guess_languages(samples) -> list:
+    """用 Pygments 的 guess_lexer 猜测一批内容的语言别名 (在进程池的子进程中执行)。"""
+    from pygments.lexers import guess_lexer
+    from pygments.util import ClassNotFound
+    languages = []
+    for sample in samples:
+        try:
+            languages.append(_language_alias(guess_lexer(sample)))
+        except ClassNotFound:
+            languages.append("plaintext")
+    return languages
+
+
+def _guess_missing_languages(records, pool):
+    """为没有语言的记录猜测语言：内容按 GUESS_BATCH_SIZE 分批，有进程池时并行处理。"""
+    samples = [record["content"][:GUESS_SAMPLE_CHARS] for record in records]
+    batches = [samples[start:start + GUESS_BATCH_SIZE] for start in range(0, len(samples), GUESS_BATCH_SIZE)]
+    results = pool.map(guess_languages, batches) if pool is not None else map(guess_languages, batches)
+    for record, language in zip(records, (language for batch in results for language in batch)):
+        record["language"] = language
+
+
+def _language_for_filename(name, cache):
+    """按文件名 (扩展名) 确定语言，无法确定时返回 None 交给 guess_lexer。结果按扩展名缓存。"""
+    from pygments.lexers import get_lexer_for_filename
+    from pygments.util import ClassNotFound
+    extension = os.path.splitext(name)[1].lower()
+    key = extension or name
+    if key not in cache:
+        try:
+            cache[key] = _language_alias(get_lexer_for_filename(name))
+        except ClassNotFound:
+            cache[key] = None
+    return cache[key]
+
+
+def _extension_for_language(language, cache):
+    """导出为目录树时使用的扩展名：取该语言 lexer 的第一个简单文件名模式 (如 *.py)，否则为 .txt。"""
+    if language not in cache:
+        from pygments.lexers import get_lexer_by_name
+        from pygments.util import ClassNotFound
+        cache[language] = ".txt"
+        try:
+            patterns = get_lexer_by_name(language).filenames
+        except ClassNotFound:
+            patterns = []
+        for pattern in patterns:
+            if re.fullmatch(r"\*\.[A-Za-z0-9_+-]+", pattern):
+                cache[language] = pattern[1:]
+                break
+    return cache[language]
+
+
+# --- 导出 ---
+
+@contextlib.contextmanager
+def _open_text(path, mode):
+    """打开文本文件：'-' 表示标准输入/输出，以 .gz 结尾时透明地压缩/解压。"""
+    if path == "-":
+        yield sys.stdout if mode == "w" else sys.stdin
+    elif path.endswith(".gz"):
+        with gzip.open(path, mode + "t", encoding="utf-8", newline="") as f:
+            yield f
+    else:
+        with open(path, mode, encoding="utf-8", newline="") as f:
+            yield f
+
+
+@contextlib.contextmanager
+def _atomic_output(path):
+    """先写入临时文件，成功后再替换目标文件；失败或取消时不会留下写了一半的导出文件。"""
+    if path == "-":
+        yield path
+        return
+    temp_path = f"{path}.{os.getpid()}.tmp{'.gz' if path.endswith('.gz') else ''}"
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def export_jsonl(path, progress=None) -> int:
+    """
+    把整个片段库导出为 JSON Lines (每行一个片段)，返回导出的数量。
+    片段从数据库逐行读取、逐行写出，内存占用与库的大小无关。
+    """
+    count = 0
+    with _atomic_output(path) as output_path, _open_text(output_path, "w") as f:
+        for snippet in db_handler.iter_snippets():
+            f.write(json.dumps({field: snippet[field] for field in EXPORT_FIELDS}, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+            if progress is not None and count % EXPORT_PROGRESS_INTERVAL == 0:
+                progress(count)
+    return count
+
+
+def _safe_filename(title) -> str:
+    name = _UNSAFE_FILENAME_CHARS.sub("_", title or "").strip(" .")[:TREE_NAME_MAX_CHARS].strip(" .")
+    return name or "无标题"
+
+
+def export_tree(directory, progress=None) -> int:
+    """
+    把每个片段导出为目录中的一个文件 (标题为文件名，扩展名由语言决定)，返回导出的数量。
+    重名的文件加上 (2)、(3)… 后缀，不会覆盖目录中已有的文件。
+    """
+    os.makedirs(directory, exist_ok=True)
+    used_names = {name.lower() for name in os.listdir(directory)}
+    extensions = {}
+    count = 0
+    for snippet in db_handler.iter_snippets():
+        base, extension = _safe_filename(snippet["title"]), _extension_for_language(snippet["language"], extensions)
+        name, n = base + extension, 1
+        while name.lower() in used_names:
+            n += 1
+            name = f"{base} ({n}){extension}"
+        used_names.add(name.lower())
+        with open(os.path.join(directory, name), "w", encoding="utf-8", newline="") as f:
+            f.write(snippet["content"])
+        count += 1
+        if progress is not None and count % EXPORT_PROGRESS_INTERVAL == 0:
+            progress(count)
+    return count
+
+
+# --- 导入 ---
+
+def _jsonl_records(f, skipped):
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            skipped.append(line_number)
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get("content"), str) or not record["content"]:
+            skipped.append(line_number)
+            continue
+        yield {
+            "title": str(record.get("title") or "无标题")[:255],
+            "content": record["content"],
+            "language": record.get("language") or None,
+            "created_at": record.get("created_at"),
+            "updated_at": record.get("updated_at"),
+        }
+
+
+def _tree_records(directory, skipped):
+    languages = {}
+    for root, dirs, files in os.walk(directory):
+        # 跳过隐藏目录 (.git 等)，并按名称顺序遍历，保证导入顺序稳定
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            try:
+                with open(path, encoding="utf-8", newline="") as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError):
+                skipped.append(path)
+                continue
+            # 空文件和二进制文件不导入
+            if not content or "\x00" in content:
+                skipped.append(path)
+                continue
+            title = os.path.splitext(os.path.relpath(path, directory))[0].replace(os.sep, "/")
+            yield {
+                "title": title[:255],
+                "content": content,
+                "language": _language_for_filename(name, languages),
+            }
+
+
+def _import_records(records, jobs, chunk_size, progress) -> int:
+    """
+    按 chunk_size 分批导入，每批一个事务，内存中同时只保留一批记录。
+    缺少语言的记录用 guess_lexer 猜测：需要猜测的数量足够多时启动进程池 (spawn 方式，
+    在 GUI 的后台线程中调用也是安全的) 并行处理，进程池在整个导入过程中复用。
+    """
+    jobs = jobs or os.cpu_count() or 1
+    imported = 0
+    pool = None
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                return imported
+            missing = [record for record in chunk if not record["language"]]
+            if len(missing) >= GUESS_POOL_MIN_ITEMS and pool is None and jobs > 1:
+                pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+            if missing:
+                _guess_missing_languages(missing, pool)
+            imported += db_handler.import_snippets(chunk)
+            if progress is not None:
+                progress(imported)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def import_jsonl(path, jobs=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    从 JSON Lines 文件 (可以是 .gz) 导入片段，每行至少包含 content，可选 title、language、
+    created_at、updated_at。返回 (导入数量, 跳过的无效行数)。
+    """
+    skipped = []
+    with _open_text(path, "r") as f:
+        imported = _import_records(_jsonl_records(f, skipped), jobs, chunk_size, progress)
+    return imported, len(skipped)
+
+
+def import_tree(directory, jobs=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    把目录 (递归) 中的每个 UTF-8 文本文件导入为一个片段：相对路径 (去掉扩展名) 为标题，
+    语言由文件名决定，无法确定时根据内容猜测。返回 (导入数量, 跳过的文件数)。
+    """
+    if not os.path.isdir(directory):
+        raise NotADirectoryError(directory)
+    skipped = []
+    imported = _import_records(_tree_records(directory, skipped), jobs, chunk_size, progress)
+    return imported, len(skipped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeSharer 本地片段库导入/导出")
+    parser.add_argument("--db", help=f"本地数据库路径，默认为 {os.path.normpath(db_handler.DB_PATH)}")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出全部片段")
+    export_parser.add_argument("path", help="JSON Lines 文件 (.gz 结尾时压缩，- 表示标准输出) 或目录")
+    export_parser.add_argument("--format", choices=["jsonl", "tree"], default="jsonl")
+
+    import_parser = subparsers.add_parser("import", help="导入片段 (追加到现有的库中)")
+    import_parser.add_argument("path", help="JSON Lines 文件 (- 表示标准输入) 或目录")
+    import_parser.add_argument("--format", choices=["jsonl", "tree"], help="默认按路径判断：目录为 tree，其余为 jsonl")
+    import_parser.add_argument("--jobs", type=int, default=None, help="猜测语言的进程数，默认为 CPU 核数")
+    import_parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="每个事务导入的片段数")
+
+    args = parser.parse_args()
+    if args.db:
+        db_handler.DB_PATH = args.db
+    # 导出到标准输出时，初始化信息不能混入导出内容
+    with contextlib.redirect_stdout(sys.stderr):
+        db_handler.init_db()
+
+    def report(count):
+        print(f"已处理 {count} 个片段...", file=sys.stderr)
+
+    if args.command == "export":
+        export = export_tree if args.format == "tree" else export_jsonl
+        print(f"完成，共导出 {export(args.path, progress=report)} 个片段。", file=sys.stderr)
+    else:
+        fmt = args.format or ("tree" if os.path.isdir(args.path) else "jsonl")
+        run_import = import_tree if fmt == "tree" else import_jsonl
+        imported, skipped = run_import(args.path, jobs=args.jobs, chunk_size=args.chunk_size, progress=report)
+        print(f"完成，共导入 {imported} 个片段，跳过 {skipped} 项。", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,86 @@
 # main.py (最终版本)
 
 import sys
+import time
+
+# --startup-timing 的计时起点 (模块开始导入时)
+STARTUP_STARTED = time.perf_counter()
+
+import multiprocessing
+import secrets
 import traceback
-import requests
-import pyperclip
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-    QListWidget, QListWidgetItem, QTextEdit, QLineEdit, QPushButton, QSplitter,
-    QMessageBox, QToolBar, QComboBox, QLabel,
-    QDialog, QDialogButtonBox
+    QAbstractItemView, QListView, QPlainTextEdit, QLineEdit, QPushButton, QSplitter,
+    QMessageBox, QToolBar, QComboBox, QLabel, QProgressBar, QMenu, QFileDialog,
+    QDialog, QDialogButtonBox, QInputDialog
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QCoreApplication, QModelIndex, QThread, QTimer, pyqtSignal
 from PyQt6.QtGui import QFont
 
 from database import db_handler
+from network.share_worker import ShareWorker
+from widgets.content_loader import ContentLoader
+from widgets.language_combo import LanguageComboBox
+from widgets.snippet_list_model import SnippetListModel
 from widgets.syntax_highlighter import SyntaxHighlighter
-from pygments.lexers import get_all_lexers
+# pyperclip 导入较慢，只在第一次复制分享链接时才导入
 
 # API服务器的基础URL，请根据您的部署情况修改
 API_BASE_URL = "http://127.0.0.1:8000"
+# 上传内容超过该字节数时以 gzip 压缩请求体
+UPLOAD_COMPRESSION_MIN_BYTES = 1024
+# 批量分享时单个请求最多包含的片段数 (与服务端 SNIPPET_BATCH_MAX_ITEMS 一致)
+BATCH_SHARE_MAX_ITEMS = 100
+# 搜索框停止输入多少毫秒后才执行全文搜索，以及最多显示的搜索结果数
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_RESULT_LIMIT = 200
+# 编辑器语法高亮：超过该字符数的文档只高亮可见区域 ("viewport") 或不高亮 ("plain")，其余文档在后台线程中分析
+HIGHLIGHT_LARGE_DOCUMENT_CHARS = 2_000_000
+HIGHLIGHT_LARGE_DOCUMENT_MODE = "viewport"
+# 内容超过该字节数的片段分块载入编辑器 (每块 EDITOR_LOAD_CHUNK_BYTES 字节)，载入完成前只读
+EDITOR_CHUNKED_LOAD_MIN_BYTES = 4 * 1024 * 1024
+EDITOR_LOAD_CHUNK_BYTES = 512 * 1024
+# 设置了同步密钥后自动同步的间隔 (毫秒)，0 表示只手动同步
+SYNC_INTERVAL_MS = 5 * 60 * 1000
+
+
+class StartupTimer:
+    """--startup-timing：记录启动各阶段完成的时间，窗口显示后打印到标准错误。"""
+
+    def __init__(self, started):
+        self.marks = [("开始", started)]
+
+    def mark(self, stage):
+        self.marks.append((stage, time.perf_counter()))
+
+    def report(self):
+        started = self.marks[0][1]
+        lines = ["启动耗时 (--startup-timing):"]
+        for (_, previous), (stage, at) in zip(self.marks, self.marks[1:]):
+            lines.append(f"  {stage:<12} {(at - previous) * 1000:8.1f} ms   累计 {(at - started) * 1000:8.1f} ms")
+        print("\n".join(lines), file=sys.stderr)
+
+
+# 仅在命令行带 --startup-timing 时启用
+startup_timer = None
+
+
+def mark_startup(stage):
+    if startup_timer is not None:
+        startup_timer.mark(stage)
+
 
 # --- 自定义对话框，用于选择分享选项 ---
 class ShareOptionsDialog(QDialog):
     """
     一个自定义对话框，用于让用户在分享时选择链接的有效期。
+    片段已同步到服务器时还可以选择它的同步链接 (永久有效，内容随同步更新，不需要重新上传)。
     """
-    def __init__(self, parent=None):
+    SYNC_LINK = "sync"
+
+    def __init__(self, parent=None, sync_url=None):
         super().__init__(parent)
         self.setWindowTitle("分享选项")
         self.layout = QVBoxLayout(self)
@@ -40,6 +94,8 @@ class ShareOptionsDialog(QDialog):
         self.duration_combo.addItem("30 天", 30)
         self.duration_combo.addItem("永久", None) # 使用None表示永久
         self.duration_combo.setCurrentIndex(1) # 默认选中 "7 天"
+        if sync_url:
+            self.duration_combo.insertItem(0, "同步链接 (随编辑更新)", self.SYNC_LINK); self.duration_combo.setCurrentIndex(0)
         self.layout.addWidget(self.duration_combo)
 
         button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
@@ -48,7 +104,7 @@ class ShareOptionsDialog(QDialog):
         self.layout.addWidget(button_box)
 
     def get_selected_duration(self):
-        """返回用户选择的有效期天数 (None代表永久)。"""
+        """返回用户选择的有效期天数 (None代表永久，SYNC_LINK 代表使用同步链接)。"""
         return self.duration_combo.currentData()
 
 # --- 主窗口类 ---
@@ -56,15 +112,29 @@ class MainWindow(QMainWindow):
     """
     应用程序的主窗口，包含所有UI组件和业务逻辑。
     """
+    # (任务号, [(片段ID, 请求体), ...])，由后台线程中的 ShareWorker.share 处理
+    share_requested = pyqtSignal(int, object)
+    # (操作名, 路径)，由后台线程中的 LibraryWorker.run 处理
+    library_task_requested = pyqtSignal(str, str)
+    # 同步密钥，由后台线程中的 ShareWorker.sync 处理
+    sync_requested = pyqtSignal(str)
+    _share_worker_stop_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("CodeSharer")
         self.setGeometry(100, 100, 1200, 700)
         self.current_snippet_id = None
+        self.share_task_counter = 0
+        self.active_share_tasks = set()
+        self.library_thread = None
+        self.sync_running = False
+        self.sync_manual = False
         
-        db_handler.init_db()
-        self.init_ui()
-        self.load_snippets_list()
+        db_handler.init_db(); mark_startup("初始化数据库")
+        self.init_ui(); mark_startup("构建界面")
+        self.load_snippets_list(); mark_startup("加载片段列表")
+        self.init_share_worker()
 
     def init_ui(self):
         """初始化主窗口UI布局和组件。"""
@@ -76,6 +146,15 @@ class MainWindow(QMainWindow):
         btn_delete = QPushButton("删除"); btn_delete.clicked.connect(self.delete_snippet); toolbar.addWidget(btn_delete)
         toolbar.addSeparator()
         btn_share = QPushButton("在线分享"); btn_share.clicked.connect(self.share_snippet); toolbar.addWidget(btn_share)
+        btn_share_all = QPushButton("分享所选"); btn_share_all.clicked.connect(self.share_selected_snippets); toolbar.addWidget(btn_share_all)
+        self.btn_sync = QPushButton("同步"); self.btn_sync.clicked.connect(self.sync_library); toolbar.addWidget(self.btn_sync)
+        toolbar.addSeparator()
+        import_menu = QMenu(self)
+        import_menu.addAction("从 JSON Lines 文件导入...", lambda: self.import_library("jsonl")); import_menu.addAction("从文件夹导入...", lambda: self.import_library("tree"))
+        self.btn_import = QPushButton("导入"); self.btn_import.setMenu(import_menu); toolbar.addWidget(self.btn_import)
+        export_menu = QMenu(self)
+        export_menu.addAction("导出为 JSON Lines 文件...", lambda: self.export_library("jsonl")); export_menu.addAction("导出到文件夹...", lambda: self.export_library("tree"))
+        self.btn_export = QPushButton("导出"); self.btn_export.setMenu(export_menu); toolbar.addWidget(self.btn_export)
 
         # 主布局
         main_splitter = QSplitter(Qt.Orientation.Horizontal)
@@ -83,56 +162,224 @@ class MainWindow(QMainWindow):
 
         # 左侧面板 (列表和搜索)
         left_panel = QWidget(); left_layout = QVBoxLayout(left_panel); left_layout.setContentsMargins(0, 5, 5, 0)
-        self.search_input = QLineEdit(); self.search_input.setPlaceholderText("按标题搜索..."); self.search_input.textChanged.connect(self.filter_snippets_list); left_layout.addWidget(self.search_input)
-        self.snippet_list_widget = QListWidget(); self.snippet_list_widget.itemClicked.connect(self.on_snippet_selected); left_layout.addWidget(self.snippet_list_widget)
+        self.search_input = QLineEdit(); self.search_input.setPlaceholderText("搜索标题和内容..."); left_layout.addWidget(self.search_input)
+        # 输入时只重启定时器，停止输入 SEARCH_DEBOUNCE_MS 毫秒后才查询一次
+        self.search_timer = QTimer(self); self.search_timer.setSingleShot(True); self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_snippets_list); self.search_input.textChanged.connect(self.search_timer.start)
+        # 列表使用按需分页加载的模型，只为可见的行生成显示数据
+        self.snippet_list_model = SnippetListModel(self)
+        self.snippet_list_view = QListView(); self.snippet_list_view.setModel(self.snippet_list_model); self.snippet_list_view.setUniformItemSizes(True)
+        self.snippet_list_view.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection); self.snippet_list_view.clicked.connect(self.on_snippet_selected); left_layout.addWidget(self.snippet_list_view)
 
         # 右侧面板 (编辑器)
         right_panel = QWidget(); right_layout = QVBoxLayout(right_panel); right_layout.setContentsMargins(5, 5, 0, 0)
         self.title_input = QLineEdit(); self.title_input.setPlaceholderText("代码片段标题..."); right_layout.addWidget(self.title_input)
         editor_header_layout = QHBoxLayout(); editor_header_layout.addWidget(QLabel("语言:"))
-        self.language_combo = QComboBox(); self.populate_language_combo(); editor_header_layout.addWidget(self.language_combo, 1); right_layout.addLayout(editor_header_layout)
-        self.content_editor = QTextEdit(); self.content_editor.setPlaceholderText("在此处粘贴或编写您的代码..."); self.content_editor.setFont(QFont("Courier New", 11)); right_layout.addWidget(self.content_editor)
+        # 完整的语言列表在第一次展开或选择语言时才加载
+        self.language_combo = LanguageComboBox(); editor_header_layout.addWidget(self.language_combo, 1); right_layout.addLayout(editor_header_layout)
+        # QPlainTextEdit 的布局按行增量更新，QTextEdit 在每行格式变化时都会重新布局整篇文档
+        self.content_editor = QPlainTextEdit(); self.content_editor.setPlaceholderText("在此处粘贴或编写您的代码..."); self.content_editor.setFont(QFont("Courier New", 11)); right_layout.addWidget(self.content_editor)
         
         # 语法高亮
-        self.highlighter = SyntaxHighlighter(self.content_editor.document())
+        self.highlighter = SyntaxHighlighter(
+            self.content_editor.document(), view=self.content_editor,
+            large_document_chars=HIGHLIGHT_LARGE_DOCUMENT_CHARS, large_document_mode=HIGHLIGHT_LARGE_DOCUMENT_MODE,
+        )
         self.language_combo.currentTextChanged.connect(self.update_highlighter_language)
+        self.content_loader = ContentLoader(self.content_editor, EDITOR_LOAD_CHUNK_BYTES, self)
+        self.content_loader.progress.connect(lambda done, total: self.statusBar().showMessage(f"正在载入片段... {done * 100 // total}% (载入完成前只读)"))
+        self.content_loader.finished.connect(self.on_content_loaded); self.content_loader.failed.connect(self.on_content_load_failed)
         
         main_splitter.addWidget(left_panel); main_splitter.addWidget(right_panel); main_splitter.setSizes([300, 900])
 
+        # 状态栏：分享上传进度和等待重试的分享数量
+        self.share_progress = QProgressBar(); self.share_progress.setMaximumWidth(200); self.share_progress.hide(); self.statusBar().addPermanentWidget(self.share_progress)
+        self.share_queue_label = QLabel(); self.statusBar().addPermanentWidget(self.share_queue_label)
+
+    def init_share_worker(self):
+        """在后台线程中上传分享 (复用同一个 HTTP 连接池)，失败的分享保存在本地队列中自动重试。"""
+        self.share_thread = QThread()
+        self.share_worker = ShareWorker(API_BASE_URL, UPLOAD_COMPRESSION_MIN_BYTES, BATCH_SHARE_MAX_ITEMS); self.share_worker.moveToThread(self.share_thread)
+        self.share_thread.started.connect(self.share_worker.start); self.share_requested.connect(self.share_worker.share); self._share_worker_stop_requested.connect(self.share_worker.stop)
+        self.share_worker.progress.connect(self.on_share_progress); self.share_worker.finished.connect(self.on_share_finished)
+        self.share_worker.queue_flushed.connect(self.on_share_queue_flushed); self.share_worker.queue_size_changed.connect(self.on_share_queue_size_changed)
+        self.sync_requested.connect(self.share_worker.sync); self.share_worker.synced.connect(self.on_synced)
+        self.share_thread.finished.connect(self.share_worker.deleteLater)
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown_share_worker)
+        self.share_thread.start()
+        # 已设置同步密钥时，启动后立即同步一次，之后定时同步
+        self.sync_timer = QTimer(self); self.sync_timer.timeout.connect(lambda: self.start_sync(manual=False))
+        if db_handler.get_sync_meta("library_key") and SYNC_INTERVAL_MS:
+            self.start_sync(manual=False); self.sync_timer.start(SYNC_INTERVAL_MS)
+
+    def shutdown_share_worker(self):
+        """等待正在进行的上传结束后停止后台线程 (应用退出时自动调用)；未上传的分享留在队列中，下次启动时继续。"""
+        if self.share_thread is None: return
+        self._share_worker_stop_requested.emit()
+        self.share_thread.wait()
+        self.share_thread = None
+
+    def sync_library(self):
+        """手动同步；第一次同步时输入其他设备上的同步密钥，或新建一个同步库。"""
+        if not db_handler.get_sync_meta("library_key"):
+            key, ok = QInputDialog.getText(self, "设置同步", "输入其他设备上的同步密钥，以同步同一个片段库；\n留空则新建一个同步库：")
+            if not ok: return
+            key = key.strip()
+            if key and len(key) < 16:
+                QMessageBox.warning(self, "同步密钥无效", "同步密钥至少为 16 个字符。"); return
+            if not key:
+                key = secrets.token_urlsafe(24)
+                QMessageBox.information(self, "已新建同步库", f"同步密钥 (在其他设备上输入该密钥即可同步同一个片段库，请妥善保管)：\n\n{key}")
+            db_handler.set_sync_meta("library_key", key)
+            if SYNC_INTERVAL_MS: self.sync_timer.start(SYNC_INTERVAL_MS)
+        self.start_sync(manual=True)
+
+    def start_sync(self, manual):
+        """在后台线程中同步 (同一时间只进行一次)；自动同步失败时只在状态栏中提示。"""
+        if self.sync_running: return
+        self.sync_running = True; self.sync_manual = manual; self.btn_sync.setEnabled(False)
+        if manual: self.statusBar().showMessage("正在同步...")
+        self.sync_requested.emit(db_handler.get_sync_meta("library_key"))
+
+    def on_synced(self, result, error):
+        manual = self.sync_manual
+        self.sync_running = False; self.btn_sync.setEnabled(True); self.statusBar().clearMessage()
+        if result is None:
+            if manual: QMessageBox.critical(self, "同步失败", f"无法同步，稍后可重试。\n错误: {error}")
+            else: self.statusBar().showMessage(f"自动同步失败: {error}", 10000)
+            return
+        if result["changed_ids"] or result["conflicts"]:
+            self.load_snippets_list()
+            if self.current_snippet_id in result["changed_ids"] and not self.content_editor.document().isModified() and not self.title_input.isModified():
+                # 编辑器中显示的片段被其他设备修改或删除 (且没有未保存的编辑)：显示新的内容
+                if db_handler.get_snippet_meta(self.current_snippet_id) is None: self.new_snippet()
+                else: self.on_snippet_selected(self.snippet_list_model.index_for_id(self.current_snippet_id))
+        summary = f"同步完成：收到 {result['pulled']} 个修改、{result['deleted']} 个删除，推送 {result['pushed']} 个"
+        self.statusBar().showMessage(summary, 10000)
+        if result["conflicts"]:
+            QMessageBox.information(self, "同步冲突", f"{summary}。\n\n有 {result['conflicts']} 个片段同时在其他设备上被修改，已采用服务器上的版本；本地版本已另存为“冲突副本”。")
+        elif manual:
+            QMessageBox.information(self, "同步完成", summary + "。" + (f"\n有 {result['pending']} 个片段因冲突将在下次同步时处理。" if result["pending"] else ""))
+
+    def import_library(self, fmt):
+        """从 JSON Lines 文件或文件夹导入片段 (追加到现有的库中)。"""
+        if fmt == "jsonl":
+            path, _ = QFileDialog.getOpenFileName(self, "导入片段库", "", "JSON Lines (*.jsonl *.jsonl.gz);;所有文件 (*)")
+        else:
+            path = QFileDialog.getExistingDirectory(self, "选择要导入的文件夹")
+        if path: self.run_library_task(f"import_{fmt}", path)
+
+    def export_library(self, fmt):
+        """把全部片段导出为 JSON Lines 文件 (.gz 结尾时压缩) 或文件夹中的文件。"""
+        if fmt == "jsonl":
+            path, _ = QFileDialog.getSaveFileName(self, "导出片段库", "snippets.jsonl", "JSON Lines (*.jsonl);;压缩的 JSON Lines (*.jsonl.gz)")
+        else:
+            path = QFileDialog.getExistingDirectory(self, "选择导出到的文件夹")
+        if path: self.run_library_task(f"export_{fmt}", path)
+
+    def run_library_task(self, operation, path):
+        """在后台线程中执行导入/导出 (首次使用时才创建线程)，进度显示在状态栏中。"""
+        if self.library_thread is None:
+            from widgets.library_worker import LibraryWorker
+            self.library_thread = QThread()
+            self.library_worker = LibraryWorker(); self.library_worker.moveToThread(self.library_thread)
+            self.library_task_requested.connect(self.library_worker.run)
+            self.library_worker.progress.connect(lambda count: self.statusBar().showMessage(f"已处理 {count} 个片段..."))
+            self.library_worker.finished.connect(self.on_library_task_finished); self.library_worker.failed.connect(self.on_library_task_failed)
+            self.library_thread.finished.connect(self.library_worker.deleteLater)
+            QCoreApplication.instance().aboutToQuit.connect(self.shutdown_library_worker)
+            self.library_thread.start()
+        self.btn_import.setEnabled(False); self.btn_export.setEnabled(False)
+        self.statusBar().showMessage("正在导入..." if operation.startswith("import") else "正在导出...")
+        self.library_task_requested.emit(operation, path)
+
+    def on_library_task_finished(self, operation, result):
+        self.btn_import.setEnabled(True); self.btn_export.setEnabled(True); self.statusBar().clearMessage()
+        if operation.startswith("import"):
+            imported, skipped = result
+            self.load_snippets_list()
+            QMessageBox.information(self, "导入完成", f"已导入 {imported} 个片段。" + (f"\n跳过了 {skipped} 个无效的记录或文件。" if skipped else ""))
+        else:
+            QMessageBox.information(self, "导出完成", f"已导出 {result} 个片段。")
+
+    def on_library_task_failed(self, operation, error):
+        self.btn_import.setEnabled(True); self.btn_export.setEnabled(True); self.statusBar().clearMessage()
+        if operation.startswith("import"):
+            # 导入按批提交，失败前已导入的片段会保留
+            self.load_snippets_list()
+        QMessageBox.critical(self, "导入失败" if operation.startswith("import") else "导出失败", error)
+
+    def shutdown_library_worker(self):
+        """取消正在进行的导入/导出并停止后台线程 (应用退出时自动调用)。"""
+        if self.library_thread is None: return
+        self.library_worker.cancelled = True
+        self.library_thread.quit(); self.library_thread.wait()
+        self.library_thread = None
+
     def load_snippets_list(self):
-        """从数据库加载所有片段并更新UI列表。"""
-        self.snippet_list_widget.clear()
-        snippets = db_handler.get_all_snippets()
-        for snippet in snippets:
-            title = snippet.get('title', '无标题') or '无标题'
-            item = QListWidgetItem(title)
-            item.setData(Qt.ItemDataRole.UserRole, snippet['id'])
-            self.snippet_list_widget.addItem(item)
-        self.filter_snippets_list()
+        """重新加载片段列表 (首屏只读取一页，其余在滚动时加载)；搜索框中有内容时显示搜索结果。"""
+        if self.search_input.text().strip():
+            self.filter_snippets_list(); return
+        self.snippet_list_model.reload()
 
     def filter_snippets_list(self):
-        """根据搜索框的文本实时过滤列表项。"""
-        search_text = self.search_input.text().lower()
-        for i in range(self.snippet_list_widget.count()):
-            item = self.snippet_list_widget.item(i)
-            item_text = item.text().lower()
-            item.setHidden(search_text not in item_text)
-
-    def on_snippet_selected(self, item):
+        """用全文索引在标题和内容中搜索，按相关度显示结果及匹配位置的摘录；搜索框为空时显示全部片段。"""
+        query = self.search_input.text().strip()
+        if not query:
+            self.load_snippets_list(); return
+        self.snippet_list_model.set_search_results(db_handler.search_snippets(query, SEARCH_RESULT_LIMIT))
+        self.snippet_list_view.setCurrentIndex(self.snippet_list_model.index_for_id(self.current_snippet_id))
+
+    def on_snippet_selected(self, index):
         """当用户在列表中选择一个片段时，加载其内容到编辑器。"""
-        if item is None: return
-        self.current_snippet_id = item.data(Qt.ItemDataRole.UserRole)
-        snippet_data = db_handler.get_snippet_by_id(self.current_snippet_id)
+        if not index.isValid(): return
+        self.cancel_content_load()
+        self.current_snippet_id = self.snippet_list_model.snippet_id(index)
+        snippet_data = db_handler.get_snippet_meta(self.current_snippet_id)
         if snippet_data:
-            lang_alias = snippet_data.get('language', 'plaintext')
-            index = self.language_combo.findData(lang_alias)
-            self.language_combo.setCurrentIndex(index if index >= 0 else self.language_combo.findData("plaintext"))
+            self.language_combo.select_language(snippet_data.get('language', 'plaintext'))
             self.title_input.setText(snippet_data.get('title', ''))
-            self.content_editor.setText(snippet_data.get('content', ''))
+            self.load_content(self.current_snippet_id)
+
+    def load_content(self, snippet_id):
+        """
+        把片段内容载入编辑器：内容较小时一次性载入；超过 EDITOR_CHUNKED_LOAD_MIN_BYTES 时分块载入，
+        期间编辑器只读并暂停语法高亮，全部载入后再按语言高亮。
+        """
+        blob = db_handler.open_snippet_content(snippet_id)
+        if blob is None:
+            self.content_editor.clear(); return
+        if len(blob) < EDITOR_CHUNKED_LOAD_MIN_BYTES:
+            with blob: self.content_editor.setPlainText(blob.read().decode("utf-8"))
+            return
+        self.highlighter.set_language(None)
+        self.content_loader.load(blob)
+
+    def cancel_content_load(self):
+        """停止尚未完成的分块载入，丢弃已载入的部分。"""
+        if self.content_loader.loading:
+            self.content_loader.cancel(); self.content_editor.clear(); self.statusBar().clearMessage()
+            self.update_highlighter_language(self.language_combo.currentText())
+
+    def on_content_loaded(self):
+        self.statusBar().clearMessage()
+        self.highlighter.set_language(self.language_combo.currentData()); self.highlighter.highlight_new_document()
+
+    def on_content_load_failed(self, error):
+        self.statusBar().clearMessage()
+        self.update_highlighter_language(self.language_combo.currentText())
+        QMessageBox.warning(self, "载入失败", f"无法载入片段内容。\n错误: {error}")
+
+    def ensure_content_loaded(self) -> bool:
+        """保存或分享前检查编辑器中的内容是否已全部载入。"""
+        if self.content_loader.loading:
+            QMessageBox.information(self, "请稍候", "片段内容仍在载入中，请在载入完成后再操作。"); return False
+        return True
 
     def new_snippet(self):
         """清空编辑器，准备创建新片段。"""
-        self.snippet_list_widget.setCurrentItem(None)
+        self.snippet_list_view.clearSelection(); self.snippet_list_view.setCurrentIndex(QModelIndex())
+        self.cancel_content_load()
         self.current_snippet_id = None
         self.title_input.clear(); self.content_editor.clear()
         self.title_input.setFocus()
@@ -140,6 +387,7 @@ class MainWindow(QMainWindow):
 
     def save_snippet(self):
         """保存当前编辑器中的内容（新建或更新）。"""
+        if not self.ensure_content_loaded(): return
         title = self.title_input.text().strip()
         content = self.content_editor.toPlainText()
         language = self.language_combo.currentData()
@@ -150,35 +398,30 @@ class MainWindow(QMainWindow):
             # 创建新片段
             new_id = db_handler.add_snippet(title, content, language)
             self.current_snippet_id = new_id
-            item = QListWidgetItem(title)
-            item.setData(Qt.ItemDataRole.UserRole, new_id)
-            self.snippet_list_widget.insertItem(0, item)
-            self.snippet_list_widget.setCurrentItem(item)
+            self.snippet_list_model.prepend({'id': new_id, 'title': title, 'language': language})
+            self.snippet_list_view.setCurrentIndex(self.snippet_list_model.index(0))
             QMessageBox.information(self, "成功", "代码片段已成功创建！")
         else:
             # 更新现有片段
             db_handler.update_snippet(self.current_snippet_id, title, content, language)
-            for i in range(self.snippet_list_widget.count()):
-                item = self.snippet_list_widget.item(i)
-                if item.data(Qt.ItemDataRole.UserRole) == self.current_snippet_id:
-                    item.setText(title); break
+            self.snippet_list_model.update_title(self.current_snippet_id, title)
             QMessageBox.information(self, "成功", "代码片段已成功更新！")
         
-        self.filter_snippets_list()
+        if self.search_input.text().strip():
+            self.filter_snippets_list()
 
     def delete_snippet(self):
         """删除当前选中的片段。"""
         if self.current_snippet_id is None:
             QMessageBox.warning(self, "操作无效", "请先选择一个要删除的代码片段。"); return
 
-        current_item = self.snippet_list_widget.currentItem()
-        if not current_item: return
+        current_index = self.snippet_list_model.index_for_id(self.current_snippet_id)
+        if not current_index.isValid(): return
         
-        reply = QMessageBox.question(self, "确认删除", f"您确定要删除 '{current_item.text()}' 吗？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No)
+        reply = QMessageBox.question(self, "确认删除", f"您确定要删除 '{self.snippet_list_model.title(current_index)}' 吗？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
             db_handler.delete_snippet(self.current_snippet_id)
-            row = self.snippet_list_widget.row(current_item)
-            self.snippet_list_widget.takeItem(row)
+            self.snippet_list_model.remove_id(self.current_snippet_id)
             self.new_snippet()
             QMessageBox.information(self, "成功", "代码片段已删除。")
 
@@ -186,37 +429,95 @@ class MainWindow(QMainWindow):
         """处理在线分享逻辑，包括弹出选项对话框和调用API。"""
         if self.current_snippet_id is None:
             QMessageBox.warning(self, "操作无效", "请先选择一个要分享的代码片段。"); return
+        if not self.ensure_content_loaded(): return
         content = self.content_editor.toPlainText()
         if not content:
             QMessageBox.warning(self, "操作无效", "无法分享空内容。"); return
 
-        dialog = ShareOptionsDialog(self)
+        sync_url = db_handler.get_sync_share_url(self.current_snippet_id)
+        dialog = ShareOptionsDialog(self, sync_url=sync_url)
         if dialog.exec():
             duration = dialog.get_selected_duration()
+            if duration == ShareOptionsDialog.SYNC_LINK:
+                # 同步链接已存在，只需同步最新保存的修改
+                QMessageBox.information(self, "分享成功", f"同步链接{self.copy_to_clipboard(sync_url)}\n\n{sync_url}\n\n链接内容在每次同步后更新。")
+                self.start_sync(manual=False); return
             payload = {"content": content, "language": self.language_combo.currentData(), "expires_in_days": duration}
-            try:
-                response = requests.post(f"{API_BASE_URL}/api/snippets", json=payload, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                share_url = data.get("url")
-                pyperclip.copy(share_url)
-                QMessageBox.information(self, "分享成功", f"分享链接已复制到剪贴板！\n\n{share_url}")
-            except requests.exceptions.RequestException as e:
-                QMessageBox.critical(self, "分享失败", f"无法连接到分享服务器。\n错误: {e}")
-            except Exception as e:
-                QMessageBox.critical(self, "分享失败", f"发生未知错误: {e}")
-
-    def populate_language_combo(self):
-        """填充语言选择下拉框。"""
-        lexers = sorted(get_all_lexers(), key=lambda x: x[0])
-        self.language_combo.addItem("plaintext", "plaintext")
-        for lexer in lexers:
-            if lexer[1]:
-                lang_name, lang_alias = lexer[0], lexer[1][0]
-                self.language_combo.addItem(lang_name, lang_alias)
+            self.start_share([(self.current_snippet_id, payload)])
+
+    def share_selected_snippets(self):
+        """将列表中选中的多个片段通过批量接口一次性分享，并复制所有链接。"""
+        indexes = self.snippet_list_view.selectionModel().selectedIndexes()
+        if not indexes:
+            QMessageBox.warning(self, "操作无效", "请先在列表中选择要分享的代码片段 (可按住 Ctrl/Shift 多选)。"); return
+
+        dialog = ShareOptionsDialog(self)
+        if not dialog.exec():
+            return
+        duration = dialog.get_selected_duration()
+
+        payloads = []
+        for index in sorted(indexes, key=lambda index: index.row()):
+            snippet_data = db_handler.get_snippet_by_id(self.snippet_list_model.snippet_id(index))
+            if snippet_data and snippet_data.get('content'):
+                payloads.append((snippet_data['id'], {"content": snippet_data['content'], "language": snippet_data.get('language', 'plaintext'), "expires_in_days": duration}))
+        if not payloads:
+            QMessageBox.warning(self, "操作无效", "所选片段内容均为空，无法分享。"); return
+        self.start_share(payloads)
+
+    def start_share(self, items):
+        """把分享交给后台线程上传 (按批，每批不超过 BATCH_SHARE_MAX_ITEMS 个)，界面不会等待网络请求。"""
+        self.share_task_counter += 1
+        self.active_share_tasks.add(self.share_task_counter)
+        # 只有一个片段时没有中间进度，进度条显示为忙碌状态
+        self.share_progress.setRange(0, len(items) if len(items) > 1 else 0); self.share_progress.setValue(0); self.share_progress.show()
+        self.statusBar().showMessage(f"正在上传 {len(items)} 个分享...")
+        self.share_requested.emit(self.share_task_counter, items)
+
+    def on_share_progress(self, task, done, total):
+        if task == self.share_task_counter and total > 1:
+            self.share_progress.setValue(done)
+
+    def on_share_finished(self, task, urls, queued, error):
+        """后台上传结束：复制链接并显示结果；暂时无法上传的分享已留在队列中等待自动重试。"""
+        self.active_share_tasks.discard(task)
+        if not self.active_share_tasks: self.share_progress.hide()
+        self.statusBar().clearMessage()
+        if urls:
+            share_urls = "\n".join(urls)
+            copied = self.copy_to_clipboard(share_urls)
+            summary = f"分享链接{copied}\n\n{share_urls}" if len(urls) == 1 else f"已分享 {len(urls)} 个片段，所有链接{copied}\n\n{share_urls}"
+        if queued:
+            prefix = f"{summary}\n\n" if urls else ""
+            QMessageBox.warning(self, "稍后分享", f"{prefix}有 {queued} 个片段暂时无法上传，已加入待上传队列，服务器可用时会自动重试。\n错误: {error}")
+        elif error:
+            QMessageBox.critical(self, "分享失败", f"{summary}\n\n部分片段无法分享。\n错误: {error}" if urls else f"无法分享。\n错误: {error}")
+        elif urls:
+            QMessageBox.information(self, "分享成功", summary)
+
+    def copy_to_clipboard(self, text):
+        """复制分享链接，返回用于提示的文字。"""
+        import pyperclip
+        try:
+            pyperclip.copy(text); return "已复制到剪贴板！"
+        except pyperclip.PyperclipException:
+            return "如下 (无法访问剪贴板，请手动复制)："
+
+    def on_share_queue_flushed(self, uploaded, failures):
+        """之前排队的分享已在后台上传 (或因无法上传而放弃)，显示它们的链接。"""
+        def title(snippet_id):
+            snippet_data = db_handler.get_snippet_meta(snippet_id) if snippet_id is not None else None
+            return snippet_data['title'] if snippet_data else "已删除的片段"
+        lines = [f"{title(snippet_id)}: {url}" for snippet_id, url in uploaded]
+        lines += [f"{title(snippet_id)}: 无法分享 ({error})" for snippet_id, error in failures]
+        QMessageBox.information(self, "排队的分享", f"之前排队的分享已上传 {len(uploaded)} 个" + (f"，放弃 {len(failures)} 个" if failures else "") + "：\n\n" + "\n".join(lines))
+
+    def on_share_queue_size_changed(self, count):
+        self.share_queue_label.setText(f"{count} 个分享等待上传" if count else "")
 
     def update_highlighter_language(self, text):
-        """当语言选择变化时，更新语法高亮器。"""
+        """当语言选择变化时，更新语法高亮器 (分块载入期间暂停高亮，载入完成后再应用)。"""
+        if self.content_loader.loading: return
         lang_alias = self.language_combo.currentData()
         self.highlighter.set_language(lang_alias)
         self.highlighter.rehighlight()
@@ -226,10 +527,18 @@ def main():
     """
     应用程序的主入口函数，包含全局异常捕获。
     """
+    global startup_timer
+    if "--startup-timing" in sys.argv:
+        sys.argv.remove("--startup-timing")
+        startup_timer = StartupTimer(STARTUP_STARTED)
+        startup_timer.mark("导入模块")
     try:
-        app = QApplication(sys.argv)
+        app = QApplication(sys.argv); mark_startup("创建QApplication")
         main_window = MainWindow()
         main_window.show()
+        if startup_timer is not None:
+            # 事件循环处理完第一批事件 (包括窗口的首次绘制) 后才算窗口真正可用
+            QTimer.singleShot(0, lambda: (startup_timer.mark("显示窗口"), startup_timer.report()))
         sys.exit(app.exec())
     except Exception as e:
         # 捕获任何未处理的异常，以防止程序静默崩溃
@@ -244,4 +553,6 @@ def main():
         traceback.print_exc()
 
 if __name__ == '__main__':
+    # 导入时猜测语言使用 spawn 方式的进程池，打包后的可执行文件需要 freeze_support
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+# network/share_client.py
+
+import gzip
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 稍后重试可能成功的 HTTP 状态码 (超时、限流、服务器暂时不可用)
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class ShareError(Exception):
+    """分享请求失败。retryable 为 True 表示服务器暂时不可达或繁忙，稍后重试可能成功。"""
+
+    def __init__(self, message, retryable):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class ShareClient:
+    """
+    分享服务器的 HTTP 客户端。
+
+    所有请求复用同一个 requests.Session：连接保持 keep-alive 并放回连接池，
+    连续分享时不必每次重新建立 TCP/TLS 连接。Session 不是线程安全的，
+    一个 ShareClient 只应在创建它的线程中使用。
+    """
+
+    def __init__(self, base_url, timeout=(5, 30), compression_min_bytes=1024, pool_size=2):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout  # (连接超时, 读取超时) 秒
+        self.compression_min_bytes = compression_min_bytes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post_json(self, path, payload):
+        """POST JSON 数据并返回解析后的响应，较大的请求体以 gzip 压缩上传；失败时抛出 ShareError。"""
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if len(body) >= self.compression_min_bytes:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        try:
+            response = self.session.post(f"{self.base_url}{path}", data=body, headers=headers, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise ShareError(f"无法连接到分享服务器: {e}", retryable=True) from e
+        except requests.RequestException as e:
+            raise ShareError(f"请求失败: {e}", retryable=False) from e
+
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get("detail", response.reason)
+            except (ValueError, AttributeError):
+                detail = response.reason
+            raise ShareError(
+                f"服务器返回 {response.status_code}: {detail}",
+                retryable=response.status_code in RETRYABLE_STATUS_CODES,
+            )
+        try:
+            return response.json()
+        except ValueError as e:
+            # 通常是代理或网关返回的错误页面
+            raise ShareError("服务器返回了无效的响应。", retryable=True) from e
+
+    def share(self, payloads):
+        """分享一组片段 (不超过服务端的批量上限)，返回与输入顺序一致的分享链接。"""
+        if len(payloads) == 1:
+            return [self.post_json("/api/snippets", payloads[0])["url"]]
+        return [result["url"] for result in self.post_json("/api/snippets/batch", payloads)]
+
+    def close(self):
+        self.session.close()
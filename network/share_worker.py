@@ -0,0 +1,181 @@
+# network/share_worker.py
+
+import random
+import time
+import traceback
+
+from PyQt6.QtCore import QObject, QThread, QTimer, pyqtSignal
+
+from database import db_handler
+
+
+class ShareWorker(QObject):
+    """
+    在后台线程中上传分享的工作对象 (通过 moveToThread 放入 QThread)，结果通过信号发回主线程。
+
+    每个分享先写入本地数据库的 share_queue，上传成功后才移除。网络不可达、超时或服务器
+    暂时出错时分享留在队列中，按指数退避 (带随机抖动) 定时按批重试，程序重启后也会继续；
+    任何一次上传成功都说明服务器已恢复，此时立即上传队列中剩余的分享。
+
+    与服务器同步库的同步 (sync) 也在该线程中执行，复用同一个连接池。
+    """
+
+    # (任务号, 已上传数, 总数)
+    progress = pyqtSignal(int, int, int)
+    # (任务号, 分享链接列表, 留在队列中等待重试的数量, 错误信息)
+    finished = pyqtSignal(int, object, int, str)
+    # 之前排队的分享的结果: (上传成功的 [(片段ID, 链接)], 无法上传而放弃的 [(片段ID, 错误信息)])
+    queue_flushed = pyqtSignal(object, object)
+    # 队列中等待上传的分享数量
+    queue_size_changed = pyqtSignal(int)
+    # 同步结果: (SyncClient.sync 返回的统计，失败时为 None, 错误信息)
+    synced = pyqtSignal(object, str)
+
+    RETRY_BASE_SECONDS = 5
+    RETRY_MAX_SECONDS = 600
+
+    def __init__(self, base_url, compression_min_bytes=1024, batch_max_items=100):
+        super().__init__()
+        self.base_url = base_url
+        self.compression_min_bytes = compression_min_bytes
+        self.batch_max_items = batch_max_items
+        self.client = None
+        self.retry_timer = None
+
+    def start(self):
+        """在后台线程中初始化 (连接到 QThread.started)，然后上传上次退出时留在队列中的分享。"""
+        # requests 导入较慢，放在后台线程中导入不会拖慢窗口显示
+        from network.share_client import ShareClient
+        self.client = ShareClient(self.base_url, compression_min_bytes=self.compression_min_bytes)
+        self.retry_timer = QTimer(self)
+        self.retry_timer.setSingleShot(True)
+        self.retry_timer.timeout.connect(self.flush_queue)
+        self.flush_queue()
+
+    def stop(self):
+        """关闭连接池和本线程的数据库连接，然后结束线程的事件循环。"""
+        if self.retry_timer is not None:
+            self.retry_timer.stop()
+        if self.client is not None:
+            self.client.close()
+        db_handler.close_connection()
+        QThread.currentThread().quit()
+
+    def share(self, task, items):
+        """上传 items [(片段ID, payload), ...]：按批上传，每批完成后报告进度。"""
+        share_ids = db_handler.enqueue_shares(items)
+        rows = [
+            {"id": share_id, "snippet_id": snippet_id, "payload": payload, "attempts": 0}
+            for share_id, (snippet_id, payload) in zip(share_ids, items)
+        ]
+        urls, errors, queued = [], [], 0
+        for start in range(0, len(rows), self.batch_max_items):
+            batch = rows[start:start + self.batch_max_items]
+            uploaded, dropped, retry_error = self._upload_batch(batch)
+            urls.extend(url for _, url in uploaded)
+            errors.extend(error for _, error in dropped)
+            if retry_error is not None:
+                # 服务器不可用：本批剩余的和后面尚未尝试的分享都留在队列中
+                pending = [row for row in rows[start:] if row["id"] not in self._handled(uploaded, dropped)]
+                self._defer(pending, retry_error)
+                errors.append(retry_error)
+                queued = len(pending)
+                break
+            self.progress.emit(task, min(start + len(batch), len(rows)), len(rows))
+
+        self.finished.emit(task, urls, queued, errors[0] if errors else "")
+        if urls and queued == 0 and db_handler.count_queued_shares():
+            self.flush_queue(ignore_schedule=True)
+        else:
+            self._schedule_retry()
+
+    def sync(self, library_key):
+        """与服务器上的同步库双向同步本地片段库 (见 network/sync_client.py)。"""
+        from network.sync_client import SyncClient
+        try:
+            result = SyncClient(self.client, library_key, self.batch_max_items).sync()
+        except Exception as e:
+            if not hasattr(e, "retryable"):
+                traceback.print_exc()
+            self.synced.emit(None, str(e))
+        else:
+            self.synced.emit(result, "")
+
+    def flush_queue(self, ignore_schedule=False):
+        """
+        按批上传队列中已到重试时间的分享 (ignore_schedule 为 True 时上传全部)，
+        直到队列清空或服务器仍不可用。
+        """
+        now = float("inf") if ignore_schedule else time.time()
+        results, failures = [], []
+        while True:
+            rows = db_handler.get_due_shares(now, self.batch_max_items)
+            if not rows:
+                break
+            uploaded, dropped, retry_error = self._upload_batch(rows)
+            results.extend((row["snippet_id"], url) for row, url in uploaded)
+            failures.extend((row["snippet_id"], error) for row, error in dropped)
+            if retry_error is not None:
+                handled = self._handled(uploaded, dropped)
+                self._defer([row for row in rows if row["id"] not in handled], retry_error)
+                break
+            if uploaded and not ignore_schedule:
+                # 服务器已恢复，尚未到重试时间的分享也一并上传
+                now = float("inf")
+
+        if results or failures:
+            self.queue_flushed.emit(results, failures)
+        self._schedule_retry()
+
+    def _upload_batch(self, rows):
+        """
+        上传一批队列中的分享 (不超过批量上限)，从队列中移除上传成功的和无法上传的分享。
+        返回 (上传成功的 [(行, 链接)], 放弃的 [(行, 错误信息)], 需要稍后重试时的错误信息或 None)。
+        """
+        uploaded, dropped, retry_error = self._upload(rows)
+        db_handler.remove_shares([row["id"] for row, _ in uploaded + dropped])
+        return uploaded, dropped, retry_error
+
+    def _upload(self, rows):
+        try:
+            urls = self.client.share([row["payload"] for row in rows])
+            return list(zip(rows, urls)), [], None
+        except Exception as e:
+            if getattr(e, "retryable", False):
+                return [], [], str(e)
+            if not hasattr(e, "retryable"):
+                traceback.print_exc()
+            if len(rows) == 1:
+                return [], [(rows[0], str(e))], None
+
+        # 批量请求整体被拒绝 (例如其中一个片段超过大小限制)：逐个上传，只放弃有问题的分享
+        uploaded, dropped = [], []
+        for row in rows:
+            ok, bad, retry_error = self._upload([row])
+            uploaded += ok
+            dropped += bad
+            if retry_error is not None:
+                return uploaded, dropped, retry_error
+        return uploaded, dropped, None
+
+    @staticmethod
+    def _handled(uploaded, dropped):
+        return {row["id"] for row, _ in uploaded + dropped}
+
+    def _defer(self, rows, error):
+        now = time.time()
+        db_handler.defer_shares([(row["id"], now + self._retry_delay(row["attempts"])) for row in rows], error)
+
+    def _retry_delay(self, attempts):
+        """第 attempts + 1 次失败后等待的秒数：指数增长，上限 RETRY_MAX_SECONDS，±20% 抖动避免多个客户端同时重试。"""
+        delay = min(self.RETRY_MAX_SECONDS, self.RETRY_BASE_SECONDS * 2 ** attempts)
+        return delay * random.uniform(0.8, 1.2)
+
+    def _schedule_retry(self):
+        """按队列中最早的重试时间重新设置定时器，并报告队列长度。"""
+        self.queue_size_changed.emit(db_handler.count_queued_shares())
+        next_attempt = db_handler.next_share_attempt()
+        if next_attempt is None:
+            self.retry_timer.stop()
+        else:
+            self.retry_timer.start(int(max(0.0, next_attempt - time.time()) * 1000) + 1)
@@ -0,0 +1,270 @@
+# network/sync_client.py
+# 把本地片段库与服务器上的同步库双向同步，也可以在命令行中运行 (在项目根目录下):
+#   python -m network.sync_client --key <同步密钥>
+
+import argparse
+import hashlib
+import json
+import os
+import uuid as uuid_module
+
+from backend.textdiff import make_diff
+from database import db_handler
+
+# 每次推送/下载内容的最大片段数 (不超过服务端的 SNIPPET_BATCH_MAX_ITEMS)
+SYNC_BATCH_MAX_ITEMS = 100
+# 每次推送的内容 (完整内容或差异) 的总字节数上限，超过后分到下一次请求
+SYNC_PUSH_MAX_BYTES = 8 * 1024 * 1024
+# 差异 (JSON 编码后) 不超过完整内容的该比例时发送差异，否则发送完整内容
+SYNC_DIFF_MAX_RATIO = 0.8
+# 本地修改与其他设备的修改冲突时，本地版本另存为带该后缀的新片段
+CONFLICT_COPY_SUFFIX = " (冲突副本)"
+
+
+def content_hash(content: str) -> str:
+    # 与服务端 snippet_blobs.content_hash 一致
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class SyncClient:
+    """
+    与服务器上的同步库 (由同步密钥标识) 双向同步本地片段库。
+
+    每次同步先拉取后推送：
+    - 拉取只下载变更的元数据 (按服务端的变更序号增量拉取)，只为内容哈希与本地不同的片段下载内容；
+    - 推送只发送自上次同步以来修改过的片段，已同步过的片段发送相对于上次同步内容的行差异；
+    - 本地修改与其他设备的修改冲突时，以服务器上的版本为准，本地版本另存为冲突副本 (随后作为新片段推送)。
+
+    client 为 ShareClient (只在创建它的线程中使用)。
+    """
+
+    def __init__(self, client, library_key, batch_max_items=SYNC_BATCH_MAX_ITEMS):
+        self.client = client
+        self.library_key = library_key
+        self.batch_max_items = batch_max_items
+
+    def sync(self) -> dict:
+        """
+        执行一次完整的同步，返回统计：pulled (应用的远程修改)、deleted (应用的远程删除)、pushed (推送的修改和删除)、
+        conflicts (产生的冲突副本)、pending (因冲突留待下次同步的片段)、changed_ids (被远程修改或删除的本地片段ID)。
+        网络错误时抛出 ShareError，已完成的部分不会丢失，下次同步从中断处继续。
+        """
+        result = {"pulled": 0, "deleted": 0, "pushed": 0, "conflicts": 0, "pending": 0, "changed_ids": set()}
+        self.pull(result)
+        self.push(result)
+        return result
+
+    # --- 拉取 ---
+
+    def pull(self, result):
+        since = int(db_handler.get_sync_meta("pull_cursor", 0))
+        while True:
+            page = self.client.post_json("/api/sync/pull", {"library_key": self.library_key, "since": since})
+            self._apply_changes(page["items"], result)
+            since = page["cursor"]
+            db_handler.set_sync_meta("pull_cursor", since)
+            if not page["more"]:
+                return
+
+    def _apply_changes(self, changes, result):
+        states = db_handler.get_sync_states(change["uuid"] for change in changes)
+        to_fetch = []
+        for change in changes:
+            state = states.get(change["uuid"])
+            if change["deleted"]:
+                if state is None:
+                    continue
+                if self._local_changes(state) is not None:
+                    # 其他设备删除了本地修改过的片段：保留本地版本，作为新片段重新推送
+                    db_handler.reset_sync_state(state["snippet_id"], str(uuid_module.uuid4()))
+                else:
+                    db_handler.delete_synced_snippet(state["snippet_id"])
+                    result["deleted"] += 1
+                result["changed_ids"].add(state["snippet_id"])
+            elif state is not None and self._same_as_base(state, change):
+                # 本设备推送的修改 (或已经一致)，只更新版本号和分享链接
+                db_handler.update_sync_version(state["snippet_id"], change["version"], change["url"])
+            else:
+                to_fetch.append(change)
+
+        for start in range(0, len(to_fetch), self.batch_max_items):
+            batch = to_fetch[start:start + self.batch_max_items]
+            contents = {
+                item["uuid"]: item
+                for item in self.client.post_json(
+                    "/api/sync/fetch", {"library_key": self.library_key, "uuids": [change["uuid"] for change in batch]}
+                )
+            }
+            for change in batch:
+                # 拉取之后又被删除的片段不返回内容，删除会在下次拉取时应用
+                if change["uuid"] in contents:
+                    self._apply_remote(change, contents[change["uuid"]], states.get(change["uuid"]), result)
+
+    def _apply_remote(self, change, remote, state, result):
+        snippet_id = None
+        if state is not None:
+            snippet_id = state["snippet_id"]
+            local = self._local_changes(state)
+            if local is not None and content_hash(local["content"]) != remote["content_hash"]:
+                db_handler.add_snippet(local["title"] + CONFLICT_COPY_SUFFIX, local["content"], local["language"])
+                result["conflicts"] += 1
+        snippet_id = db_handler.save_remote_snippet(
+            snippet_id, change["uuid"], change["url"], change["version"], change["title"] or "无标题",
+            remote["content"], change["language"] or "plaintext", remote["content_hash"],
+        )
+        if snippet_id is not None:
+            result["pulled"] += 1
+            result["changed_ids"].add(snippet_id)
+
+    @staticmethod
+    def _same_as_base(state, change):
+        return (state["base_hash"] == change["content_hash"] and state["base_title"] == change["title"]
+                and state["base_language"] == change["language"])
+
+    @staticmethod
+    def _local_changes(state):
+        """片段自上次同步以来被本地修改过时返回片段 (dict)，否则返回 None。"""
+        if state["synced_rev"] == state["local_rev"]:
+            return None
+        snippet = db_handler.get_snippet_by_id(state["snippet_id"])
+        if snippet is None or (content_hash(snippet["content"]) == state["base_hash"]
+                               and snippet["title"] == state["base_title"]
+                               and snippet["language"] == state["base_language"]):
+            return None
+        return snippet
+
+    # --- 推送 ---
+
+    def push(self, result):
+        """推送有未推送修改的已同步片段，以及 id 大于上次推送时最大 id 的新片段 (包括导入的片段)。"""
+        id_cursor = int(db_handler.get_sync_meta("push_id_cursor", 0))
+        after = 0
+        while True:
+            rows = db_handler.get_sync_changes(id_cursor, after, self.batch_max_items)
+            if not rows:
+                break
+            after = rows[-1]["id"]
+            # 新片段在推送前已分配同步ID，因冲突未能推送时仍会作为有修改的片段被再次选中
+            result["pending"] += len(self._push_rows(rows, result))
+        db_handler.set_sync_meta("push_id_cursor", max(id_cursor, after))
+        self._push_tombstones(result)
+
+    def _push_rows(self, rows, result):
+        """推送一批候选片段，返回因冲突未能推送的行。"""
+        new = [(row["id"], str(uuid_module.uuid4())) for row in rows if row["uuid"] is None]
+        if new:
+            db_handler.assign_sync_uuids(new)
+            uuids = dict(new)
+            for row in rows:
+                row["uuid"] = row["uuid"] or uuids[row["id"]]
+
+        pending = []
+        for row in rows:
+            row["content_hash"] = content_hash(row["content"])
+            if (row["base_hash"] == row["content_hash"] and row["title"] == row["base_title"]
+                    and row["language"] == row["base_language"]):
+                db_handler.mark_sync_unchanged(row["id"], row["local_rev"])
+            else:
+                pending.append(row)
+
+        conflicted, need_full = [], []
+        for batch in self._byte_batches(pending, full=False):
+            conflicted_rows, retry = self._send(batch, full=False, result=result)
+            conflicted += conflicted_rows
+            need_full += retry
+        for batch in self._byte_batches(need_full, full=True):
+            conflicted_rows, retry = self._send(batch, full=True, result=result)
+            conflicted += conflicted_rows + retry
+        return conflicted
+
+    def _byte_batches(self, rows, full):
+        batch, size = [], 0
+        for row in rows:
+            item = self._push_item(row, full)
+            item_size = len(item["content"].encode("utf-8")) if "content" in item else len(json.dumps(item.get("diff")))
+            if batch and (len(batch) >= self.batch_max_items or size + item_size > SYNC_PUSH_MAX_BYTES):
+                yield batch
+                batch, size = [], 0
+            batch.append((row, item))
+            size += item_size
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _push_item(row, full):
+        """推送的一项：内容未变时只发送元数据，有同步基准时优先发送差异 (差异明显更小时)，否则发送完整内容。"""
+        item = {
+            "uuid": row["uuid"], "title": row["title"], "language": row["language"],
+            "base_hash": row["base_hash"], "content_hash": row["content_hash"],
+        }
+        if full:
+            item["content"] = row["content"]
+        elif row["content_hash"] != row["base_hash"]:
+            diff = make_diff(row["base_content"], row["content"]) if row["base_content"] is not None else None
+            if diff is not None and len(json.dumps(diff)) <= SYNC_DIFF_MAX_RATIO * len(row["content"].encode("utf-8")):
+                item["diff"] = diff
+            else:
+                item["content"] = row["content"]
+        return item
+
+    def _send(self, batch, full, result):
+        """发送一次推送请求，返回 (冲突的行, 需要重新发送完整内容的行)。"""
+        results = self.client.post_json("/api/sync/push", {"library_key": self.library_key, "items": [item for _, item in batch]})
+        conflicted, retry = [], []
+        for (row, _), pushed in zip(batch, results):
+            if pushed["status"] == "ok":
+                db_handler.record_sync(
+                    row["id"], row["uuid"], pushed["url"], pushed["version"], row["content"], row["content_hash"],
+                    row["title"], row["language"], row["local_rev"] or 0,
+                )
+                result["pushed"] += 1
+            elif pushed["status"] == "need_full" and not full:
+                retry.append(row)
+            else:
+                conflicted.append(row)
+        return conflicted, retry
+
+    def _push_tombstones(self, result):
+        while True:
+            uuids = db_handler.get_sync_tombstones(self.batch_max_items)
+            if not uuids:
+                return
+            self.client.post_json("/api/sync/push", {
+                "library_key": self.library_key, "items": [{"uuid": uuid, "deleted": True} for uuid in uuids],
+            })
+            db_handler.remove_sync_tombstones(uuids)
+            result["pushed"] += len(uuids)
+
+
+def main():
+    from network.share_client import ShareClient
+
+    parser = argparse.ArgumentParser(description="CodeSharer 片段库同步")
+    parser.add_argument("--db", help=f"本地数据库路径，默认为 {os.path.normpath(db_handler.DB_PATH)}")
+    parser.add_argument("--server", default="http://127.0.0.1:8000", help="分享服务器地址")
+    parser.add_argument("--key", help="同步密钥 (第一次同步时指定，之后保存在本地数据库中)")
+    args = parser.parse_args()
+    if args.db:
+        db_handler.DB_PATH = args.db
+    db_handler.init_db()
+
+    library_key = db_handler.get_sync_meta("library_key")
+    if library_key is None:
+        if not args.key:
+            parser.error("第一次同步时需要用 --key 指定同步密钥")
+        library_key = args.key
+        db_handler.set_sync_meta("library_key", library_key)
+    elif args.key and args.key != library_key:
+        parser.error("本地片段库已与另一个同步密钥关联")
+
+    client = ShareClient(args.server)
+    try:
+        result = SyncClient(client, library_key).sync()
+    finally:
+        client.close()
+    print(f"同步完成：应用远程修改 {result['pulled']} 个、远程删除 {result['deleted']} 个，推送 {result['pushed']} 个，"
+          f"冲突副本 {result['conflicts']} 个。")
+
+
+if __name__ == "__main__":
+    main()
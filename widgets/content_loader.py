@@ -0,0 +1,81 @@
+# widgets/content_loader.py
+
+import codecs
+import sqlite3
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QTextCursor
+
+
+class ContentLoader(QObject):
+    """
+    把大片段的内容分块载入 QPlainTextEdit，界面在载入期间保持响应。
+
+    - 内容通过 SQLite 增量 blob I/O 按 chunk_bytes 字节读取 (db_handler.open_snippet_content)，
+      不会先把整个字符串读入内存再复制给编辑器；
+    - 每轮事件循环追加一块，第一块载入后即可查看开头部分；
+    - 载入期间编辑器为只读且不记录撤销历史，全部载入后恢复可编辑，文档标记为未修改。
+    """
+
+    # (已载入字节数, 总字节数)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+    # 错误信息 (例如载入期间片段被删除)
+    failed = pyqtSignal(str)
+
+    def __init__(self, editor, chunk_bytes=512 * 1024, parent=None):
+        super().__init__(parent)
+        self.editor = editor
+        self.chunk_bytes = chunk_bytes
+        self._blob = None
+        self._decoder = None
+        self._timer = QTimer(self); self._timer.setInterval(0); self._timer.timeout.connect(self._load_chunk)
+
+    @property
+    def loading(self) -> bool:
+        return self._blob is not None
+
+    def load(self, blob):
+        """开始载入 blob (只读的 sqlite3.Blob) 中的 UTF-8 内容，载入结束或取消时关闭 blob。"""
+        self.cancel()
+        self._blob = blob
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.editor.setReadOnly(True)
+        self.editor.setUndoRedoEnabled(False)
+        self.editor.clear()
+        self._load_chunk()
+        if self.loading:
+            self._timer.start()
+
+    def cancel(self):
+        """停止载入 (切换到其他片段时)，编辑器恢复可编辑，已载入的部分由调用方替换。"""
+        if self._blob is None:
+            return
+        self._close()
+        self.editor.setUndoRedoEnabled(True)
+        self.editor.setReadOnly(False)
+
+    def _load_chunk(self):
+        try:
+            data = self._blob.read(self.chunk_bytes)
+            position, total = self._blob.tell(), len(self._blob)
+            text = self._decoder.decode(data, final=position >= total)
+        except (sqlite3.Error, UnicodeDecodeError) as e:
+            self.cancel()
+            self.failed.emit(str(e))
+            return
+        cursor = QTextCursor(self.editor.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
+        self.progress.emit(position, total)
+        if position >= total:
+            self._close()
+            self.editor.setUndoRedoEnabled(True)
+            self.editor.document().setModified(False)
+            self.editor.setReadOnly(False)
+            self.finished.emit()
+
+    def _close(self):
+        self._timer.stop()
+        self._blob.close()
+        self._blob, self._decoder = None, None
@@ -0,0 +1,49 @@
+# widgets/highlight_worker.py
+
+import traceback
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+class HighlightWorker(QObject):
+    """
+    在后台线程中继续主线程未完成的词法分析的工作对象 (通过 moveToThread 放入 QThread)。
+
+    每分析完 CHUNK_LINES 行就通过 chunk_ready 发出一批结果，主线程收到后即可应用，
+    不必等待整篇文档分析完成。generation 由主线程修改：文档被编辑或切换语言后，
+    正在进行的任务在下一批结果前发现代号不一致即放弃。
+    """
+
+    # (任务代号, 本批第一行的文本块号, [格式区间, ...])
+    chunk_ready = pyqtSignal(int, int, object)
+    finished = pyqtSignal(int)
+
+    CHUNK_LINES = 500
+
+    def __init__(self):
+        super().__init__()
+        self.generation = 0
+
+    def run(self, generation, first, results):
+        """
+        继续迭代 DocumentLexer.lex_lines 返回的生成器 results，first 为其下一行的文本块号。
+        生成器由主线程交出后只在这里使用。
+        """
+        if generation != self.generation:
+            return
+        try:
+            chunk = []
+            for _index, runs in results:
+                chunk.append(runs)
+                if len(chunk) >= self.CHUNK_LINES:
+                    if generation != self.generation:
+                        return
+                    self.chunk_ready.emit(generation, first, chunk)
+                    first += len(chunk)
+                    chunk = []
+            if chunk:
+                self.chunk_ready.emit(generation, first, chunk)
+        except Exception:
+            # 分析失败时剩余的行保持原来的格式
+            traceback.print_exc()
+        self.finished.emit(generation)
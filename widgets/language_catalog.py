@@ -0,0 +1,45 @@
+# widgets/language_catalog.py
+
+import json
+import os
+
+# 语言目录缓存与本地数据库放在同一目录
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'language_catalog.json')
+
+
+def build_language_catalog():
+    """
+    枚举 Pygments 的全部 lexer (包括通过 entry point 安装的插件)，返回按名称排序的 [(名称, 别名)]。
+    枚举插件时会导入插件模块，耗时可达数百毫秒，因此结果会被缓存。
+    """
+    from pygments.lexers import get_all_lexers
+    lexers = sorted(get_all_lexers(), key=lambda x: x[0])
+    return [(name, aliases[0]) for name, aliases, _, _ in lexers if aliases]
+
+
+def load_language_catalog(path=None):
+    """
+    返回 [(名称, 别名)]，优先读取 JSON 缓存。缓存以 Pygments 版本为键，
+    版本变化、缓存缺失或损坏时重新生成；安装或卸载 Pygments 插件后删除缓存文件即可刷新。
+    """
+    import pygments
+    path = path or CATALOG_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("pygments_version") == pygments.__version__:
+            return [(name, alias) for name, alias in cached["languages"]]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    languages = build_language_catalog()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，同时启动的多个客户端不会读到写了一半的缓存
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"pygments_version": pygments.__version__, "languages": languages}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"写入语言目录缓存失败: {e}")
+    return languages
@@ -0,0 +1,46 @@
+# widgets/language_combo.py
+
+from PyQt6.QtWidgets import QComboBox
+
+from widgets.language_catalog import load_language_catalog
+
+
+class LanguageComboBox(QComboBox):
+    """
+    语言选择下拉框，条目的数据为 Pygments 别名。
+
+    启动时只包含 plaintext；完整的语言列表在第一次需要时 (展开、获得焦点、滚轮切换或按别名选择)
+    才从语言目录加载，避免在窗口显示之前枚举所有 lexer。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._populated = False
+        self.addItem("plaintext", "plaintext")
+
+    def ensure_populated(self):
+        """加载完整的语言列表 (只执行一次)，当前选中项保持不变。"""
+        if self._populated:
+            return
+        self._populated = True
+        for name, alias in load_language_catalog():
+            self.addItem(name, alias)
+
+    def select_language(self, alias):
+        """选中指定别名的语言，未知的别名选中 plaintext。"""
+        if alias != "plaintext":
+            self.ensure_populated()
+        index = self.findData(alias)
+        self.setCurrentIndex(index if index >= 0 else self.findData("plaintext"))
+
+    def showPopup(self):
+        self.ensure_populated()
+        super().showPopup()
+
+    def focusInEvent(self, event):
+        self.ensure_populated()
+        super().focusInEvent(event)
+
+    def wheelEvent(self, event):
+        self.ensure_populated()
+        super().wheelEvent(event)
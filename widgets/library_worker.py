@@ -0,0 +1,57 @@
+# widgets/library_worker.py
+
+import traceback
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from database import db_handler, library_io
+
+# 操作名 -> library_io 中的函数
+LIBRARY_OPERATIONS = {
+    "export_jsonl": library_io.export_jsonl,
+    "export_tree": library_io.export_tree,
+    "import_jsonl": library_io.import_jsonl,
+    "import_tree": library_io.import_tree,
+}
+
+
+class LibraryTaskCancelled(Exception):
+    """导入/导出在进度回调中被取消 (已提交的导入批次会保留)。"""
+
+
+class LibraryWorker(QObject):
+    """
+    在后台线程中执行片段库的导入/导出 (通过 moveToThread 放入 QThread)，界面在此期间保持响应。
+    cancelled 由主线程设置 (例如应用退出时)，任务在下一次报告进度时停止。
+    """
+
+    # 已处理的片段数
+    progress = pyqtSignal(int)
+    # (操作名, 结果)：导出为片段数，导入为 (导入数量, 跳过数量)
+    finished = pyqtSignal(str, object)
+    # (操作名, 错误信息)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = False
+
+    def run(self, operation, path):
+        self.cancelled = False
+        try:
+            result = LIBRARY_OPERATIONS[operation](path, progress=self._report_progress)
+        except LibraryTaskCancelled:
+            self.failed.emit(operation, "操作已取消。")
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(operation, f"{type(e).__name__}: {e}")
+        else:
+            self.finished.emit(operation, result)
+        finally:
+            # 任务之间本线程不再访问数据库，不必保留长连接
+            db_handler.close_connection()
+
+    def _report_progress(self, count):
+        if self.cancelled:
+            raise LibraryTaskCancelled()
+        self.progress.emit(count)
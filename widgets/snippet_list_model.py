@@ -0,0 +1,131 @@
+# widgets/snippet_list_model.py
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from database import db_handler
+
+
+class SnippetListModel(QAbstractListModel):
+    """
+    片段列表的数据模型，配合 QListView 使用，只为可见的行创建显示数据。
+
+    - 按更新时间倒序，通过 canFetchMore/fetchMore 在滚动到底部时按页 (键集分页) 从 SQLite 读取；
+    - 维护 id -> 位置 的索引，定位、重命名和在顶部插入新片段都是 O(1)；
+      从中间删除行后索引在下次查找时才重建；
+    - 也可以整体替换为全文搜索的结果 (不分页)。
+    """
+
+    PAGE_SIZE = 200
+    IdRole = Qt.ItemDataRole.UserRole
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []  # 每行为 dict: id, title, language, updated_at (搜索结果另有 snippet / title_highlight)
+        self._position = {}  # id -> 位置；行号 = 位置 - self._base，在顶部插入时只需减小 _base
+        self._base = 0
+        self._index_dirty = False
+        self._cursor = None  # 已加载的最后一行的 (updated_at, id)
+        self._exhausted = False
+
+    # --- Qt 模型接口 ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        snippet = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            title = snippet.get('title') or '无标题'
+            excerpt = snippet.get('snippet')
+            return f"{title}\n    {' '.join(excerpt.split())}" if excerpt else title
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return snippet.get('title_highlight') or snippet.get('title')
+        if role == self.IdRole:
+            return snippet['id']
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        page = db_handler.get_snippets_page(self._cursor, self.PAGE_SIZE)
+        if len(page) < self.PAGE_SIZE:
+            self._exhausted = True
+        if not page:
+            return
+        self._cursor = (page[-1]['updated_at'], page[-1]['id'])
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._rows.extend(page)
+        if not self._index_dirty:
+            self._position.update((snippet['id'], self._base + first + i) for i, snippet in enumerate(page))
+        self.endInsertRows()
+
+    # --- 供主窗口调用的操作 ---
+
+    def reload(self):
+        """清空并从第一页重新加载 (视图会在需要时继续调用 fetchMore)。"""
+        self.beginResetModel()
+        self._rows, self._position, self._base, self._index_dirty = [], {}, 0, False
+        self._cursor, self._exhausted = None, False
+        self.endResetModel()
+        self.fetchMore()
+
+    def set_search_results(self, results):
+        """显示全文搜索结果 (已按相关度排序)，搜索模式下不再分页加载。"""
+        self.beginResetModel()
+        self._rows = list(results)
+        self._position = {snippet['id']: row for row, snippet in enumerate(self._rows)}
+        self._base, self._index_dirty = 0, False
+        self._cursor, self._exhausted = None, True
+        self.endResetModel()
+
+    def snippet_id(self, index):
+        return self._rows[index.row()]['id'] if index.isValid() else None
+
+    def title(self, index):
+        if not index.isValid():
+            return None
+        return self._rows[index.row()].get('title') or '无标题'
+
+    def row_for_id(self, snippet_id):
+        if self._index_dirty:
+            self._position = {snippet['id']: row for row, snippet in enumerate(self._rows)}
+            self._base, self._index_dirty = 0, False
+        position = self._position.get(snippet_id)
+        return None if position is None else position - self._base
+
+    def index_for_id(self, snippet_id):
+        row = self.row_for_id(snippet_id)
+        return self.index(row) if row is not None else QModelIndex()
+
+    def prepend(self, snippet):
+        """在列表顶部插入一个新建的片段 (它的更新时间最新，不会再出现在后续页中)。"""
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._rows.insert(0, snippet)
+        self._base -= 1
+        if not self._index_dirty:
+            self._position[snippet['id']] = self._base
+        self.endInsertRows()
+
+    def update_title(self, snippet_id, title):
+        row = self.row_for_id(snippet_id)
+        if row is None:
+            return
+        self._rows[row] = dict(self._rows[row], title=title, title_highlight=None)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole])
+
+    def remove_id(self, snippet_id):
+        row = self.row_for_id(snippet_id)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self._position.pop(snippet_id, None)
+        self._index_dirty = True
+        self.endRemoveRows()
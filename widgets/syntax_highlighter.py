@@ -1,70 +1,602 @@
 # widgets/syntax_highlighter.py (修正版)
 
-from PyQt6.QtGui import QSyntaxHighlighter, QTextCharFormat, QFont, QColor
-from PyQt6.QtCore import QRegularExpression
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name, guess_lexer
-from pygments.formatter import Formatter
-
-class _PygmentsFormatter(Formatter):
-    """自定义Pygments Formatter，用于将token映射到QTextCharFormat"""
-    def __init__(self):
+from time import perf_counter
+
+from PyQt6.QtCore import QCoreApplication, QPoint, QThread, QTimer, pyqtSignal
+from PyQt6.QtGui import QSyntaxHighlighter, QTextCharFormat, QTextDocument, QFont, QColor
+from pygments.lexers import get_lexer_by_name
+from pygments.token import STANDARD_TYPES
+from pygments.util import ClassNotFound
+
+from widgets.highlight_worker import HighlightWorker
+
+# 超大文档的处理方式：只高亮可见区域附近的行 (逐行独立分析)，或完全不高亮
+LARGE_DOCUMENT_MODES = ("viewport", "plain")
+
+
+class StyleFormats(dict):
+    """
+    Pygments 样式中的 token 类型 -> QTextCharFormat。
+    格式在第一次用到某个类型时才创建，一篇文档通常只会用到其中很少一部分。
+    """
+
+    def __init__(self, style):
         super().__init__()
-        self.data = []
+        self._style = style
+        # 与 Style 类内部的 _styles 相同：所有标准类型加上样式中定义的类型
+        self.tokens = frozenset(STANDARD_TYPES) | frozenset(style.styles)
+        self._by_token = {}
+
+    def __missing__(self, token):
+        s = self._style.style_for_token(token)
+        fmt = QTextCharFormat()
+        if s['color']:
+            fmt.setForeground(QColor(f"#{s['color']}"))
+        if s['bgcolor']:
+            fmt.setBackground(QColor(f"#{s['bgcolor']}"))
+        if s['bold']:
+            fmt.setFontWeight(QFont.Weight.Bold)
+        if s['italic']:
+            fmt.setFontItalic(True)
+        if s['underline']:
+            fmt.setFontUnderline(True)
+        self[token] = fmt
+        return fmt
+
+    def for_token(self, ttype):
+        """lexer 产生的 token 类型对应的格式：样式中未定义的子类型沿用父类型，都没有定义时为 None。"""
+        try:
+            return self._by_token[ttype]
+        except KeyError:
+            parent = ttype
+            while parent is not None and parent not in self.tokens:
+                parent = parent.parent
+            fmt = self._by_token[ttype] = self[parent] if parent is not None else None
+            return fmt
+
+
+class DocumentLexer:
+    """
+    与 Qt 无关的按行词法分析，只使用 lexer 的公开接口 get_tokens_unprocessed，可以同时在主线程和后台线程中使用。
+    每行的结果为格式区间 ((起点, 长度, token 类型), ...)，包含行尾的换行符。
+
+    Pygments 的许多规则用一个正则匹配整个多行结构 (Python 文档字符串、C/PHP 块注释、Go 原始字符串、
+    SQL 多行字符串等)，某一行的 token 可能取决于其后的行，逐行传递状态栈无法得到正确结果。
+    因此总是从某一行的行首开始、以根状态连续分析其后的文本，结果与整篇分析一致。
+    能作为起点的行称为“可重新开始”的行：该行不是空行，并且单独分析的结果 (含行尾换行符) 与它在整篇中的结果相同，
+    即它不处于之前开始的多行结构或状态之中，也没有开始一个延续到下一行的 token。
+    """
+
+    CACHE_MAX_ENTRIES = 50000
+
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self._line_cache = {}
+
+    def lex_line(self, text):
+        """从根状态单独分析一行，结果按行文本缓存。"""
+        runs = self._line_cache.get(text)
+        if runs is None:
+            runs = next(self._split_lines(text + "\n"))[1]
+            if len(self._line_cache) >= self.CACHE_MAX_ENTRIES:
+                self._line_cache.clear()
+            self._line_cache[text] = runs
+        return runs
+
+    def restartable(self, text, runs) -> bool:
+        # 空行在大多数状态下都只产生空白 token，无法据此判断它是否处于某个状态之中
+        return bool(text.strip()) and runs == self.lex_line(text)
+
+    def restart_line(self, lines, runs, line) -> int:
+        """line 及之前最近的可重新开始的行号，没有时为 0。runs[i] 为 None (结果未知) 的行不能作为起点。"""
+        while line > 0:
+            if runs[line] is not None and self.restartable(lines[line], runs[line]):
+                return line
+            line -= 1
+        return 0
+
+    def lex_lines(self, lines, previous=(), resync_from=0):
+        """
+        从 lines[0] 的行首开始连续分析，依次产生 (下标, 格式区间)。
+        previous 为各行原来的结果 (未知为 None)：下标 resync_from 及之后某一行的新结果与原结果相同、
+        并且该行可重新开始时停止，其后的文本没有变化，原结果仍然有效。
+        """
+        for index, runs in self._split_lines("\n".join(lines) + "\n"):
+            if index >= resync_from and index < len(previous) and runs == previous[index] and self.restartable(lines[index], runs):
+                return
+            yield index, runs
+
+    def _split_lines(self, text):
+        """
+        分析以换行符结尾的 text，把 token 按行切分，依次产生 (行号, 本行合并后的格式区间)。
+        个别 lexer 会重复产生已经分析过的位置 (例如 Ruby 中未结束的 heredoc)，重叠的部分以先产生的 token 为准；
+        没有被任何 token 覆盖的文本没有格式。
+        """
+        runs = []
+        line = 0
+        line_start = 0
+        line_stop = text.find("\n") + 1  # 本行 (含换行符) 的结束位置
+        covered = 0
+        for index, ttype, value in self.lexer.get_tokens_unprocessed(text):
+            index, end = max(index, covered), min(index + len(value), len(text))
+            if index >= end:
+                continue
+            covered = end
+            while index < end:
+                if index >= line_stop:
+                    yield line, tuple(runs)
+                    runs = []
+                    line += 1
+                    line_start, line_stop = line_stop, text.find("\n", line_stop) + 1
+                    continue
+                stop = min(end, line_stop)
+                start = index - line_start
+                if runs and runs[-1][2] is ttype and runs[-1][0] + runs[-1][1] == start:
+                    runs[-1] = (runs[-1][0], runs[-1][1] + stop - index, ttype)
+                else:
+                    runs.append((start, stop - index, ttype))
+                index = stop
+        while line_start < len(text):
+            yield line, tuple(runs)
+            runs = []
+            line += 1
+            line_start, line_stop = line_stop, text.find("\n", line_stop) + 1
 
-    def format(self, tokensource, outfile):
-        self.data = []
-        for ttype, value in tokensource:
-            self.data.append((ttype, value))
 
 class SyntaxHighlighter(QSyntaxHighlighter):
-    def __init__(self, parent):
-        super().__init__(parent)
-        self.formatter = _PygmentsFormatter()
-        
+    """
+    增量语法高亮器。
+
+    - 每个文本块的格式区间保存在 _runs 中 (与 _lines 中的行文本一一对应)，highlightBlock 直接应用；
+    - 文档被编辑后，从编辑位置之前最近的可重新开始的行起连续分析 (见 DocumentLexer)，
+      到编辑范围之后某一行的结果与原来相同为止，其间结果改变的行再重新应用格式。一次编辑通常只需分析几行；
+    - 可重新开始的判断只看单行，编辑也可能补全前面某个未闭合的结构 (例如在后面补上引号或 */)，
+      局部分析的结果只是预览：停止编辑 VERIFY_DELAY_MS 毫秒后再整篇分析一遍 (后台模式下在后台线程中进行)，
+      最终结果与整篇分析一致，多行字符串、文档字符串、块注释和 heredoc 都能正确高亮。
+
+    后台模式 (background=True) 下，每轮事件循环只同步分析 SYNC_BUDGET_SECONDS 内能完成的行，
+    其余的行由后台线程继续分析后分批应用，可见区域优先。
+    字符数超过 large_document_chars 的文档按 large_document_mode 只高亮可见区域或不高亮。
+    set_language / rehighlight 的用法不变；全部高亮完成时发出 finished 信号。
+    """
+
+    SYNC_BUDGET_SECONDS = 0.015
+    VERIFY_DELAY_MS = 200
+    VIEWPORT_MARGIN_BLOCKS = 100
+
+    finished = pyqtSignal()
+    _job_requested = pyqtSignal(int, int, object)
+
+    def __init__(self, parent, view=None, background=True, large_document_chars=2_000_000, large_document_mode="viewport"):
+        super().__init__(None)
+        if large_document_mode not in LARGE_DOCUMENT_MODES:
+            raise ValueError(f"large_document_mode 必须是 {LARGE_DOCUMENT_MODES} 之一")
+
         # --- 关键修正 ---
         # 在高亮器初始化时，必须先将lexer设为None，否则后续调用会立即报错。
         self.lexer = None
-        
-        # 从Pygments样式中获取颜色定义 (使用默认样式)
+        self._doc_lexer = None
+        self.background = background
+        self.large_document_chars = large_document_chars
+        self.large_document_mode = large_document_mode
+
+        # 从Pygments样式中获取颜色定义 (使用默认样式)，各类型的格式在第一次使用时创建
         from pygments.styles import get_style_by_name
-        style = get_style_by_name('default')
-        self.formats = {}
-        for token, s in style:
-            fmt = QTextCharFormat()
-            if s['color']:
-                fmt.setForeground(QColor(f"#{s['color']}"))
-            if s['bgcolor']:
-                fmt.setBackground(QColor(f"#{s['bgcolor']}"))
-            if s['bold']:
-                fmt.setFontWeight(QFont.Weight.Bold)
-            if s['italic']:
-                fmt.setFontItalic(True)
-            if s['underline']:
-                fmt.setFontUnderline(True)
-            self.formats[token] = fmt
+        self.formats = StyleFormats(get_style_by_name('default'))
+
+        # 文档各行的镜像：行文本、格式区间 (尚未分析为 None)、格式是否已应用到文本块。
+        # _dirty 为 [首行, 末行]：结果需要重新分析的范围，从首行之前的可重新开始的行开始，
+        # 分析到末行之后与原结果重新一致为止；None 表示所有行的结果都是最新的。
+        # _unverified 为 True 时局部分析的结果还需要整篇分析一遍来确认
+        self._lines = []
+        self._runs = []
+        self._shown = []
+        self._dirty = None
+        self._unverified = False
+        self._pending_hint = None  # 第一个格式尚未应用的行号下界；None 表示没有
+
+        # 后台分析任务：_generation 在文档编辑或切换语言时递增，旧任务的结果随之作废
+        self._thread = None
+        self._worker = None
+        self._generation = 0
+        self._job_running = False
+        self._job_full = False
+        self._job_restart = 0
+        self._job_next = 0
+        self._queued_job = None
+        self._applying = False
+        self._turn_deadline = None
+
+        self._turn_timer = QTimer(self); self._turn_timer.setSingleShot(True); self._turn_timer.timeout.connect(self._end_turn)
+        self._apply_timer = QTimer(self); self._apply_timer.setSingleShot(True); self._apply_timer.timeout.connect(self._apply_pending)
+        self._verify_timer = QTimer(self); self._verify_timer.setSingleShot(True); self._verify_timer.setInterval(self.VERIFY_DELAY_MS)
+        self._verify_timer.timeout.connect(self._verify)
+        self._viewport_timer = QTimer(self); self._viewport_timer.setSingleShot(True); self._viewport_timer.setInterval(30)
+        self._viewport_timer.timeout.connect(self._on_viewport_changed)
+        self._viewport_range = (0, 0)
+        self._large_document = False  # 在 contentsChange 和 set_language 时更新
+
+        # 先于 QSyntaxHighlighter 自身连接 contentsChange，这样 Qt 同步重新高亮被编辑的行之前行镜像已经更新
+        document = parent if isinstance(parent, QTextDocument) else parent.document()
+        self.setParent(parent)
+        document.contentsChange.connect(self._on_contents_change)
+        self.setDocument(document)
+        self.view = None
+        if view is not None:
+            self.set_view(view)
+
+    def set_view(self, view):
+        """关联显示文档的 QTextEdit / QPlainTextEdit，用于可见区域优先和超大文档的按需高亮。"""
+        self.view = view
+        view.verticalScrollBar().valueChanged.connect(lambda _value: self._viewport_timer.start())
 
     def set_language(self, language):
-        """设置要高亮的语言"""
+        """设置要高亮的语言 (调用方随后应调用 rehighlight)"""
         try:
-            self.lexer = get_lexer_by_name(language, stripall=True)
-        except:
+            self.lexer = get_lexer_by_name(language)
+        except ClassNotFound:
             self.lexer = None # 如果语言无效，则不进行高亮
+        self._doc_lexer = DocumentLexer(self.lexer) if self.lexer is not None else None
+        self._cancel_job()
+        self._large_document = self._is_large_document()
+        # 旧语言的结果已无意义，随后的 rehighlight 中所有行都重新分析
+        self._reset_lines()
+
+    def highlight_new_document(self):
+        """
+        文档内容刚被整体载入 (尚无任何格式) 后代替 rehighlight 使用：超大文档只高亮可见区域附近的行，
+        不必为每一行调用一次 highlightBlock；其他文档与 rehighlight 相同。
+        """
+        self._large_document = self._is_large_document()
+        if self._large_document and self.view is not None:
+            self._on_viewport_changed()
+        else:
+            self.rehighlight()
+
+    @property
+    def busy(self) -> bool:
+        """是否还有等待分析或尚未应用格式的文本块。"""
+        return self._job_running or self._dirty is not None or self._unverified or self._pending_hint is not None
+
+    def shutdown(self):
+        """停止后台线程 (应用退出时自动调用)。"""
+        self._cancel_job()
+        if self._thread is not None:
+            self._thread.quit()
+            self._thread.wait()
+            self._thread = None
 
     def highlightBlock(self, text):
         """Qt在需要重绘文本块时会自动调用此方法"""
-        if self.lexer is None:
+        if self._doc_lexer is None:
             # 如果没有有效的lexer，则不执行任何操作
             return
 
-        # 使用Pygments进行词法分析
-        highlight(text, self.lexer, self.formatter)
-        
-        # 应用格式
-        start_index = 0
-        for ttype, value in self.formatter.data:
-            length = len(value)
-            fmt = self.formats.get(ttype)
-            if fmt:
-                self.setFormat(start_index, length, fmt)
-            start_index += length
\ No newline at end of file
+        if self._large_document:
+            self._highlight_large_document_block(text)
+            return
+
+        block_number = self.currentBlock().blockNumber()
+        if block_number >= len(self._lines) or self._lines[block_number] != text:
+            # 行镜像与文档不一致 (正常情况下不会发生)：重新建立并整篇重新分析
+            self._reset_lines()
+        if self._dirty is not None and not self._job_running and not self._applying:
+            self._relex()
+        runs = self._runs[block_number]
+        if runs is None:
+            # 后台模式下尚未分析到这一行，结果到达后再应用
+            return
+        self._apply(runs)
+        self._shown[block_number] = True
+
+    def _apply(self, runs):
+        # 格式区间包含行尾换行符，超出文本块长度的部分会被 setFormat 忽略
+        for_token = self.formats.for_token
+        for start, length, ttype in runs:
+            fmt = for_token(ttype)
+            if fmt is not None:
+                self.setFormat(start, length, fmt)
+
+    # --- 行镜像与重新分析 ---
+
+    def _reset_lines(self):
+        """按文档当前内容重建行镜像，所有行标记为待分析。"""
+        self._pending_hint = None
+        self._unverified = False
+        self._verify_timer.stop()
+        if self._doc_lexer is None or self._large_document:
+            self._lines, self._runs, self._shown, self._dirty = [], [], [], None
+            return
+        self._lines = self._document_lines(self.document().firstBlock())
+        count = len(self._lines)
+        self._runs = [None] * count
+        self._shown = [False] * count
+        self._dirty = [0, count - 1]
+
+    def _relex(self, full=False):
+        """
+        重新分析 _dirty 范围 (full 为 True 时整篇分析，不提前停止)：在本轮时间预算内同步分析，
+        预算用完时把尚未结束的分析 (生成器) 交给后台线程继续。后台模式下整篇分析不急于显示，直接交给后台线程。
+        """
+        if full:
+            restart = 0
+            results = self._doc_lexer.lex_lines(self._lines)
+        else:
+            first, last = self._dirty
+            restart = self._doc_lexer.restart_line(self._lines, self._runs, first - 1)
+            results = self._doc_lexer.lex_lines(self._lines[restart:], self._runs[restart:], last - restart + 1)
+        line = restart - 1
+        if not (full and self.background):
+            for offset, runs in results:
+                line = restart + offset
+                self._store(line, runs)
+                if not self._within_budget():
+                    break
+            else:
+                self._finish_pass(full, restart, line + 1)
+                return
+            if not full:
+                self._advance_dirty(line + 1)
+            self._apply_timer.start(0)
+        self._start_job(results, line + 1, full, restart)
+
+    def _finish_pass(self, full, restart, next_line):
+        """一次分析结束，next_line 为最后分析的行的下一行。"""
+        if full:
+            self._unverified = False
+        else:
+            self._dirty = None
+            # 从第一行分析到文末的结果就是整篇分析的结果，否则需要稍后确认
+            self._unverified = restart > 0 or next_line < len(self._lines)
+            if self._unverified:
+                self._verify_timer.start()
+        self._apply_timer.start(0)
+
+    def _verify(self):
+        """停止编辑一段时间后整篇分析一遍；局部分析尚未结束时，由其结束时再次启动。"""
+        if not self._unverified or self._doc_lexer is None or self._large_document:
+            return
+        if self._dirty is None and not self._job_running:
+            self._relex(full=True)
+
+    def _store(self, line, runs):
+        """保存一行的新结果；与原结果不同时标记为待应用。"""
+        if self._runs[line] != runs:
+            self._runs[line] = runs
+            self._shown[line] = False
+            if self._pending_hint is None or line < self._pending_hint:
+                self._pending_hint = line
+
+    def _advance_dirty(self, next_line):
+        """next_line 之前的行已按当前文本分析完毕：之后若需重新分析，从这里之前的可重新开始的行开始即可。"""
+        first, last = self._dirty
+        self._dirty = [max(first, next_line), max(last, next_line - 1)]
+
+    # --- 同步高亮的时间预算与待应用的文本块 ---
+
+    def _within_budget(self) -> bool:
+        if not self.background:
+            return True
+        now = perf_counter()
+        if self._turn_deadline is None:
+            self._turn_deadline = now + self.SYNC_BUDGET_SECONDS
+            self._turn_timer.start(0)
+        return now < self._turn_deadline
+
+    def _end_turn(self):
+        self._turn_deadline = None
+
+    def _first_pending(self):
+        """从 _pending_hint 开始查找第一个已有结果、但格式尚未应用的行号；后面的行还在等待分析时返回 None。"""
+        if self._pending_hint is None:
+            return None
+        try:
+            line = self._shown.index(False, self._pending_hint)
+        except ValueError:
+            self._pending_hint = None
+            return None
+        self._pending_hint = line
+        return line if self._runs[line] is not None else None
+
+    def _apply_pending(self):
+        """在时间预算内应用待应用的文本块：先处理可见区域，再按文档顺序处理。"""
+        if self._doc_lexer is None or self._large_document:
+            # 切换为纯文本或文档变为超大文档：不再逐行维护结果，放弃待处理的文本块
+            self._pending_hint = None
+            self._cancel_job()
+            return
+        if self._dirty is not None and not self._job_running:
+            self._relex()
+        if self._queued_job is not None:
+            self._send_job()
+        document = self.document()
+        line = None
+        self._applying = True
+        try:
+            for visible in self._visible_blocks():
+                if not self._within_budget():
+                    break
+                number = visible.blockNumber()
+                if not self._shown[number] and self._runs[number] is not None:
+                    self.rehighlightBlock(visible)
+            line = self._first_pending()
+            while line is not None and self._within_budget():
+                self.rehighlightBlock(document.findBlockByNumber(line))
+                line = self._first_pending()
+        finally:
+            self._applying = False
+
+        if line is not None:
+            self._apply_timer.start(0)  # 本轮预算已用完，下一轮继续
+        elif not self.busy:
+            self.finished.emit()
+        # 否则等待后台任务的下一批结果
+
+    # --- 后台分析任务 ---
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        self._thread = QThread()
+        self._worker = HighlightWorker()
+        self._worker.moveToThread(self._thread)
+        self._job_requested.connect(self._worker.run)
+        self._worker.chunk_ready.connect(self._on_chunk_ready)
+        self._worker.finished.connect(self._on_job_finished)
+        self._thread.finished.connect(self._worker.deleteLater)
+        QCoreApplication.instance().aboutToQuit.connect(self.shutdown)
+        self._thread.start()
+
+    def _start_job(self, results, first, full, restart):
+        """
+        把主线程中未完成的分析交给后台线程继续，first 为其下一行的行号。
+        任务在下一轮事件循环中才发给后台线程，以免 Qt 同步高亮其余文本块时与后台线程争用 GIL。
+        """
+        self._generation += 1
+        self._job_running = True
+        self._job_full = full
+        self._job_restart = restart
+        self._job_next = first
+        self._queued_job = (self._generation, first, results)
+        self._apply_timer.start(0)
+
+    def _send_job(self):
+        self._ensure_worker()
+        generation, first, results = self._queued_job
+        self._queued_job = None
+        self._worker.generation = generation
+        self._job_requested.emit(generation, first, results)
+
+    def _document_lines(self, block):
+        """从 block 开始的所有行文本 (与 QTextBlock.text() 一致)。"""
+        document = self.document()
+        lines = document.toRawText().split("\u2029")
+        if len(lines) == document.blockCount():
+            return lines[block.blockNumber():]
+        lines = []
+        while block.isValid():
+            lines.append(block.text())
+            block = block.next()
+        return lines
+
+    def _cancel_job(self):
+        self._queued_job = None
+        self._generation += 1
+        if self._worker is not None:
+            self._worker.generation = self._generation
+        self._job_running = False
+
+    def _on_chunk_ready(self, generation, first, chunk):
+        # 任务开始后文档没有被编辑过 (编辑会作废任务)，行号仍然有效
+        if generation != self._generation:
+            return
+        for offset, runs in enumerate(chunk):
+            self._store(first + offset, runs)
+        self._job_next = first + len(chunk)
+        if not self._job_full:
+            self._advance_dirty(first + len(chunk))
+        self._apply_timer.start(0)
+
+    def _on_job_finished(self, generation):
+        if generation == self._generation:
+            self._job_running = False
+            self._finish_pass(self._job_full, self._job_restart, self._job_next)
+
+    def _on_contents_change(self, position, removed, added):
+        """
+        文档被编辑：更新行镜像，被编辑的行并入待重新分析的范围，随后 Qt 同步调用的 highlightBlock 据此重新分析。
+        被编辑的行暂时保留原来的格式区间，避免后台模式下在新结果到达前闪烁。
+        """
+        large = self._is_large_document()
+        if large != self._large_document:
+            # 超大文档不维护行镜像，变回普通大小后需要整篇重新高亮
+            self._large_document = large
+            self._cancel_job()
+            self._reset_lines()
+            if not large:
+                QTimer.singleShot(0, self.rehighlight)
+            return
+        if self._doc_lexer is None or large:
+            return
+        self._cancel_job()
+
+        document = self.document()
+        first = document.findBlock(position).blockNumber()
+        last_block = document.findBlock(position + added)
+        last = last_block.blockNumber() if last_block.isValid() else document.blockCount() - 1
+        delta = document.blockCount() - len(self._lines)
+        old_last = last - delta
+        if first < 0 or not first - 1 <= old_last < len(self._lines):
+            self._reset_lines()
+            return
+        block = document.findBlockByNumber(first)
+        if last - first < 100:
+            texts = []
+            for _ in range(last - first + 1):
+                texts.append(block.text())
+                block = block.next()
+        else:
+            texts = self._document_lines(block)[:last - first + 1]
+        kept = min(old_last, last) - first + 1
+        self._lines[first:old_last + 1] = texts
+        self._runs[first:old_last + 1] = self._runs[first:first + kept] + [None] * (len(texts) - kept)
+        self._shown[first:old_last + 1] = [False] * len(texts)
+
+        def shifted(line):
+            return line + delta if line > old_last else line
+
+        if self._dirty is None:
+            self._dirty = [first, last]
+        else:
+            self._dirty = [min(shifted(self._dirty[0]), first), max(shifted(self._dirty[1]), last)]
+        self._pending_hint = first if self._pending_hint is None else min(shifted(self._pending_hint), first)
+        self._apply_timer.start(0)
+
+    # --- 可见区域与超大文档 ---
+
+    def _is_large_document(self) -> bool:
+        return bool(self.large_document_chars) and self.document().characterCount() > self.large_document_chars
+
+    def _visible_block_range(self):
+        """可见区域的 (首行, 末行) 文本块号；没有关联视图时为 (0, 0)。"""
+        if self.view is None:
+            return 0, 0
+        viewport = self.view.viewport()
+        first = self.view.cursorForPosition(QPoint(0, 0)).blockNumber()
+        last = self.view.cursorForPosition(QPoint(viewport.width() - 1, viewport.height() - 1)).blockNumber()
+        return first, last
+
+    def _visible_blocks(self):
+        if self.view is None:
+            return []
+        first, last = self._visible_block_range()
+        blocks = []
+        block = self.document().findBlockByNumber(first)
+        while block.isValid() and block.blockNumber() <= last:
+            blocks.append(block)
+            block = block.next()
+        return blocks
+
+    def _on_viewport_changed(self):
+        if self._doc_lexer is None:
+            return
+        if not self._large_document:
+            if self._pending_hint is not None:
+                self._apply_timer.start(0)
+            return
+        self._viewport_range = self._visible_block_range()
+        first, last = self._viewport_range
+        block = self.document().findBlockByNumber(max(0, first - self.VIEWPORT_MARGIN_BLOCKS))
+        while block.isValid() and block.blockNumber() <= last + self.VIEWPORT_MARGIN_BLOCKS:
+            self.rehighlightBlock(block)
+            block = block.next()
+
+    def _highlight_large_document_block(self, text):
+        """超大文档：只高亮可见区域附近的行，每行从根状态独立分析，跨行结构不保证正确。"""
+        if self.large_document_mode == "plain":
+            return
+        first, last = self._viewport_range
+        block_number = self.currentBlock().blockNumber()
+        if not first - self.VIEWPORT_MARGIN_BLOCKS <= block_number <= last + self.VIEWPORT_MARGIN_BLOCKS:
+            return
+        self._apply(self._doc_lexer.lex_line(text))